@@ -0,0 +1,126 @@
+"""Microbenchmark of the serialization of the tool results
+
+It compares the previous path, which re-serializes the model output with `json`,
+with the current path, which passes the text through when it is within the limits,
+and otherwise validates the kept references with a precompiled validator and serializes them in Rust.
+
+Usage:
+    python dev/benchmark_serialization.py [--references 20] [--snippet-chars 2000] [--number 2000]
+"""
+
+import argparse
+import json
+import timeit
+
+import mcp.types as types
+
+from mcp_vertexai_search.config import ReferenceConfig
+from mcp_vertexai_search.references import (
+    GroundedReference,
+    ReferenceHandle,
+    build_compact_payload,
+    dump_compact_payload,
+    limit_references,
+    to_reference_uri,
+    truncate,
+)
+
+
+def legacy_limit_references(answer_text: str, reference_config: ReferenceConfig) -> str:
+    try:
+        payload = json.loads(answer_text)
+        references = payload["references"]
+    except (ValueError, KeyError, TypeError):
+        return answer_text
+    changed = len(references) > reference_config.max_references
+    limited = []
+    for reference in references[: reference_config.max_references]:
+        raw_text = reference.get("raw_text")
+        if (
+            isinstance(raw_text, str)
+            and len(raw_text) > reference_config.max_snippet_chars
+        ):
+            reference["raw_text"] = truncate(
+                raw_text, reference_config.max_snippet_chars
+            )
+            changed = True
+        limited.append(reference)
+    if not changed:
+        return answer_text
+    payload["references"] = limited
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def legacy_compact_payload(answer_text, references, reference_config) -> str:
+    try:
+        answer = json.loads(answer_text).get("answer", answer_text)
+    except (ValueError, AttributeError):
+        answer = answer_text
+    handles = []
+    for index, reference in enumerate(references[: reference_config.max_references]):
+        handles.append(
+            ReferenceHandle(
+                title=reference.title,
+                uri=reference.uri,
+                score=reference.score,
+                resource_uri=to_reference_uri("abc", index),
+                snippet=truncate(reference.text, reference_config.max_snippet_chars),
+            ).model_dump(exclude_none=True)
+        )
+    return json.dumps({"answer": answer, "references": handles}, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--references", type=int, default=20)
+    parser.add_argument("--snippet-chars", type=int, default=2000)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    snippet = "決算 revenue grew in the quarter. " * (args.snippet_chars // 32)
+    answer_text = json.dumps(
+        {
+            "answer": "Revenue grew 15% year over year.",
+            "references": [
+                {"title": f"doc-{i}", "raw_text": snippet}
+                for i in range(args.references)
+            ],
+        },
+        ensure_ascii=False,
+    )
+    compact_answer_text = json.dumps({"answer": "Revenue grew 15% year over year."})
+    references = [
+        GroundedReference(title=f"doc-{i}", uri=f"gs://bucket/{i}.pdf", text=snippet)
+        for i in range(args.references)
+    ]
+    reference_config = ReferenceConfig(max_references=5, max_snippet_chars=1000)
+
+    cases = {
+        "full/legacy": lambda: types.TextContent(
+            type="text", text=legacy_limit_references(answer_text, reference_config)
+        ),
+        "full/current": lambda: types.TextContent(
+            type="text", text=limit_references(answer_text, reference_config)
+        ),
+        "compact/legacy": lambda: types.TextContent(
+            type="text",
+            text=legacy_compact_payload(
+                compact_answer_text, references, reference_config
+            ),
+        ),
+        "compact/current": lambda: types.TextContent(
+            type="text",
+            text=dump_compact_payload(
+                build_compact_payload(
+                    compact_answer_text, references, "abc", reference_config
+                )
+            ),
+        ),
+    }
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=args.number, repeat=5))
+        print(f"{name:<16} {seconds / args.number * 1e6:10.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
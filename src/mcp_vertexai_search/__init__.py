@@ -0,0 +1,3 @@
+from mcp_vertexai_search.engine import SearchEngine
+
+__all__ = ["SearchEngine"]
@@ -0,0 +1,193 @@
+import contextlib
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+import anyio
+
+from mcp_vertexai_search.config import AdmissionConfig, PriorityClassConfig
+
+# The JSON-RPC error code of the busy server, in the range reserved for the implementation
+SERVER_BUSY = -32029
+
+
+class ServerBusyError(Exception):
+    """A request rejected because the queue of its class is full"""
+
+    def __init__(self, class_name: str, retry_after_seconds: int):
+        super().__init__(
+            f"The server is busy with the requests of class {class_name}. "
+            f"Retry after {retry_after_seconds} seconds"
+        )
+        self.class_name = class_name
+        self.retry_after_seconds = retry_after_seconds
+
+
+class _Waiter:
+    def __init__(self, tag: float):
+        self.tag = tag
+        self.event = anyio.Event()
+        self.admitted = False
+
+
+class _ClassState:
+    def __init__(self, config: PriorityClassConfig, alpha: float):
+        self.config = config
+        self.alpha = alpha
+        self.waiters: Deque[_Waiter] = deque()
+        self.running = 0
+        # The virtual finish tag of the latest request of the class
+        self.last_tag = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds: Optional[float] = None
+        self.max_wait_seconds = 0.0
+
+    def has_capacity(self) -> bool:
+        return (
+            self.config.max_concurrency is None
+            or self.running < self.config.max_concurrency
+        )
+
+    def record_wait(self, seconds: float) -> None:
+        self.admitted += 1
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        if self.wait_seconds is None:
+            self.wait_seconds = seconds
+        else:
+            self.wait_seconds += self.alpha * (seconds - self.wait_seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class AdmissionController:
+    """Admit the requests of the priority classes with weighted fair queuing
+
+    Every request gets a virtual finish tag advancing by the inverse of the weight of its class,
+    and a free slot goes to the queued request with the smallest tag,
+    so that the classes share the capacity by weight under contention,
+    while a class can use all the spare capacity up to its own cap.
+    """
+
+    def __init__(
+        self,
+        classes: List[PriorityClassConfig],
+        max_concurrency: int,
+        default_class: str,
+        alpha: float = 0.2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.default_class = default_class
+        self.states = {config.name: _ClassState(config, alpha) for config in classes}
+        if default_class not in self.states:
+            raise ValueError(f"Unknown default priority class: {default_class}")
+        self.running = 0
+        self.virtual_time = 0.0
+        self.alpha = alpha
+        self.service_seconds = 1.0
+
+    @classmethod
+    def from_config(cls, config: AdmissionConfig) -> "AdmissionController":
+        return cls(
+            config.classes,
+            max_concurrency=config.max_concurrency,
+            default_class=config.default_class,
+        )
+
+    def resolve_class(self, class_name: Optional[str]) -> str:
+        if class_name in self.states:
+            return class_name
+        return self.default_class
+
+    def retry_after_seconds(self) -> int:
+        """Estimate the seconds to drain the queues with the average service time"""
+        queued = sum(len(state.waiters) for state in self.states.values())
+        return max(
+            1, math.ceil(self.service_seconds * (queued + 1) / self.max_concurrency)
+        )
+
+    @contextlib.asynccontextmanager
+    async def admit(self, class_name: Optional[str]) -> AsyncIterator[float]:
+        """Wait for a slot of a class, and yield the seconds waited
+
+        It raises ServerBusyError without waiting if the queue of the class is full.
+        """
+        state = self.states[self.resolve_class(class_name)]
+        start = time.monotonic()
+        run_now = not state.waiters and self._can_run(state)
+        if not run_now and len(state.waiters) >= state.config.max_queue_depth:
+            state.rejected += 1
+            raise ServerBusyError(state.config.name, self.retry_after_seconds())
+        # NOTE Only the admitted or queued requests advance the finish tag of the class,
+        #      so that a burst of rejected requests doesn't cost the class its fair share.
+        waiter = _Waiter(
+            max(self.virtual_time, state.last_tag) + 1.0 / state.config.weight
+        )
+        state.last_tag = waiter.tag
+        if run_now:
+            self._start(state, waiter)
+        else:
+            state.waiters.append(waiter)
+            try:
+                await waiter.event.wait()
+            except BaseException:
+                if waiter.admitted:
+                    self._finish(state)
+                else:
+                    state.waiters.remove(waiter)
+                raise
+
+        wait_seconds = time.monotonic() - start
+        state.record_wait(wait_seconds)
+        service_start = time.monotonic()
+        try:
+            yield wait_seconds
+        finally:
+            self.service_seconds += self.alpha * (
+                time.monotonic() - service_start - self.service_seconds
+            )
+            self._finish(state)
+
+    def _can_run(self, state: _ClassState) -> bool:
+        return self.running < self.max_concurrency and state.has_capacity()
+
+    def _start(self, state: _ClassState, waiter: _Waiter) -> None:
+        self.running += 1
+        state.running += 1
+        self.virtual_time = max(self.virtual_time, waiter.tag)
+        waiter.admitted = True
+        waiter.event.set()
+
+    def _finish(self, state: _ClassState) -> None:
+        self.running -= 1
+        state.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrency:
+            candidates = [
+                state
+                for state in self.states.values()
+                if state.waiters and state.has_capacity()
+            ]
+            if not candidates:
+                return
+            state = min(candidates, key=lambda state: state.waiters[0].tag)
+            self._start(state, state.waiters.popleft())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "service_seconds": self.service_seconds,
+            "classes": {name: state.to_dict() for name, state in self.states.items()},
+        }
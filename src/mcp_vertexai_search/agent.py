@@ -1,9 +1,15 @@
 import textwrap
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Union
 
+import anyio
 from vertexai import generative_models
 
-from mcp_vertexai_search.config import DataStoreConfig
+from mcp_vertexai_search.compression import ContextCompressor, Passage
+from mcp_vertexai_search.config import DataStoreConfig, VertexAIModelConfig
+from mcp_vertexai_search.profiling import phase
+from mcp_vertexai_search.references import SearchResult, extract_references
+from mcp_vertexai_search.routing import RegionRouter
+from mcp_vertexai_search.session import Turn, collect_snippets
 
 # class Reference(BaseModel):
 #     """Reference"""
@@ -75,6 +81,42 @@ def create_model(
     )
 
 
+def get_regional_model_name(model_name: str, project_id: str, location: str) -> str:
+    """Get the full resource name of a model to pin it to a location"""
+    if model_name.startswith("projects/"):
+        return model_name
+    if model_name.startswith("models/"):
+        model_name = f"publishers/google/{model_name}"
+    elif not model_name.startswith("publishers/"):
+        model_name = f"publishers/google/models/{model_name}"
+    return f"projects/{project_id}/locations/{location}/{model_name}"
+
+
+def create_region_router(
+    model_config: VertexAIModelConfig,
+    tools: List[generative_models.Tool],
+    system_instruction: str,
+) -> RegionRouter:
+    """Create a router over the models in the configured locations"""
+    models = {
+        location_config.location: create_model(
+            model_name=get_regional_model_name(
+                model_config.model_name,
+                model_config.project_id,
+                location_config.location,
+            ),
+            tools=tools,
+            system_instruction=system_instruction,
+        )
+        for location_config in model_config.get_locations()
+    }
+    weights = {
+        location_config.location: location_config.weight
+        for location_config in model_config.get_locations()
+    }
+    return RegionRouter(models, weights=weights)
+
+
 def create_vertexai_search_tool(
     project_id: str,
     location: str,
@@ -95,12 +137,16 @@ def create_vertexai_search_tool(
 def create_vertex_ai_tools(
     data_stores: List[DataStoreConfig],
 ) -> List[generative_models.Tool]:
-    """Create a list of Vertex AI search tools"""
+    """Create a list of Vertex AI search tools
+
+    The data stores with the context compression are searched directly instead of the grounding.
+    """
     return [
         create_vertexai_search_tool(
             data_store.project_id, data_store.location, data_store.datastore_id
         )
         for data_store in data_stores
+        if not data_store.compression.enabled
     ]
 
 
@@ -150,13 +196,151 @@ def get_system_instruction() -> str:
     ).strip()
 
 
+def get_compact_system_instruction() -> str:
+    """System instruction to answer without copying the snippets
+
+    The references are built from the grounding metadata instead,
+    so that the model doesn't spend output tokens on the snippets.
+    """
+    return textwrap.dedent(
+        """
+        You are a helpful assistant knowledgeable about Alphabet quarterly earning reports.
+        Help users with their queries related to Alphabet by only responding with information available in the Grounding Knowledge store.
+
+        Respond in the same language as the user's query.
+        For instance, if the user's query is in Japanese, your response should be in Japanese.
+
+        - Always refer to the tool and ground your answers in it.
+        - Understand the retrieved snippet by the tool and only use that information to help users.
+        - DO NOT copy the Grounding tool snippets into the response. They are attached to the response separately.
+        - If information is not available in the tool, mention you don't have access to the information and do not try to make up an answer.
+        - Output "answer" should be "I don't know" when the user question is irrelevant or outside the scope of the knowledge base.
+
+        The Grounding tool finds the most relevant snippets from the Alphabet earning reports data store.
+        Use the information provided by the tool as your knowledge base.
+
+        - ONLY use information available from the Grounding tool.
+        - DO NOT make up information or invent details not present in the retrieved snippets.
+
+        Response should ALWAYS be in the following JSON format:
+        ## JSON schema
+        {
+            "answer": {
+                "type": "string",
+                "description": "The answer to the user's query"
+            }
+        }
+        """
+    ).strip()
+
+
+def to_context_contents(
+    query: str, history: List[Turn]
+) -> List[generative_models.Content]:
+    """Build multi-turn contents to answer a follow-up query with the snippets retrieved before"""
+    contents = []
+    for turn in history:
+        contents.append(
+            generative_models.Content(
+                role="user", parts=[generative_models.Part.from_text(turn.query)]
+            )
+        )
+        contents.append(
+            generative_models.Content(
+                role="model", parts=[generative_models.Part.from_text(turn.answer)]
+            )
+        )
+    snippets = "\n\n".join(
+        f"## {snippet.title}\n{snippet.text}" for snippet in collect_snippets(history)
+    )
+    prompt = textwrap.dedent(
+        """
+        The Grounding tool retrieved the following snippets for the previous questions.
+
+        # Snippets
+        {snippets}
+
+        # Question
+        {query}
+        """
+    ).strip()
+    contents.append(
+        generative_models.Content(
+            role="user",
+            parts=[
+                generative_models.Part.from_text(
+                    prompt.format(snippets=snippets, query=query)
+                )
+            ],
+        )
+    )
+    return contents
+
+
+def to_passage_contents(
+    query: str, passages: List[Passage]
+) -> List[generative_models.Content]:
+    """Build the contents to answer a query with the compressed passages"""
+    snippets = "\n\n".join(
+        f"## {passage.title}\n{passage.text}" for passage in passages
+    )
+    prompt = textwrap.dedent(
+        """
+        The Grounding tool retrieved the following snippets for the question.
+
+        # Snippets
+        {snippets}
+
+        # Question
+        {query}
+        """
+    ).strip()
+    return [
+        generative_models.Content(
+            role="user",
+            parts=[
+                generative_models.Part.from_text(
+                    prompt.format(snippets=snippets, query=query)
+                )
+            ],
+        )
+    ]
+
+
 class VertexAISearchAgent:
     def __init__(
         self,
         model: generative_models.GenerativeModel,
+        router: Optional[RegionRouter] = None,
+        context_model: Optional[generative_models.GenerativeModel] = None,
+        context_router: Optional[RegionRouter] = None,
+        compressor: Optional[ContextCompressor] = None,
     ):
         # pylint: disable=line-too-long
         self.model = model
+        # The router spreads the requests over multiple locations if configured.
+        self.router = router
+        # The model without the grounding tools answers follow-up queries with the snippets retrieved before.
+        self.context_model = context_model
+        self.context_router = context_router
+        # The compressor retrieves and compresses the passages of the data stores without the grounding tools.
+        self.compressor = compressor
+
+    @property
+    def models(self) -> List[generative_models.GenerativeModel]:
+        """All the models the agent may send requests to"""
+        if self.router is None:
+            return [self.model]
+        return list(self.router.models.values())
+
+    @property
+    def context_models(self) -> List[generative_models.GenerativeModel]:
+        """All the models the agent may send the follow-up queries to"""
+        if self.context_router is not None:
+            return list(self.context_router.models.values())
+        if self.context_model is not None:
+            return [self.context_model]
+        return []
 
     async def asearch(
         self,
@@ -165,14 +349,44 @@ class VertexAISearchAgent:
         safety_settings: Optional[List[generative_models.SafetySetting]],
     ) -> str:
         """Asynchronous search"""
-        response = await self.model.generate_content_async(
-            contents=[query],
-            generation_config=generation_config,
-            safety_settings=safety_settings,
-            stream=True,
+        response = await self.asearch_response(
+            query, generation_config, safety_settings
         )
         return response.text
 
+    async def asearch_response(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        """Asynchronous search returning the whole response with the grounding metadata"""
+        contents: List[Union[str, generative_models.Content]] = [query]
+        if self.compressor is not None:
+            compression = await anyio.to_thread.run_sync(
+                self.compressor.compress, query
+            )
+            contents = to_passage_contents(query, compression.passages)
+        return await self._agenerate(contents, generation_config, safety_settings)
+
+    async def _agenerate(
+        self,
+        contents: List[Union[str, generative_models.Content]],
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        async def generate(model: generative_models.GenerativeModel):
+            return await model.generate_content_async(
+                contents=contents,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=False,
+            )
+
+        if self.router is None:
+            return await generate(self.model)
+        return await self.router.acall(generate)
+
     def search(
         self,
         query: str,
@@ -180,11 +394,203 @@ class VertexAISearchAgent:
         safety_settings: Optional[List[generative_models.SafetySetting]],
     ) -> str:
         """Synchronous search"""
-        # TODO Enable to customize generation config and safety settings
-        response = self.model.generate_content(
-            contents=[query],
-            generation_config=generation_config,
-            safety_settings=safety_settings,
-            stream=False,
-        )
+        response = self.search_response(query, generation_config, safety_settings)
         return response.text
+
+    def search_response(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        """Synchronous search returning the whole response with the grounding metadata"""
+        contents: List[Union[str, generative_models.Content]] = [query]
+        if self.compressor is not None:
+            compression = self.compressor.compress(query)
+            contents = to_passage_contents(query, compression.passages)
+        return self._generate(contents, generation_config, safety_settings)
+
+    def _generate(
+        self,
+        contents: List[Union[str, generative_models.Content]],
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        # TODO Enable to customize generation config and safety settings
+        def generate(model: generative_models.GenerativeModel):
+            return model.generate_content(
+                contents=contents,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=False,
+            )
+
+        if self.router is None:
+            return generate(self.model)
+        return self.router.call(generate)
+
+    async def asearch_with_context_response(
+        self,
+        query: str,
+        history: List[Turn],
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        """Asynchronous search with the context of the previous turns instead of the grounding"""
+        if self.context_model is None:
+            raise ValueError("The context model is not configured")
+        contents = to_context_contents(query, history)
+
+        async def generate(model: generative_models.GenerativeModel):
+            return await model.generate_content_async(
+                contents=contents,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=False,
+            )
+
+        if self.context_router is None:
+            return await generate(self.context_model)
+        return await self.context_router.acall(generate)
+
+    def search_with_context_response(
+        self,
+        query: str,
+        history: List[Turn],
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> generative_models.GenerationResponse:
+        """Synchronous search with the context of the previous turns instead of the grounding"""
+        if self.context_model is None:
+            raise ValueError("The context model is not configured")
+        contents = to_context_contents(query, history)
+
+        def generate(model: generative_models.GenerativeModel):
+            return model.generate_content(
+                contents=contents,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=False,
+            )
+
+        if self.context_router is None:
+            return generate(self.context_model)
+        return self.context_router.call(generate)
+
+    def search_result(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult:
+        """Synchronous search returning the response text and the retrieved snippets
+
+        A follow-up query with the previous turns is answered without a new grounding round.
+        """
+        passages = None
+        if self.compressor is not None and not history:
+            with phase("compression"):
+                passages = self.compressor.compress(query).passages
+        with phase("upstream"):
+            if history:
+                response = self.search_with_context_response(
+                    query, history, generation_config, safety_settings
+                )
+            elif passages is not None:
+                response = self._generate(
+                    to_passage_contents(query, passages),
+                    generation_config,
+                    safety_settings,
+                )
+            else:
+                response = self.search_response(
+                    query, generation_config, safety_settings
+                )
+        with phase("response_parse"):
+            return to_search_result(response, passages, history)
+
+    async def asearch_result(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult:
+        """Asynchronous search returning the response text and the retrieved snippets"""
+        passages = None
+        if self.compressor is not None and not history:
+            with phase("compression"):
+                compression = await anyio.to_thread.run_sync(
+                    self.compressor.compress, query
+                )
+                passages = compression.passages
+        with phase("upstream"):
+            if history:
+                response = await self.asearch_with_context_response(
+                    query, history, generation_config, safety_settings
+                )
+            elif passages is not None:
+                response = await self._agenerate(
+                    to_passage_contents(query, passages),
+                    generation_config,
+                    safety_settings,
+                )
+            else:
+                response = await self.asearch_response(
+                    query, generation_config, safety_settings
+                )
+        with phase("response_parse"):
+            return to_search_result(response, passages, history)
+
+    async def astream(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> AsyncIterator[str]:
+        """Asynchronous search streaming the response text
+
+        The router fails over only until the stream is opened.
+        """
+        contents: List[Union[str, generative_models.Content]] = [query]
+        if self.compressor is not None:
+            compression = await anyio.to_thread.run_sync(
+                self.compressor.compress, query
+            )
+            contents = to_passage_contents(query, compression.passages)
+
+        async def open_stream(model: generative_models.GenerativeModel):
+            return await model.generate_content_async(
+                contents=contents,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=True,
+            )
+
+        if self.router is None:
+            responses = await open_stream(self.model)
+        else:
+            responses = await self.router.acall(open_stream)
+        async for response in responses:
+            try:
+                text = response.text
+            except ValueError:
+                # The last chunk may only have the metadata
+                continue
+            if text:
+                yield text
+
+
+def to_search_result(
+    response: generative_models.GenerationResponse,
+    passages: Optional[List[Passage]],
+    history: Optional[List[Turn]],
+) -> SearchResult:
+    """Collect the response text and the snippets the response is based on"""
+    if history:
+        references = collect_snippets(history)
+    else:
+        references = [passage.to_reference() for passage in passages or []]
+        references.extend(extract_references(response))
+    return SearchResult(text=response.text, references=references)
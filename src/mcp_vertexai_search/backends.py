@@ -0,0 +1,87 @@
+from importlib import metadata
+from typing import AsyncIterator, Callable, Dict, List, Optional, Protocol
+
+from vertexai import generative_models
+
+from mcp_vertexai_search.config import DataStoreConfig
+from mcp_vertexai_search.local_index import LocalSearchBackend
+from mcp_vertexai_search.references import SearchResult
+from mcp_vertexai_search.session import Turn
+
+# The backend answering with the Vertex AI model grounded on the data store
+VERTEXAI_BACKEND = "vertexai"
+# The entry point group the packages register their backends in
+ENTRY_POINT_GROUP = "mcp_vertexai_search.backends"
+
+
+class SearchBackend(Protocol):
+    """A backend answering the queries of a data store
+
+    VertexAISearchAgent is the backend of the Vertex AI data stores.
+    The backends may ignore the generation settings and the session history.
+    """
+
+    def search_result(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult: ...
+
+    async def asearch_result(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult: ...
+
+    def astream(
+        self,
+        query: str,
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ) -> AsyncIterator[str]: ...
+
+
+BackendFactory = Callable[[DataStoreConfig], SearchBackend]
+
+_BACKEND_FACTORIES: Dict[str, BackendFactory] = {
+    "local": LocalSearchBackend.from_config,
+}
+
+
+def register_backend(name: str, factory: BackendFactory) -> None:
+    """Register a factory creating the backend of the data stores with `backend: <name>`"""
+    if name == VERTEXAI_BACKEND:
+        raise ValueError(f"The backend name is reserved: {name}")
+    _BACKEND_FACTORIES[name] = factory
+
+
+def get_backend_factory(name: str) -> BackendFactory:
+    """Get the factory of a backend, loading it from the entry points if not registered"""
+    if name not in _BACKEND_FACTORIES:
+        for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name == name:
+                register_backend(name, entry_point.load())
+                break
+        else:
+            raise ValueError(f"Unknown backend: {name}")
+    return _BACKEND_FACTORIES[name]
+
+
+def create_backends(data_stores: List[DataStoreConfig]) -> Dict[str, SearchBackend]:
+    """Create the backends of the data stores not served by Vertex AI, by tool name"""
+    return {
+        data_store.tool_name: get_backend_factory(data_store.backend)(data_store)
+        for data_store in data_stores
+        if data_store.backend != VERTEXAI_BACKEND
+    }
+
+
+def close_backend(backend: SearchBackend) -> None:
+    """Close a backend if it holds resources"""
+    close = getattr(backend, "close", None)
+    if close is not None:
+        close()
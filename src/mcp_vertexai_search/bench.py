@@ -0,0 +1,287 @@
+import math
+import random
+import time
+from typing import Dict, List, Optional, Protocol
+
+import anyio
+from google.api_core import exceptions
+from pydantic import BaseModel, Field
+from vertexai import generative_models
+
+from mcp_vertexai_search.agent import VertexAISearchAgent
+from mcp_vertexai_search.backends import SearchBackend
+
+
+class TokenUsage(BaseModel):
+    """The tokens used by a request"""
+
+    prompt_tokens: int = Field(description="The number of the prompt tokens", default=0)
+    output_tokens: int = Field(description="The number of the output tokens", default=0)
+
+
+class BenchBackend(Protocol):
+    """A backend to send the benchmark queries to"""
+
+    async def search(self, tool_name: str, query: str) -> TokenUsage: ...
+
+
+class AgentBackend:
+    """A backend searching the data stores with a search agent per tool
+
+    The backends other than Vertex AI don't use the model, so they report no tokens.
+    """
+
+    def __init__(
+        self,
+        agents: Dict[str, SearchBackend],
+        generation_config: generative_models.GenerationConfig,
+        safety_settings: Optional[List[generative_models.SafetySetting]],
+    ):
+        self.agents = agents
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+
+    async def search(self, tool_name: str, query: str) -> TokenUsage:
+        agent = self.agents[tool_name]
+        if not isinstance(agent, VertexAISearchAgent):
+            await agent.asearch_result(
+                query, self.generation_config, self.safety_settings
+            )
+            return TokenUsage()
+        response = await agent.asearch_response(
+            query, self.generation_config, self.safety_settings
+        )
+        usage = response.usage_metadata
+        return TokenUsage(
+            prompt_tokens=usage.prompt_token_count,
+            output_tokens=usage.candidates_token_count,
+        )
+
+
+class StubBackend:
+    """A stand-in backend to run the benchmark offline
+
+    It serves `capacity` requests at a time and queues the rest,
+    so that the throughput saturates like a real backend.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.1,
+        capacity: int = 4,
+        error_rate: float = 0.0,
+        output_tokens: int = 100,
+        seed: Optional[int] = None,
+    ):
+        self.latency_seconds = latency_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        # trunk-ignore(bandit/B311)
+        self._random = random.Random(seed)
+        self._slots: Optional[anyio.Semaphore] = None
+
+    async def search(self, tool_name: str, query: str) -> TokenUsage:
+        # NOTE The semaphore has to be created in the event loop.
+        if self._slots is None:
+            self._slots = anyio.Semaphore(self.capacity)
+        async with self._slots:
+            await anyio.sleep(self.latency_seconds)
+        if self._random.random() < self.error_rate:
+            raise exceptions.ResourceExhausted(f"The stub backend of {tool_name}")
+        return TokenUsage(
+            prompt_tokens=len(query.split()), output_tokens=self.output_tokens
+        )
+
+
+class LevelReport(BaseModel):
+    """The result of a data store at a concurrency level"""
+
+    concurrency: int = Field(..., description="The number of the concurrent requests")
+    requests: int = Field(..., description="The number of the requests")
+    errors: int = Field(..., description="The number of the failed requests")
+    error_rate: float = Field(..., description="The fraction of the failed requests")
+    throughput: float = Field(..., description="The successful requests per second")
+    p50_seconds: Optional[float] = Field(
+        description="The median latency of the successful requests", default=None
+    )
+    p95_seconds: Optional[float] = Field(
+        description="The 95th percentile latency", default=None
+    )
+    p99_seconds: Optional[float] = Field(
+        description="The 99th percentile latency", default=None
+    )
+    prompt_tokens: int = Field(description="The total prompt tokens", default=0)
+    output_tokens: int = Field(description="The total output tokens", default=0)
+    error_types: Dict[str, int] = Field(
+        description="The number of the errors by type", default_factory=dict
+    )
+
+
+class StoreReport(BaseModel):
+    """The result of a data store at all the concurrency levels"""
+
+    tool_name: str = Field(..., description="The tool name of the data store")
+    levels: List[LevelReport] = Field(
+        description="The results by concurrency level", default_factory=list
+    )
+    knee_concurrency: Optional[int] = Field(
+        description="The concurrency beyond which the latency grows faster than the throughput",
+        default=None,
+    )
+
+
+class BenchReport(BaseModel):
+    """The result of a benchmark"""
+
+    stores: List[StoreReport] = Field(
+        description="The results by data store", default_factory=list
+    )
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """The q-th percentile of the values with the linear interpolation"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100.0
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def find_knee(levels: List[LevelReport], max_error_rate: float) -> Optional[int]:
+    """Find the knee of the throughput/latency curve
+
+    The knee is the concurrency maximizing the power, the throughput divided by the median latency.
+    The levels failing more than `max_error_rate` are not considered.
+    """
+    best_concurrency, best_power = None, 0.0
+    for level in levels:
+        if level.error_rate > max_error_rate or not level.p50_seconds:
+            continue
+        power = level.throughput / level.p50_seconds
+        if power > best_power:
+            best_concurrency, best_power = level.concurrency, power
+    return best_concurrency
+
+
+async def run_level(
+    backend: BenchBackend,
+    tool_name: str,
+    queries: List[str],
+    concurrency: int,
+    num_requests: int,
+) -> LevelReport:
+    """Send the queries to a data store with a fixed number of the concurrent requests"""
+    latencies: List[float] = []
+    usage = TokenUsage()
+    error_types: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < num_requests:
+            query = queries[next_index % len(queries)]
+            next_index += 1
+            start = time.monotonic()
+            # pylint: disable=broad-exception-caught
+            try:
+                request_usage = await backend.search(tool_name, query)
+            except Exception as e:
+                error_type = type(e).__name__
+                error_types[error_type] = error_types.get(error_type, 0) + 1
+                continue
+            latencies.append(time.monotonic() - start)
+            usage.prompt_tokens += request_usage.prompt_tokens
+            usage.output_tokens += request_usage.output_tokens
+
+    start = time.monotonic()
+    async with anyio.create_task_group() as task_group:
+        for _ in range(concurrency):
+            task_group.start_soon(worker)
+    elapsed = time.monotonic() - start
+
+    errors = sum(error_types.values())
+    return LevelReport(
+        concurrency=concurrency,
+        requests=num_requests,
+        errors=errors,
+        error_rate=errors / num_requests if num_requests else 0.0,
+        throughput=len(latencies) / elapsed if elapsed > 0 else 0.0,
+        p50_seconds=percentile(latencies, 50),
+        p95_seconds=percentile(latencies, 95),
+        p99_seconds=percentile(latencies, 99),
+        prompt_tokens=usage.prompt_tokens,
+        output_tokens=usage.output_tokens,
+        error_types=error_types,
+    )
+
+
+async def run_bench(
+    backend: BenchBackend,
+    tool_names: List[str],
+    queries: List[str],
+    concurrency_levels: List[int],
+    requests_per_level: int,
+    max_error_rate: float = 0.05,
+) -> BenchReport:
+    """Benchmark the data stores one by one at the increasing concurrency levels"""
+    if not queries:
+        raise ValueError("No queries to benchmark with")
+    report = BenchReport()
+    for tool_name in tool_names:
+        store_report = StoreReport(tool_name=tool_name)
+        for concurrency in sorted(set(concurrency_levels)):
+            store_report.levels.append(
+                await run_level(
+                    backend, tool_name, queries, concurrency, requests_per_level
+                )
+            )
+        store_report.knee_concurrency = find_knee(store_report.levels, max_error_rate)
+        report.stores.append(store_report)
+    return report
+
+
+def format_table(report: BenchReport) -> str:
+    """Format a benchmark report as a plain text table"""
+
+    def format_seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f}"
+
+    header = [
+        "tool",
+        "concurrency",
+        "requests",
+        "error_rate",
+        "throughput",
+        "p50",
+        "p95",
+        "p99",
+        "prompt_tokens",
+        "output_tokens",
+        "knee",
+    ]
+    rows = [header]
+    for store in report.stores:
+        for level in store.levels:
+            rows.append(
+                [
+                    store.tool_name,
+                    str(level.concurrency),
+                    str(level.requests),
+                    f"{level.error_rate:.2%}",
+                    f"{level.throughput:.2f}",
+                    format_seconds(level.p50_seconds),
+                    format_seconds(level.p95_seconds),
+                    format_seconds(level.p99_seconds),
+                    str(level.prompt_tokens),
+                    str(level.output_tokens),
+                    "*" if level.concurrency == store.knee_concurrency else "",
+                ]
+            )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from mcp_vertexai_search.references import SearchResult
+
+T = TypeVar("T")
+
+
+def connect(path: Optional[str]) -> sqlite3.Connection:
+    """Connect to a SQLite database shared by the server and the warm command
+
+    An in-memory database is used if the path is not provided.
+    """
+    connection = sqlite3.connect(path or ":memory:", check_same_thread=False)
+    if path:
+        connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+
+class ResponseCache:
+    """A store of the tool responses keyed by tool and query
+
+    The responses expire after `max_age_seconds`,
+    or when the content version of the data store behind the tool changes.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, max_age_seconds: float):
+        self.connection = connection
+        self.max_age_seconds = max_age_seconds
+        self.content_versions: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        with self._lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    tool TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    content_version TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (tool, query)
+                )
+                """
+            )
+
+    def set_content_version(self, tool_name: str, version: Optional[str]) -> bool:
+        """Set the content version of a tool, and return whether it changed"""
+        changed = self.content_versions.get(tool_name) != version
+        self.content_versions[tool_name] = version
+        return changed
+
+    def get(self, tool_name: str, query: str) -> Optional[SearchResult]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT response, content_version, created_at FROM responses WHERE tool = ? AND query = ?",
+                (tool_name, query),
+            ).fetchone()
+        if row is None:
+            return None
+        response, content_version, created_at = row
+        if time.time() - created_at > self.max_age_seconds:
+            return None
+        if content_version != self.content_versions.get(tool_name, content_version):
+            return None
+        return SearchResult.model_validate_json(response)
+
+    def put(self, tool_name: str, query: str, response: SearchResult) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    tool_name,
+                    query,
+                    response.model_dump_json(),
+                    self.content_versions.get(tool_name),
+                    time.time(),
+                ),
+            )
+
+    def purge_expired(self) -> int:
+        """Delete the expired responses and return the number of them"""
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,),
+            )
+        return cursor.rowcount
+
+
+class QueryLog:
+    """A rolling frequency log of the queries per tool
+
+    The counts decay by half every `half_life_seconds`,
+    and only the `max_entries` most frequent queries are kept per tool.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        half_life_seconds: float,
+        max_entries: int,
+    ):
+        self.connection = connection
+        self.half_life_seconds = half_life_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._records_since_prune = 0
+        with self._lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS queries (
+                    tool TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    count REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    text TEXT,
+                    PRIMARY KEY (tool, query)
+                )
+                """
+            )
+            # The databases created before the normalization of the queries lack the text
+            columns = [
+                row[1] for row in self.connection.execute("PRAGMA table_info(queries)")
+            ]
+            if "text" not in columns:
+                self.connection.execute("ALTER TABLE queries ADD COLUMN text TEXT")
+
+    def _decay(self, elapsed: float) -> float:
+        return 0.5 ** (max(elapsed, 0.0) / self.half_life_seconds)
+
+    def record(self, tool_name: str, query: str, key: Optional[str] = None) -> None:
+        """Count a query by its key, the normalized query, and keep the latest text of it"""
+        key = query if key is None else key
+        now = time.time()
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT count, updated_at FROM queries WHERE tool = ? AND query = ?",
+                (tool_name, key),
+            ).fetchone()
+            count = 1.0
+            if row is not None:
+                count += row[0] * self._decay(now - row[1])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                (tool_name, key, count, now, query),
+            )
+            self._records_since_prune += 1
+            if self._records_since_prune >= self.max_entries:
+                self._prune(tool_name, now)
+                self._records_since_prune = 0
+
+    def top(self, tool_name: str, n: int) -> List[str]:
+        """Get the latest texts of the n most frequent queries of a tool"""
+        now = time.time()
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT COALESCE(text, query), count, updated_at FROM queries WHERE tool = ?",
+                (tool_name,),
+            ).fetchall()
+        rows.sort(key=lambda row: -row[1] * self._decay(now - row[2]))
+        return [row[0] for row in rows[:n]]
+
+    def _prune(self, tool_name: str, now: float) -> None:
+        rows = self.connection.execute(
+            "SELECT query, count, updated_at FROM queries WHERE tool = ?",
+            (tool_name,),
+        ).fetchall()
+        if len(rows) <= self.max_entries:
+            return
+        rows.sort(key=lambda row: -row[1] * self._decay(now - row[2]))
+        self.connection.executemany(
+            "DELETE FROM queries WHERE tool = ? AND query = ?",
+            [(tool_name, row[0]) for row in rows[self.max_entries :]],
+        )
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer:
+    """Share a call among the identical requests in flight across the worker threads
+
+    The first request of a key runs the call, and the others wait for its result or its error.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str], _Call] = {}
+        # The number of the requests which shared the call of another one
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def run(self, tool_name: str, key: str, func: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get((tool_name, key))
+            leader = call is None
+            if leader:
+                call = self._calls[(tool_name, key)] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[(tool_name, key)]
+            call.done.set()
@@ -0,0 +1,222 @@
+import datetime
+import time
+from typing import Dict, Iterable, List, Optional
+
+import anyio
+from google import auth
+from google.cloud import discoveryengine_v1
+from loguru import logger
+
+from mcp_vertexai_search.agent import (
+    VertexAISearchAgent,
+    get_default_safety_settings,
+    get_generation_config,
+)
+from mcp_vertexai_search.backends import VERTEXAI_BACKEND, SearchBackend
+from mcp_vertexai_search.cache import QueryLog, ResponseCache
+from mcp_vertexai_search.config import Config, DataStoreConfig
+from mcp_vertexai_search.google_cloud import (
+    get_data_store_name,
+    get_discoveryengine_client_options,
+)
+from mcp_vertexai_search.normalization import QueryNormalizer
+
+
+async def get_content_version(
+    client: discoveryengine_v1.DataStoreServiceAsyncClient,
+    data_store: DataStoreConfig,
+) -> Optional[str]:
+    """Get the version of the content in a data store
+
+    The version is the last update time of the data in the data store.
+    """
+    resource = await client.get_data_store(
+        name=get_data_store_name(
+            data_store.project_id, data_store.location, data_store.datastore_id
+        )
+    )
+    estimation = resource.billing_estimation
+    update_times = [
+        update_time
+        for update_time in (
+            estimation.structured_data_update_time,
+            estimation.unstructured_data_update_time,
+            estimation.website_data_update_time,
+        )
+        if update_time
+    ]
+    if not update_times:
+        return None
+    return max(update_times).isoformat()
+
+
+def is_off_peak(hour: int, start_hour: int, end_hour: int) -> bool:
+    """Whether an hour is in the off-peak window, which may wrap around midnight"""
+    if start_hour <= end_hour:
+        return start_hour <= hour < end_hour
+    return hour >= start_hour or hour < end_hour
+
+
+def get_off_peak_window_start(
+    now: datetime.datetime, start_hour: int, end_hour: int
+) -> Optional[datetime.datetime]:
+    """The start of the off-peak window the time is in, if any
+
+    The window wrapping around midnight started on the day before in the early hours.
+    """
+    if not is_off_peak(now.hour, start_hour, end_hour):
+        return None
+    start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    if now.hour < start_hour:
+        start -= datetime.timedelta(days=1)
+    return start
+
+
+class CacheWarmer:
+    """Pre-populate the response cache with the frequent queries under a rate limit
+
+    The clients to check the content versions are created once per location,
+    and closed when the warmer stops.
+    """
+
+    def __init__(
+        self,
+        agent: Optional[VertexAISearchAgent],
+        config: Config,
+        cache: ResponseCache,
+        query_log: Optional[QueryLog] = None,
+        credentials: Optional[auth.credentials.Credentials] = None,
+        backends: Optional[Dict[str, SearchBackend]] = None,
+    ):
+        self.agent = agent
+        self.backends = backends or {}
+        self.config = config
+        self.cache = cache
+        self.query_log = query_log
+        self.credentials = credentials
+        self.normalizer = QueryNormalizer(config.server.query_normalization)
+        # The start of the off-peak window the cache was warmed in last
+        self.last_warmed_window: Optional[datetime.datetime] = None
+        self._data_store_clients: Dict[
+            str, discoveryengine_v1.DataStoreServiceAsyncClient
+        ] = {}
+
+    def get_data_store_client(
+        self, location: str
+    ) -> discoveryengine_v1.DataStoreServiceAsyncClient:
+        client = self._data_store_clients.get(location)
+        if client is None:
+            client = discoveryengine_v1.DataStoreServiceAsyncClient(
+                credentials=self.credentials,
+                client_options=get_discoveryengine_client_options(location),
+            )
+            self._data_store_clients[location] = client
+        return client
+
+    async def aclose(self) -> None:
+        """Close the clients to check the content versions"""
+        clients = list(self._data_store_clients.values())
+        self._data_store_clients = {}
+        for client in clients:
+            # pylint: disable=broad-exception-caught
+            try:
+                await client.transport.close()
+            except Exception as e:
+                logger.warning(f"Failed to close the data store client: {e}")
+
+    def warm_query(self, tool_name: str, query: str) -> None:
+        generation_config = get_generation_config(
+            temperature=self.config.model.generate_content_config.temperature,
+            top_p=self.config.model.generate_content_config.top_p,
+        )
+        normalized = self.normalizer.normalize(query)
+        result = self.backends.get(tool_name, self.agent).search_result(
+            query=normalized.text,
+            generation_config=generation_config,
+            safety_settings=get_default_safety_settings(),
+        )
+        self.cache.put(tool_name, normalized.key, result)
+
+    async def warm(self, tool_name: str, queries: Iterable[str]) -> int:
+        """Warm the cache with queries of a tool, and return the number of the warmed ones"""
+        interval = 1.0 / self.config.server.cache_warming.rate_limit_per_second
+        warmed = 0
+        keys = set()
+        for query in queries:
+            # Warm the queries only differing in the form once
+            key = self.normalizer.normalize(query).key
+            if key in keys:
+                continue
+            keys.add(key)
+            start = time.monotonic()
+            # pylint: disable=broad-exception-caught
+            try:
+                await anyio.to_thread.run_sync(self.warm_query, tool_name, query)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Failed to warm {tool_name} with {query!r}: {e}")
+            await anyio.sleep(max(0.0, interval - (time.monotonic() - start)))
+        return warmed
+
+    async def warm_top(self, tool_names: Optional[List[str]] = None) -> int:
+        """Warm the cache with the most frequent queries in the query log"""
+        if self.query_log is None:
+            return 0
+        if tool_names is None:
+            tool_names = [
+                data_store.tool_name for data_store in self.config.data_stores
+            ]
+        top_n = self.config.server.cache_warming.top_n
+        warmed = 0
+        for tool_name in tool_names:
+            warmed += await self.warm(tool_name, self.query_log.top(tool_name, top_n))
+        logger.info(f"Warmed the cache with {warmed} queries of {tool_names}")
+        return warmed
+
+    async def refresh_content_versions(self) -> List[str]:
+        """Refresh the content versions of the data stores, and return the tools changed"""
+        changed = []
+        for data_store in self.config.data_stores:
+            # NOTE Only the Vertex AI data stores have the content versions.
+            if data_store.backend != VERTEXAI_BACKEND:
+                continue
+            # pylint: disable=broad-exception-caught
+            try:
+                version = await get_content_version(
+                    self.get_data_store_client(data_store.location), data_store
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Failed to get the content version of {data_store.datastore_id}: {e}"
+                )
+                continue
+            known = data_store.tool_name in self.cache.content_versions
+            if self.cache.set_content_version(data_store.tool_name, version) and known:
+                changed.append(data_store.tool_name)
+        return changed
+
+    async def run(self) -> None:
+        """Warm the cache in the off-peak window, and whenever the content of a data store changes"""
+        warming_config = self.config.server.cache_warming
+        try:
+            while True:
+                changed = await self.refresh_content_versions()
+                if changed:
+                    logger.info(
+                        f"Re-warming the cache of the changed data stores {changed}"
+                    )
+                    await self.warm_top(changed)
+                window_start = get_off_peak_window_start(
+                    datetime.datetime.now(datetime.timezone.utc),
+                    warming_config.off_peak_start_hour,
+                    warming_config.off_peak_end_hour,
+                )
+                if window_start is not None and window_start != self.last_warmed_window:
+                    self.cache.purge_expired()
+                    await self.warm_top()
+                    self.last_warmed_window = window_start
+                await anyio.sleep(warming_config.check_interval_seconds)
+        finally:
+            # NOTE The warmer is cancelled when the server stops.
+            with anyio.CancelScope(shield=True):
+                await self.aclose()
@@ -1,19 +1,28 @@
-import asyncio
+import json
+import sys
+from typing import Optional, Tuple
 
+import anyio
 import click
-import vertexai
-
-from mcp_vertexai_search.agent import (
-    VertexAISearchAgent,
-    create_model,
-    create_vertex_ai_tools,
-    get_default_safety_settings,
-    get_generation_config,
-    get_system_instruction,
-)
-from mcp_vertexai_search.config import load_yaml_config
-from mcp_vertexai_search.google_cloud import get_credentials
+
+from mcp_vertexai_search.admission import AdmissionController
+from mcp_vertexai_search.agent import get_default_safety_settings
+from mcp_vertexai_search.backends import VERTEXAI_BACKEND
+from mcp_vertexai_search.bench import (
+    AgentBackend,
+    BenchBackend,
+    StubBackend,
+    format_table,
+    run_bench,
+)
+from mcp_vertexai_search.cache import QueryLog, ResponseCache, connect
+from mcp_vertexai_search.cache_warming import CacheWarmer
+from mcp_vertexai_search.config import Config, load_yaml_config
+from mcp_vertexai_search.engine import SearchEngine
+from mcp_vertexai_search.local_index import LocalIndex
+from mcp_vertexai_search.profiling import Profiler, phase, start_timer
 from mcp_vertexai_search.server import create_server, run_sse_server, run_stdio_server
+from mcp_vertexai_search.warmup import Warmer
 
 cli = click.Group()
 
@@ -29,30 +38,73 @@ cli = click.Group()
     help="The transport to use",
 )
 @click.option("--config", type=click.Path(exists=True), help="The config file")
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile the requests and log the phase timings",
+)
 def serve(
     host: str,
     port: int,
     transport: str,
     config: str,
+    profile: bool,
 ):
     server_config = load_yaml_config(config)
-    vertexai.init(
-        project=server_config.model.project_id, location=server_config.model.location
-    )
+    if profile:
+        server_config.server.profiling.enabled = True
+    engine = SearchEngine(server_config)
+    agent, credentials = engine.agent, engine.credentials
 
-    search_tools = create_vertex_ai_tools(server_config.data_stores)
-    model = create_model(
-        model_name=server_config.model.model_name,
-        tools=search_tools,
-        system_instruction=get_system_instruction(),
-    )
-    agent = VertexAISearchAgent(model=model)
+    cache, query_log, cache_warmer = None, None, None
+    if server_config.server.cache.enabled:
+        cache, query_log = create_cache(server_config)
+        if server_config.server.cache_warming.enabled:
+            cache_warmer = CacheWarmer(
+                agent,
+                server_config,
+                cache,
+                query_log,
+                credentials=credentials,
+                backends=engine.backends,
+            )
 
-    app = create_server(agent, server_config)
+    warmer = Warmer(
+        agent, server_config, credentials=credentials, cache_warmer=cache_warmer
+    )
+    profiler = Profiler(
+        enabled=server_config.server.profiling.enabled,
+        sample_rate=server_config.server.profiling.sample_rate,
+    )
+    admission = None
+    if server_config.server.admission.enabled:
+        admission = AdmissionController.from_config(server_config.server.admission)
+    app = create_server(
+        agent,
+        server_config,
+        readiness=warmer.readiness,
+        credentials=credentials,
+        profiler=profiler,
+        cache=cache,
+        query_log=query_log,
+        admission=admission,
+        backends=engine.backends,
+    )
+    # NOTE The engine is closed on the event loop of the server, where its transports were opened.
     if transport == "stdio":
-        asyncio.run(run_stdio_server(app))
+        run_stdio_server(app, warmer=warmer, engine=engine)
     elif transport == "sse":
-        asyncio.run(run_sse_server(app, host, port))
+        run_sse_server(
+            app,
+            host,
+            port,
+            warmer=warmer,
+            profiler=profiler if server_config.server.profiling.admin_route else None,
+            admission=admission,
+            admin_token=server_config.server.profiling.admin_token,
+            engine=engine,
+        )
     else:
         raise ValueError(f"Invalid transport: {transport}")
 
@@ -60,43 +112,285 @@ def serve(
 @cli.command("search")
 @click.option("--config", type=click.Path(exists=True), help="The config file")
 @click.option("--query", type=str, help="The query to search for")
+@click.option(
+    "--tool",
+    "tool_name",
+    type=str,
+    default=None,
+    help="The tool to search with. If not provided, all the Vertex AI data stores are searched",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile the search and print the phase timings to stderr",
+)
 def search(
     config: str,
     query: str,
+    tool_name: Optional[str],
+    profile: bool,
 ):
-    # Load the config
     server_config = load_yaml_config(config)
+    tool_names = [data_store.tool_name for data_store in server_config.data_stores]
+    if tool_name is None and not any(
+        data_store.backend == VERTEXAI_BACKEND
+        for data_store in server_config.data_stores
+    ):
+        raise click.UsageError(
+            f"No data store is served by Vertex AI. Choose a tool with --tool from {tool_names}"
+        )
+    if tool_name is not None and tool_name not in tool_names:
+        raise click.UsageError(
+            f"Unknown tool: {tool_name}. Choose a tool with --tool from {tool_names}"
+        )
+    profiler = Profiler(enabled=profile)
+    with start_timer() as timer:
+        response = profiler.run(lambda: run_search(server_config, query, tool_name))
+    print(response)
+    if profile:
+        print(json.dumps(timer.to_dict(), indent=2), file=sys.stderr)
+        print(profiler.report(limit=30), file=sys.stderr)
 
-    # Initialize the Vertex AI client
-    credentials = get_credentials(
-        impersonate_service_account=server_config.model.impersonate_service_account,
-    )
-    vertexai.init(
-        project=server_config.model.project_id,
-        location=server_config.model.location,
-        credentials=credentials,
-    )
 
-    # Create the search agent
-    search_tools = create_vertex_ai_tools(server_config.data_stores)
-    model = create_model(
-        model_name=server_config.model.model_name,
-        tools=search_tools,
-        system_instruction=get_system_instruction(),
-    )
-    agent = VertexAISearchAgent(
-        model=model,
-    )
+def run_search(
+    server_config: Config, query: str, tool_name: Optional[str] = None
+) -> str:
+    async def arun() -> str:
+        engine = SearchEngine(server_config)
+        # Create the search agent
+        # NOTE Entering the engine opens it, so open it first to time the initialization.
+        with phase("auth"):
+            await anyio.to_thread.run_sync(engine.open)
+        async with engine:
+            # Generate the response
+            result = await engine.search(query, tool_name=tool_name)
+        return result.text
+
+    return anyio.run(arun)
+
 
-    # Generate the response
-    generation_config = get_generation_config()
-    safety_settings = get_default_safety_settings()
-    response = agent.search(
-        query,
-        generation_config=generation_config,
-        safety_settings=safety_settings,
+@cli.command("warm")
+@click.option("--config", type=click.Path(exists=True), help="The config file")
+@click.option(
+    "--queries-file",
+    type=click.Path(exists=True),
+    default=None,
+    help="The file of the queries to warm, one per line. If not provided, the most frequent queries in the query log are warmed",
+)
+@click.option(
+    "--tool",
+    "tool_names",
+    type=str,
+    multiple=True,
+    help="The tool to warm. If not provided, all the tools are warmed",
+)
+def warm(config: str, queries_file: Optional[str], tool_names: Tuple[str, ...]):
+    server_config = load_yaml_config(config)
+    if not server_config.server.cache.path:
+        raise click.UsageError(
+            "server.cache.path is required to share the warmed cache with the server"
+        )
+    cache, query_log = create_cache(server_config)
+    tool_names = list(tool_names) or [
+        data_store.tool_name for data_store in server_config.data_stores
+    ]
+
+    async def arun() -> int:
+        async with SearchEngine(server_config) as engine:
+            cache_warmer = CacheWarmer(
+                engine.agent,
+                server_config,
+                cache,
+                query_log,
+                credentials=engine.credentials,
+                backends=engine.backends,
+            )
+            try:
+                # Tag the warmed responses with the current content versions
+                await cache_warmer.refresh_content_versions()
+                if queries_file is None:
+                    return await cache_warmer.warm_top(tool_names)
+                with open(queries_file, "r") as f:
+                    queries = [line.strip() for line in f if line.strip()]
+                warmed = 0
+                for tool_name in tool_names:
+                    warmed += await cache_warmer.warm(tool_name, queries)
+                return warmed
+            finally:
+                await cache_warmer.aclose()
+
+    print(f"Warmed {anyio.run(arun)} queries")
+
+
+@cli.command("index")
+@click.option("--config", type=click.Path(exists=True), help="The config file")
+@click.option(
+    "--tool",
+    "tool_names",
+    type=str,
+    multiple=True,
+    help="The tool to index. If not provided, all the tools of the local backend are indexed",
+)
+def index(config: str, tool_names: Tuple[str, ...]):
+    """Build or update the local full-text indexes incrementally"""
+    server_config = load_yaml_config(config)
+    data_stores = [
+        data_store
+        for data_store in server_config.data_stores
+        if data_store.backend == "local"
+        and (not tool_names or data_store.tool_name in tool_names)
+    ]
+    if not data_stores:
+        raise click.UsageError("No data stores of the local backend to index")
+    for data_store in data_stores:
+        local_index = LocalIndex.from_config(data_store)
+        try:
+            stats = local_index.reindex()
+        finally:
+            local_index.close()
+        print(
+            f"{data_store.tool_name}: {stats.added} added, {stats.updated} updated, "
+            f"{stats.removed} removed, {stats.passages} passages in {stats.seconds:.3f} seconds"
+        )
+
+
+@cli.command("bench")
+@click.option("--config", type=click.Path(exists=True), help="The config file")
+@click.option(
+    "--queries-file",
+    type=click.Path(exists=True),
+    required=True,
+    help="The file of the queries to benchmark with, one per line",
+)
+@click.option(
+    "--tool",
+    "tool_names",
+    type=str,
+    multiple=True,
+    help="The tool to benchmark. If not provided, all the tools are benchmarked",
+)
+@click.option(
+    "--concurrency",
+    "concurrency_levels",
+    type=click.IntRange(min=1),
+    multiple=True,
+    default=(1, 2, 4, 8, 16),
+    show_default=True,
+    help="The concurrency levels to benchmark at",
+)
+@click.option(
+    "--requests-per-level",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="The number of the requests per data store and concurrency level",
+)
+@click.option(
+    "--max-error-rate",
+    type=click.FloatRange(min=0.0, max=1.0),
+    default=0.05,
+    show_default=True,
+    help="The maximum error rate of the concurrency level to be the knee",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["configured", "stub"]),
+    default="configured",
+    show_default=True,
+    help="The backend to benchmark. The configured one searches with the backends of the data stores, and the stub one is a stand-in to test the benchmark offline",
+)
+@click.option(
+    "--stub-latency",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="The latency in seconds of the stub backend",
+)
+@click.option(
+    "--stub-capacity",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="The number of the concurrent requests the stub backend serves",
+)
+@click.option(
+    "--output-json",
+    type=click.Path(),
+    default=None,
+    help="The file to write the report in JSON to",
+)
+def bench(
+    config: str,
+    queries_file: str,
+    tool_names: Tuple[str, ...],
+    concurrency_levels: Tuple[int, ...],
+    requests_per_level: int,
+    max_error_rate: float,
+    backend: str,
+    stub_latency: float,
+    stub_capacity: int,
+    output_json: Optional[str],
+):
+    server_config = load_yaml_config(config)
+    data_stores = [
+        data_store
+        for data_store in server_config.data_stores
+        if not tool_names or data_store.tool_name in tool_names
+    ]
+    if not data_stores:
+        raise click.UsageError("No data stores to benchmark")
+    with open(queries_file, "r") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    async def run(bench_backend: BenchBackend):
+        return await run_bench(
+            bench_backend,
+            [data_store.tool_name for data_store in data_stores],
+            queries,
+            list(concurrency_levels),
+            requests_per_level,
+            max_error_rate=max_error_rate,
+        )
+
+    async def arun():
+        if backend == "stub":
+            return await run(
+                StubBackend(latency_seconds=stub_latency, capacity=stub_capacity)
+            )
+        # Search each data store with its own model to measure them separately
+        async with SearchEngine(server_config) as engine:
+            agents = {
+                data_store.tool_name: engine.get_agent(data_store.tool_name)
+                for data_store in data_stores
+            }
+            return await run(
+                AgentBackend(
+                    agents,
+                    generation_config=engine.get_generation_config(),
+                    safety_settings=get_default_safety_settings(),
+                )
+            )
+
+    report = anyio.run(arun)
+    print(format_table(report))
+    if output_json:
+        with open(output_json, "w") as f:
+            f.write(report.model_dump_json(indent=2))
+
+
+def create_cache(server_config: Config) -> Tuple[ResponseCache, QueryLog]:
+    """Create the response cache and the query log"""
+    cache_config = server_config.server.cache
+    cache = ResponseCache(
+        connect(cache_config.path), max_age_seconds=cache_config.max_age_seconds
     )
-    print(response)
+    query_log = QueryLog(
+        connect(cache_config.path),
+        half_life_seconds=cache_config.query_log_half_life_seconds,
+        max_entries=cache_config.query_log_max_entries,
+    )
+    return cache, query_log
 
 
 @cli.command("validate-config")
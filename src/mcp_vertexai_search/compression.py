@@ -0,0 +1,295 @@
+import itertools
+import math
+import random
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from google import auth
+from google.cloud import discoveryengine_v1
+from google.protobuf.json_format import MessageToDict
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from mcp_vertexai_search.config import DataStoreConfig
+from mcp_vertexai_search.google_cloud import (
+    get_discoveryengine_client_options,
+    get_serving_config_name,
+)
+from mcp_vertexai_search.references import GroundedReference
+from mcp_vertexai_search.text import terms
+
+# Words of the latin scripts and the CJK characters, which are roughly a token each
+_TOKEN_PATTERN = re.compile(r"[0-9A-Za-z]+|[^\s0-9A-Za-z]")
+# The tags highlighting the query terms in the extractive segments
+_HIGHLIGHT_PATTERN = re.compile(r"</?b>")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class Passage(BaseModel):
+    """A passage retrieved from a data store"""
+
+    tool_name: str = Field(..., description="The tool name of the data store")
+    title: str = Field(description="The title of the document", default="")
+    uri: str = Field(description="The URI of the document", default="")
+    text: str = Field(..., description="The text of the passage")
+    score: Optional[float] = Field(
+        description="The relevance score by the data store", default=None
+    )
+
+    def to_reference(self) -> GroundedReference:
+        return GroundedReference(
+            title=self.title, uri=self.uri, text=self.text, score=self.score
+        )
+
+
+class CompressionResult(BaseModel):
+    """The passages kept for the generation"""
+
+    passages: List[Passage] = Field(
+        description="The kept passages, the best first", default_factory=list
+    )
+    tokens_before: int = Field(
+        description="The estimated tokens of all the retrieved passages", default=0
+    )
+    tokens_after: int = Field(
+        description="The estimated tokens of the kept passages", default=0
+    )
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of the tokens without a tokenizer"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def bm25_scores(
+    query: str, documents: List[str], k1: float = 1.2, b: float = 0.75
+) -> List[float]:
+    """Score the documents against the query with Okapi BM25"""
+    document_terms = [terms(document) for document in documents]
+    if not document_terms:
+        return []
+    average_length = sum(len(t) for t in document_terms) / len(document_terms) or 1.0
+    document_frequencies: Counter = Counter()
+    for t in document_terms:
+        document_frequencies.update(set(t))
+
+    scores = []
+    query_terms = set(terms(query))
+    for t in document_terms:
+        frequencies = Counter(t)
+        score = 0.0
+        for term in query_terms:
+            frequency = frequencies.get(term, 0)
+            if frequency == 0:
+                continue
+            n = document_frequencies[term]
+            idf = math.log(1.0 + (len(document_terms) - n + 0.5) / (n + 0.5))
+            score += idf * (
+                frequency
+                * (k1 + 1)
+                / (frequency + k1 * (1 - b + b * len(t) / average_length))
+            )
+        scores.append(score)
+    return scores
+
+
+class MinHasher:
+    """Estimate the Jaccard similarity of the texts by the MinHash of the term shingles
+
+    A signature is the bottom-k hashes of the shingles, which needs a single hash per shingle.
+    """
+
+    def __init__(self, num_hashes: int = 64, shingle_size: int = 3, seed: int = 0):
+        self.num_hashes = num_hashes
+        self.shingle_size = shingle_size
+        # trunk-ignore(bandit/B311)
+        generator = random.Random(seed)
+        self._a = generator.randrange(1, _MERSENNE_PRIME)
+        self._b = generator.randrange(0, _MERSENNE_PRIME)
+
+    def shingles(self, text: str) -> Set[str]:
+        words = terms(text)
+        size = min(self.shingle_size, len(words)) or 1
+        return {
+            " ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))
+        }
+
+    def signature(self, text: str) -> List[int]:
+        hashes = {
+            (self._a * zlib.crc32(shingle.encode("utf-8")) + self._b) % _MERSENNE_PRIME
+            for shingle in self.shingles(text)
+        }
+        return sorted(hashes)[: self.num_hashes]
+
+    def similarity(self, signature: List[int], other: List[int]) -> float:
+        union = sorted(set(signature) | set(other))[: self.num_hashes]
+        if not union:
+            return 1.0
+        both = set(signature) & set(other)
+        return sum(h in both for h in union) / len(union)
+
+
+def compress_passages(
+    query: str,
+    passages: List[Passage],
+    data_stores: Dict[str, DataStoreConfig],
+    min_hasher: Optional[MinHasher] = None,
+) -> CompressionResult:
+    """Keep the best passages within the token budgets of the data stores
+
+    The passages are ranked by BM25 against the query across the data stores,
+    and the near-duplicates of the better passages are dropped.
+    """
+    if min_hasher is None:
+        min_hasher = MinHasher()
+    tokens = [estimate_tokens(passage.text) for passage in passages]
+    scores = bm25_scores(query, [f"{p.title}\n{p.text}" for p in passages])
+    ranked = sorted(range(len(passages)), key=lambda i: -scores[i])
+
+    kept: List[int] = []
+    signatures: List[List[int]] = []
+    used_tokens: Dict[str, int] = {}
+    for i in ranked:
+        passage = passages[i]
+        compression_config = data_stores[passage.tool_name].compression
+        used = used_tokens.get(passage.tool_name, 0)
+        if used + tokens[i] > compression_config.max_tokens:
+            continue
+        signature = min_hasher.signature(passage.text)
+        if any(
+            min_hasher.similarity(signature, other)
+            >= compression_config.duplicate_threshold
+            for other in signatures
+        ):
+            continue
+        kept.append(i)
+        signatures.append(signature)
+        used_tokens[passage.tool_name] = used + tokens[i]
+
+    return CompressionResult(
+        passages=[passages[i] for i in kept],
+        tokens_before=sum(tokens),
+        tokens_after=sum(tokens[i] for i in kept),
+    )
+
+
+def parse_passages(
+    tool_name: str, document: discoveryengine_v1.Document, max_segments: int
+) -> List[Passage]:
+    """Parse the extractive segments, or the snippets, of a retrieved document"""
+    data = MessageToDict(
+        document._pb.derived_struct_data
+    )  # pylint: disable=protected-access
+    title = data.get("title", "")
+    uri = data.get("link", "")
+    passages = []
+    for segment in data.get("extractive_segments", [])[:max_segments]:
+        if segment.get("content"):
+            passages.append(
+                Passage(
+                    tool_name=tool_name,
+                    title=title,
+                    uri=uri,
+                    text=segment["content"],
+                    score=segment.get("relevanceScore"),
+                )
+            )
+    if passages:
+        return passages
+    # NOTE The extractive segments are only available in the enterprise edition.
+    for snippet in data.get("snippets", [])[:max_segments]:
+        if snippet.get("snippet"):
+            passages.append(
+                Passage(
+                    tool_name=tool_name,
+                    title=title,
+                    uri=uri,
+                    text=_HIGHLIGHT_PATTERN.sub("", snippet["snippet"]),
+                )
+            )
+    return passages
+
+
+class ContextCompressor:
+    """Retrieve the passages from the data stores and compress them before the generation"""
+
+    def __init__(
+        self,
+        data_stores: List[DataStoreConfig],
+        credentials: Optional[auth.credentials.Credentials] = None,
+    ):
+        self.data_stores = {
+            data_store.tool_name: data_store for data_store in data_stores
+        }
+        self.credentials = credentials
+        self.min_hasher = MinHasher()
+        self._clients: Dict[str, discoveryengine_v1.SearchServiceClient] = {}
+
+    def _get_client(self, location: str) -> discoveryengine_v1.SearchServiceClient:
+        # Reuse a client per location to keep the connections
+        client = self._clients.get(location)
+        if client is None:
+            client = discoveryengine_v1.SearchServiceClient(
+                credentials=self.credentials,
+                client_options=get_discoveryengine_client_options(location),
+            )
+            self._clients[location] = client
+        return client
+
+    def retrieve(self, data_store: DataStoreConfig, query: str) -> List[Passage]:
+        compression_config = data_store.compression
+        request = discoveryengine_v1.SearchRequest(
+            serving_config=get_serving_config_name(
+                data_store.project_id, data_store.location, data_store.datastore_id
+            ),
+            query=query,
+            page_size=compression_config.max_documents,
+            content_search_spec=discoveryengine_v1.SearchRequest.ContentSearchSpec(
+                extractive_content_spec=discoveryengine_v1.SearchRequest.ContentSearchSpec.ExtractiveContentSpec(
+                    max_extractive_segment_count=compression_config.max_segments_per_document,
+                    return_extractive_segment_score=True,
+                ),
+                snippet_spec=discoveryengine_v1.SearchRequest.ContentSearchSpec.SnippetSpec(
+                    return_snippet=True,
+                ),
+            ),
+        )
+        pager = self._get_client(data_store.location).search(request)
+        passages = []
+        # NOTE Iterating the pager fetches the next pages, so stop at the first page size.
+        for result in itertools.islice(pager, compression_config.max_documents):
+            passages.extend(
+                parse_passages(
+                    data_store.tool_name,
+                    result.document,
+                    compression_config.max_segments_per_document,
+                )
+            )
+        return passages
+
+    def close(self) -> None:
+        """Close the transports of the clients"""
+        for client in self._clients.values():
+            client.transport.close()
+        self._clients = {}
+
+    def compress(self, query: str) -> CompressionResult:
+        """Retrieve the passages for a query and keep the best ones"""
+        passages: List[Passage] = []
+        for data_store in self.data_stores.values():
+            passages.extend(self.retrieve(data_store, query))
+        result = compress_passages(
+            query, passages, self.data_stores, min_hasher=self.min_hasher
+        )
+        logger.info(
+            f"Compressed {len(passages)} passages into {len(result.passages)}: "
+            f"{result.tokens_before} -> {result.tokens_after} tokens, "
+            f"{result.tokens_saved} saved"
+        )
+        return result
@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class GenerateContentConfig(BaseModel):
@@ -17,12 +17,27 @@ class GenerateContentConfig(BaseModel):
     )
 
 
+class ModelLocationConfig(BaseModel):
+    """The configuration for a location to serve a Vertex AI model."""
+
+    location: str = Field(..., description="The location of the model")
+    weight: float = Field(
+        description="The routing weight of the location. A larger weight prefers the location",
+        default=1.0,
+        gt=0.0,
+    )
+
+
 class VertexAIModelConfig(BaseModel):
     """The configuration for a Vertex AI model."""
 
     model_name: str = Field(..., description="The name of the Vertex AI model")
     project_id: str = Field(..., description="The project ID of the Vertex AI model")
     location: str = Field(..., description="The location of the model")
+    locations: List[ModelLocationConfig] = Field(
+        description="The ordered list of locations to route the requests to. If not provided, only `location` is used",
+        default_factory=list,
+    )
     impersonate_service_account: Optional[str] = Field(
         None, description="The service account to impersonate"
     )
@@ -31,15 +46,119 @@ class VertexAIModelConfig(BaseModel):
         default_factory=GenerateContentConfig,
     )
 
+    def get_locations(self) -> List[ModelLocationConfig]:
+        """Get the locations to route the requests to"""
+        if self.locations:
+            return self.locations
+        return [ModelLocationConfig(location=self.location)]
+
+
+class ReferenceConfig(BaseModel):
+    """The configuration for the references in the tool results."""
+
+    max_references: Optional[int] = Field(
+        description="The maximum number of references in a tool result. If not provided, all the references are kept",
+        default=None,
+        ge=0,
+    )
+    max_snippet_chars: Optional[int] = Field(
+        description="The maximum number of characters of a snippet in a tool result. If not provided, the snippets aren't truncated",
+        default=None,
+        ge=0,
+    )
+    snippet_preview_chars: int = Field(
+        description="The number of characters of the snippet preview in a compact reference. 0 disables the preview",
+        default=0,
+        ge=0,
+    )
+
+    @property
+    def is_limited(self) -> bool:
+        return self.max_references is not None or self.max_snippet_chars is not None
+
+
+class CompressionConfig(BaseModel):
+    """The configuration for the context compression before the generation."""
+
+    enabled: bool = Field(
+        description="Whether to retrieve the passages directly and compress them instead of the grounding",
+        default=False,
+    )
+    max_documents: int = Field(
+        description="The maximum number of the documents to retrieve per query",
+        default=10,
+        gt=0,
+    )
+    max_segments_per_document: int = Field(
+        description="The maximum number of the extractive segments per document",
+        default=3,
+        gt=0,
+    )
+    max_tokens: int = Field(
+        description="The token budget of the passages passed to the model",
+        default=2000,
+        gt=0,
+    )
+    duplicate_threshold: float = Field(
+        description="The estimated similarity to drop a passage as a near-duplicate of a better one",
+        default=0.8,
+        ge=0.0,
+        le=1.0,
+    )
+
+
+class LocalIndexConfig(BaseModel):
+    """The configuration for the local full-text index of a directory."""
+
+    path: Optional[str] = Field(
+        description="The directory of the documents to index", default=None
+    )
+    index_path: Optional[str] = Field(
+        description="The SQLite file of the index. If not provided, it is created in the directory of the documents",
+        default=None,
+    )
+    patterns: List[str] = Field(
+        description="The glob patterns of the documents in the directory",
+        default_factory=lambda: ["**/*.md", "**/*.txt", "**/*.rst"],
+    )
+    max_passage_chars: int = Field(
+        description="The maximum number of the characters of an indexed passage",
+        default=1000,
+        gt=0,
+    )
+    max_results: int = Field(
+        description="The maximum number of the passages in a tool result",
+        default=5,
+        gt=0,
+    )
+    reindex_interval_seconds: Optional[float] = Field(
+        description="The interval in seconds to pick up the changed documents in background. If not provided, the index is only built on startup",
+        default=60.0,
+        gt=0,
+    )
+    mmap_size: int = Field(
+        description="The bytes of the index to read through the memory map",
+        default=256 * 1024 * 1024,
+        ge=0,
+    )
+
 
 class DataStoreConfig(BaseModel):
-    """The configuration for a Vertex AI data store."""
+    """The configuration for a data store."""
 
-    project_id: str = Field(
-        ..., description="The project ID of the Vertex AI data store"
+    backend: str = Field(
+        description="The search backend of the data store: vertexai, local, or the name of a plugin",
+        default="vertexai",
+    )
+    project_id: Optional[str] = Field(
+        description="The project ID of the Vertex AI data store", default=None
+    )
+    location: Optional[str] = Field(
+        description="The location of the Vertex AI data store", default=None
+    )
+    datastore_id: Optional[str] = Field(
+        description="The ID of the Vertex AI data store", default=None
     )
-    location: str = Field(..., description="The location of the Vertex AI data store")
-    datastore_id: str = Field(..., description="The ID of the Vertex AI data store")
     tool_name: str = Field(
         ...,
         description="The name of the tool. If not provided, defaults to 'search_document_<datastore_id>'",
@@ -48,6 +167,270 @@ class DataStoreConfig(BaseModel):
         description="The description of the Vertex AI data store",
         default="",
     )
+    references: ReferenceConfig = Field(
+        description="The configuration for the references in the tool results",
+        default_factory=ReferenceConfig,
+    )
+    compression: CompressionConfig = Field(
+        description="The configuration for the context compression",
+        default_factory=CompressionConfig,
+    )
+    local: LocalIndexConfig = Field(
+        description="The configuration for the local backend",
+        default_factory=LocalIndexConfig,
+    )
+    backend_options: Dict[str, Any] = Field(
+        description="The options of a plugin backend", default_factory=dict
+    )
+
+    @model_validator(mode="after")
+    def check_backend(self) -> "DataStoreConfig":
+        if self.backend == "vertexai" and not (
+            self.project_id and self.location and self.datastore_id
+        ):
+            raise ValueError(
+                "project_id, location and datastore_id are required by the vertexai backend"
+            )
+        if self.backend == "local" and not self.local.path:
+            raise ValueError("local.path is required by the local backend")
+        return self
+
+
+class WarmupConfig(BaseModel):
+    """The configuration for the startup warm-up."""
+
+    enabled: bool = Field(
+        description="Whether to warm up credentials and connections before reporting ready",
+        default=False,
+    )
+    probe: bool = Field(
+        description="Whether to fire a probe request grounded on the Vertex AI data stores during the warm-up",
+        default=False,
+    )
+    probe_query: str = Field(
+        description="The query of the probe request",
+        default="ping",
+    )
+    keep_warm_interval: Optional[float] = Field(
+        description="The interval in seconds to ping the model endpoint. If not provided, the keep-warm pinger is disabled",
+        default=None,
+    )
+
+
+class ReferenceStoreConfig(BaseModel):
+    """The configuration for the payload of the references."""
+
+    mode: Literal["full", "compact"] = Field(
+        description="`full` lets the model copy the snippets into the tool results. `compact` returns reference handles, and serves the snippets as MCP resources",
+        default="full",
+    )
+    max_bytes: int = Field(
+        description="The maximum size in bytes of the snippets kept for the MCP resources",
+        default=16 * 1024 * 1024,
+        gt=0,
+    )
+
+
+class SessionMemoryConfig(BaseModel):
+    """The configuration for the retrieval context reuse in MCP sessions."""
+
+    enabled: bool = Field(
+        description="Whether to answer follow-up queries with the context of the previous turns",
+        default=False,
+    )
+    max_sessions: int = Field(
+        description="The maximum number of sessions to remember", default=1000, gt=0
+    )
+    max_turns: int = Field(
+        description="The maximum number of turns to remember per session and tool",
+        default=5,
+        gt=0,
+    )
+    ttl_seconds: float = Field(
+        description="The seconds to forget an idle session after", default=1800.0, gt=0
+    )
+    overlap_threshold: float = Field(
+        description="The minimum fraction of the query tokens found in the previous queries to reuse their snippets. The snippets must also contain all the query tokens",
+        default=0.6,
+        ge=0.0,
+        le=1.0,
+    )
+
+
+class ProfilingConfig(BaseModel):
+    """The configuration for the profiling of the requests."""
+
+    enabled: bool = Field(
+        description="Whether to profile the requests with cProfile and log the phase timings of every request",
+        default=False,
+    )
+    sample_rate: float = Field(
+        description="The fraction of the requests to profile with cProfile",
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+    )
+    admin_route: bool = Field(
+        description="Whether to serve /admin/profile on the SSE transport to switch the profiler at runtime",
+        default=False,
+    )
+    admin_token: Optional[str] = Field(
+        description="The bearer token to call /admin/profile with. If not provided, only the clients on localhost can call it",
+        default=None,
+    )
+    slow_request_threshold_seconds: Optional[float] = Field(
+        description="The seconds to log a request as slow with the phase timings. If not provided, the slow request log is disabled",
+        default=None,
+    )
+
+
+class CacheConfig(BaseModel):
+    """The configuration for the response cache and the query log."""
+
+    enabled: bool = Field(
+        description="Whether to cache the responses and log the queries", default=False
+    )
+    path: Optional[str] = Field(
+        description="The path to the SQLite database shared with the warm command. If not provided, an in-memory database is used",
+        default=None,
+    )
+    max_age_seconds: float = Field(
+        description="The seconds the cached responses expire after",
+        default=24 * 60 * 60,
+        gt=0,
+    )
+    query_log_half_life_seconds: float = Field(
+        description="The seconds the query counts decay by half after",
+        default=7 * 24 * 60 * 60,
+        gt=0,
+    )
+    query_log_max_entries: int = Field(
+        description="The maximum number of queries to log per tool", default=10000, gt=0
+    )
+
+
+class CacheWarmingConfig(BaseModel):
+    """The configuration for the background cache warming."""
+
+    enabled: bool = Field(
+        description="Whether to warm the cache in background", default=False
+    )
+    top_n: int = Field(
+        description="The number of the most frequent queries to warm per tool",
+        default=100,
+        gt=0,
+    )
+    rate_limit_per_second: float = Field(
+        description="The maximum number of queries per second to warm with",
+        default=1.0,
+        gt=0,
+    )
+    off_peak_start_hour: int = Field(
+        description="The hour in UTC when the off-peak window starts",
+        default=18,
+        ge=0,
+        le=23,
+    )
+    off_peak_end_hour: int = Field(
+        description="The hour in UTC when the off-peak window ends",
+        default=22,
+        ge=0,
+        le=23,
+    )
+    check_interval_seconds: float = Field(
+        description="The interval in seconds to check the off-peak window and the content versions of the data stores",
+        default=15 * 60,
+        gt=0,
+    )
+
+
+class PriorityClassConfig(BaseModel):
+    """The configuration for a priority class of the requests."""
+
+    name: str = Field(..., description="The name of the priority class")
+    weight: float = Field(
+        description="The share of the capacity under contention relative to the other classes",
+        default=1.0,
+        gt=0,
+    )
+    max_concurrency: Optional[int] = Field(
+        description="The maximum number of the concurrent requests of the class. If not provided, it is only bounded by the total",
+        default=None,
+        gt=0,
+    )
+    max_queue_depth: int = Field(
+        description="The maximum number of the queued requests of the class. The requests beyond it are rejected as busy",
+        default=100,
+        ge=0,
+    )
+
+
+def get_default_priority_classes() -> List[PriorityClassConfig]:
+    return [
+        PriorityClassConfig(name="interactive", weight=4.0),
+        PriorityClassConfig(name="batch", weight=1.0, max_concurrency=4),
+    ]
+
+
+class AdmissionConfig(BaseModel):
+    """The configuration for the admission control across MCP sessions."""
+
+    enabled: bool = Field(
+        description="Whether to queue the tool calls by priority class",
+        default=False,
+    )
+    max_concurrency: int = Field(
+        description="The maximum number of the concurrent tool calls in total",
+        default=16,
+        gt=0,
+    )
+    classes: List[PriorityClassConfig] = Field(
+        description="The priority classes",
+        default_factory=get_default_priority_classes,
+    )
+    default_class: str = Field(
+        description="The priority class of the requests without a known class",
+        default="interactive",
+    )
+    header: str = Field(
+        description="The HTTP header of the SSE requests to take the priority class from",
+        default="x-priority-class",
+    )
+    client_classes: Dict[str, str] = Field(
+        description="The priority classes by the client name in the MCP initialize request",
+        default_factory=dict,
+    )
+
+
+class QueryNormalizationConfig(BaseModel):
+    """The configuration for the normalization of the queries before reusing the responses."""
+
+    enabled: bool = Field(
+        description="Whether to key the cache, the query log and the coalescing by the normalized queries",
+        default=False,
+    )
+    fold_case: bool = Field(
+        description="Whether to fold the case of the letters", default=True
+    )
+    fold_punctuation: bool = Field(
+        description="Whether to fold the punctuation into spaces", default=True
+    )
+    strip_politeness: bool = Field(
+        description="Whether to strip the politeness phrases, such as please and ください",
+        default=True,
+    )
+    strip_stopwords: bool = Field(
+        description="Whether to strip the stopwords separated by spaces",
+        default=False,
+    )
+    extra_stopwords: List[str] = Field(
+        description="The stopwords to strip in addition to the built-in ones",
+        default_factory=list,
+    )
+    rewrite_query: bool = Field(
+        description="Whether to send the normalized query to the model instead of the original one",
+        default=False,
+    )
 
 
 class MCPServerConfig(BaseModel):
@@ -56,6 +439,37 @@ class MCPServerConfig(BaseModel):
     name: str = Field(
         description="The name of the MCP server", default="document-search"
     )
+    warmup: WarmupConfig = Field(
+        description="The startup warm-up configuration", default_factory=WarmupConfig
+    )
+    references: ReferenceStoreConfig = Field(
+        description="The configuration for the payload of the references",
+        default_factory=ReferenceStoreConfig,
+    )
+    session_memory: SessionMemoryConfig = Field(
+        description="The configuration for the retrieval context reuse in MCP sessions",
+        default_factory=SessionMemoryConfig,
+    )
+    profiling: ProfilingConfig = Field(
+        description="The configuration for the profiling of the requests",
+        default_factory=ProfilingConfig,
+    )
+    cache: CacheConfig = Field(
+        description="The configuration for the response cache and the query log",
+        default_factory=CacheConfig,
+    )
+    cache_warming: CacheWarmingConfig = Field(
+        description="The configuration for the background cache warming",
+        default_factory=CacheWarmingConfig,
+    )
+    admission: AdmissionConfig = Field(
+        description="The configuration for the admission control",
+        default_factory=AdmissionConfig,
+    )
+    query_normalization: QueryNormalizationConfig = Field(
+        description="The configuration for the normalization of the queries",
+        default_factory=QueryNormalizationConfig,
+    )
 
 
 class Config(BaseModel):
@@ -0,0 +1,290 @@
+from typing import AsyncIterator, Dict, List, Optional
+
+import anyio
+import vertexai
+from google import auth
+from loguru import logger
+from vertexai import generative_models
+
+from mcp_vertexai_search.agent import (
+    VertexAISearchAgent,
+    create_model,
+    create_region_router,
+    create_vertex_ai_tools,
+    get_compact_system_instruction,
+    get_default_safety_settings,
+    get_generation_config,
+    get_system_instruction,
+)
+from mcp_vertexai_search.backends import (
+    VERTEXAI_BACKEND,
+    SearchBackend,
+    close_backend,
+    create_backends,
+)
+from mcp_vertexai_search.compression import ContextCompressor
+from mcp_vertexai_search.config import Config, DataStoreConfig, load_yaml_config
+from mcp_vertexai_search.google_cloud import get_credentials
+from mcp_vertexai_search.normalization import QueryNormalizer
+from mcp_vertexai_search.references import SearchResult
+
+# The clients a model creates lazily and caches on itself
+_MODEL_CLIENT_ATTRIBUTES = (
+    "_prediction_client",
+    "_prediction_async_client",
+    "_llm_utility_client",
+    "_llm_utility_async_client",
+)
+
+
+def create_agent(
+    config: Config,
+    data_stores: List[DataStoreConfig],
+    credentials: Optional[auth.credentials.Credentials] = None,
+) -> VertexAISearchAgent:
+    """Create a search agent over the data stores
+
+    The Vertex AI client has to be initialized beforehand.
+    """
+    search_tools = create_vertex_ai_tools(data_stores)
+    system_instruction = (
+        get_compact_system_instruction()
+        if config.server.references.mode == "compact"
+        else get_system_instruction()
+    )
+    model = create_model(
+        model_name=config.model.model_name,
+        tools=search_tools,
+        system_instruction=system_instruction,
+    )
+    router = None
+    if len(config.model.get_locations()) > 1:
+        router = create_region_router(config.model, search_tools, system_instruction)
+    context_model, context_router = None, None
+    if config.server.session_memory.enabled:
+        context_model = create_model(
+            model_name=config.model.model_name,
+            tools=[],
+            system_instruction=system_instruction,
+        )
+        # The follow-up queries fail over across the locations as well
+        if len(config.model.get_locations()) > 1:
+            context_router = create_region_router(config.model, [], system_instruction)
+    compressor = None
+    compressed_data_stores = [
+        data_store for data_store in data_stores if data_store.compression.enabled
+    ]
+    if compressed_data_stores:
+        compressor = ContextCompressor(compressed_data_stores, credentials=credentials)
+    return VertexAISearchAgent(
+        model=model,
+        router=router,
+        context_model=context_model,
+        context_router=context_router,
+        compressor=compressor,
+    )
+
+
+class SearchEngine:
+    """An asynchronous search over the configured data stores
+
+    It owns the credentials, the clients and the models of the tools,
+    and the backends of the data stores not served by Vertex AI,
+    so that other Python services can search in process without going through MCP.
+    NOTE Opening the engine initializes the global Vertex AI config with `vertexai.init`,
+         overwriting the config set by the caller or another engine before.
+
+    ```python
+    async with SearchEngine.from_yaml("config.yml") as engine:
+        result = await engine.search("What was the revenue?", tool_name="alphabet")
+    ```
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        credentials: Optional[auth.credentials.Credentials] = None,
+    ):
+        self.config = config
+        self._credentials = credentials
+        self.normalizer = QueryNormalizer(config.server.query_normalization)
+        self._opened = False
+        self._agent: Optional[VertexAISearchAgent] = None
+        self._tool_agents: Dict[str, SearchBackend] = {}
+        self._backends: Dict[str, SearchBackend] = {}
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "SearchEngine":
+        return cls(load_yaml_config(path))
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened
+
+    @property
+    def credentials(self) -> Optional[auth.credentials.Credentials]:
+        self.open()
+        return self._credentials
+
+    @property
+    def agent(self) -> Optional[VertexAISearchAgent]:
+        """The agent searching all the Vertex AI data stores at once
+
+        It is None if no data store is served by Vertex AI.
+        """
+        self.open()
+        return self._agent
+
+    @property
+    def backends(self) -> Dict[str, SearchBackend]:
+        """The backends of the data stores not served by Vertex AI, by tool name"""
+        self.open()
+        return self._backends
+
+    @property
+    def tool_names(self) -> List[str]:
+        return [data_store.tool_name for data_store in self.config.data_stores]
+
+    def open(self) -> None:
+        """Initialize the Vertex AI client and create the agents and the backends, if not yet
+
+        It blocks on loading the credentials, so the asynchronous callers enter the engine instead.
+        """
+        if self.is_open:
+            return
+        self._backends = create_backends(self.config.data_stores)
+        self._tool_agents.update(self._backends)
+        vertexai_data_stores = [
+            data_store
+            for data_store in self.config.data_stores
+            if data_store.backend == VERTEXAI_BACKEND
+        ]
+        # NOTE The credentials aren't needed without the Vertex AI data stores, like in an air-gapped environment.
+        if vertexai_data_stores:
+            if self._credentials is None:
+                self._credentials = get_credentials(
+                    impersonate_service_account=self.config.model.impersonate_service_account,
+                )
+            vertexai.init(
+                project=self.config.model.project_id,
+                location=self.config.model.location,
+                credentials=self._credentials,
+            )
+            self._agent = create_agent(
+                self.config, vertexai_data_stores, credentials=self._credentials
+            )
+            # A model per tool searches only the data store of the tool
+            for data_store in vertexai_data_stores:
+                self._tool_agents[data_store.tool_name] = create_agent(
+                    self.config, [data_store], credentials=self._credentials
+                )
+        self._opened = True
+
+    def get_agent(self, tool_name: Optional[str] = None) -> SearchBackend:
+        """Get the backend of a tool, or the agent of all the Vertex AI data stores if the tool is not provided"""
+        self.open()
+        if tool_name is None:
+            if self._agent is None:
+                raise ValueError("No data store is served by Vertex AI")
+            return self._agent
+        agent = self._tool_agents.get(tool_name)
+        if agent is None:
+            raise ValueError(f"Unknown tool: {tool_name}")
+        return agent
+
+    def get_generation_config(self) -> generative_models.GenerationConfig:
+        return get_generation_config(
+            temperature=self.config.model.generate_content_config.temperature,
+            top_p=self.config.model.generate_content_config.top_p,
+        )
+
+    async def search(self, query: str, tool_name: Optional[str] = None) -> SearchResult:
+        """Search the data store of a tool, or all the Vertex AI data stores"""
+        return await self.get_agent(tool_name).asearch_result(
+            self.normalizer.normalize(query).text,
+            generation_config=self.get_generation_config(),
+            safety_settings=get_default_safety_settings(),
+        )
+
+    async def search_many(
+        self,
+        queries: List[str],
+        tool_name: Optional[str] = None,
+        max_concurrency: int = 8,
+    ) -> List[SearchResult]:
+        """Search the queries concurrently, and return the results in the order of the queries
+
+        The queries only differing in the form are searched once, and share the result.
+        The first error cancels the rest of the searches.
+        """
+        # The first query of each canonical query in the order of the queries
+        keys = [self.normalizer.normalize(query).key for query in queries]
+        unique_queries: Dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            unique_queries.setdefault(key, query)
+        results: Dict[str, SearchResult] = {}
+        limiter = anyio.CapacityLimiter(max_concurrency)
+
+        async def search_one(key: str, query: str) -> None:
+            async with limiter:
+                results[key] = await self.search(query, tool_name=tool_name)
+
+        async with anyio.create_task_group() as task_group:
+            for key, query in unique_queries.items():
+                task_group.start_soon(search_one, key, query)
+        return [results[key] for key in keys]
+
+    async def stream(
+        self, query: str, tool_name: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream the response text of a search"""
+        async for text in self.get_agent(tool_name).astream(
+            self.normalizer.normalize(query).text,
+            generation_config=self.get_generation_config(),
+            safety_settings=get_default_safety_settings(),
+        ):
+            yield text
+
+    async def aclose(self) -> None:
+        """Close the transports the models and the compressors opened, and the backends"""
+        for backend in self._backends.values():
+            close_backend(backend)
+        agents = [] if self._agent is None else [self._agent]
+        agents.extend(
+            agent
+            for tool_name, agent in self._tool_agents.items()
+            if tool_name not in self._backends
+        )
+        for agent in agents:
+            models = list(agent.models) + agent.context_models
+            for model in models:
+                await close_model_clients(model)
+            if agent.compressor is not None:
+                agent.compressor.close()
+        self._agent = None
+        self._tool_agents = {}
+        self._backends = {}
+        self._opened = False
+
+    async def __aenter__(self) -> "SearchEngine":
+        await anyio.to_thread.run_sync(self.open)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+async def close_model_clients(model: generative_models.GenerativeModel) -> None:
+    """Close the clients a model has created"""
+    for attribute in _MODEL_CLIENT_ATTRIBUTES:
+        # NOTE The clients are cached properties, so only the created ones are in __dict__.
+        client = model.__dict__.pop(attribute, None)
+        if client is None:
+            continue
+        # pylint: disable=broad-exception-caught
+        try:
+            result = client.transport.close()
+            if result is not None:
+                await result
+        except Exception as e:
+            logger.warning(f"Failed to close {attribute}: {e}")
@@ -1,7 +1,9 @@
 from typing import List, Optional
 
 from google import auth
+from google.api_core.client_options import ClientOptions
 from google.auth import impersonated_credentials
+from google.auth.transport import requests as auth_requests
 
 
 def get_credentials(
@@ -56,3 +58,35 @@ def get_impersonate_credentials(
         lifetime=lifetime,
     )
     return target_credentials
+
+
+def refresh_credentials(credentials: auth.credentials.Credentials) -> None:
+    """Refresh the credentials so that the access token is fetched in advance"""
+    credentials.refresh(auth_requests.Request())
+
+
+def ensure_valid_credentials(credentials: auth.credentials.Credentials) -> None:
+    """Refresh the credentials only if the access token is missing or expired"""
+    if not credentials.valid:
+        refresh_credentials(credentials)
+
+
+def get_discoveryengine_client_options(location: str) -> Optional[ClientOptions]:
+    """Get the client options of the Discovery Engine API for a location
+
+    The `global` location uses the default endpoint, and the multi-regions like `us` and `eu`
+    use the regional endpoints.
+    """
+    if location == "global":
+        return None
+    return ClientOptions(api_endpoint=f"{location}-discoveryengine.googleapis.com")
+
+
+def get_data_store_name(project_id: str, location: str, datastore_id: str) -> str:
+    """Get the full resource name of a Vertex AI data store"""
+    return f"projects/{project_id}/locations/{location}/collections/default_collection/dataStores/{datastore_id}"
+
+
+def get_serving_config_name(project_id: str, location: str, datastore_id: str) -> str:
+    """Get the resource name of the default serving config of a data store"""
+    return f"{get_data_store_name(project_id, location, datastore_id)}/servingConfigs/default_search"
@@ -0,0 +1,363 @@
+import json
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from mcp_vertexai_search.compression import Passage
+from mcp_vertexai_search.config import DataStoreConfig
+from mcp_vertexai_search.profiling import phase
+from mcp_vertexai_search.references import SearchResult
+from mcp_vertexai_search.session import Turn
+from mcp_vertexai_search.text import terms
+
+# The name of the index file in the directory of the documents by default
+DEFAULT_INDEX_NAME = ".mcp-vertexai-search-index.sqlite3"
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+_HEADING_PATTERN = re.compile(r"^#+\s+(.+)$", re.MULTILINE)
+
+
+class ReindexStats(BaseModel):
+    """The documents changed by a reindex"""
+
+    added: int = Field(description="The number of the new documents", default=0)
+    updated: int = Field(description="The number of the changed documents", default=0)
+    removed: int = Field(description="The number of the deleted documents", default=0)
+    passages: int = Field(
+        description="The number of the passages indexed from the changed documents",
+        default=0,
+    )
+    seconds: float = Field(description="The time the reindex took", default=0.0)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """Split a document into the passages of the paragraphs up to `max_chars`"""
+    passages: List[str] = []
+    current = ""
+    for paragraph in _PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            passages.append(current)
+            current = ""
+        while len(paragraph) > max_chars:
+            passages.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+def get_title(path: pathlib.Path, text: str) -> str:
+    """The first Markdown heading of a document, or the file name"""
+    match = _HEADING_PATTERN.search(text)
+    return match.group(1).strip() if match else path.stem
+
+
+def to_match_query(query: str) -> Optional[str]:
+    """Build an FTS5 query matching any of the terms of a query"""
+    unique_terms = list(dict.fromkeys(terms(query)))
+    if not unique_terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in unique_terms)
+
+
+class LocalIndex:
+    """An on-disk full-text index of the documents in a directory with SQLite FTS5
+
+    The documents are split into passages, and the passages are indexed by the same terms
+    as the rest of the package, so that the Japanese text without spaces is searchable by the bigrams.
+    The reindex only reads the documents added or changed since the last one.
+    The searches read the index through a memory map with a read-only connection per thread.
+    """
+
+    def __init__(
+        self,
+        documents_path: str,
+        index_path: Optional[str] = None,
+        patterns: Optional[List[str]] = None,
+        max_passage_chars: int = 1000,
+        mmap_size: int = 256 * 1024 * 1024,
+    ):
+        self.documents_path = pathlib.Path(documents_path)
+        self.index_path = pathlib.Path(
+            index_path or self.documents_path / DEFAULT_INDEX_NAME
+        )
+        self.patterns = patterns or ["**/*.md", "**/*.txt", "**/*.rst"]
+        self.max_passage_chars = max_passage_chars
+        self.mmap_size = mmap_size
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._read_connections: List[sqlite3.Connection] = []
+        self._writer = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        with self._writer:
+            self._writer.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """
+            )
+            self._writer.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+                    terms, path UNINDEXED, title UNINDEXED, text UNINDEXED
+                )
+                """
+            )
+
+    @classmethod
+    def from_config(cls, data_store: DataStoreConfig) -> "LocalIndex":
+        local_config = data_store.local
+        return cls(
+            local_config.path,
+            index_path=local_config.index_path,
+            patterns=local_config.patterns,
+            max_passage_chars=local_config.max_passage_chars,
+            mmap_size=local_config.mmap_size,
+        )
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        files: Dict[str, Tuple[int, int]] = {}
+        index_path = self.index_path.resolve()
+        for pattern in self.patterns:
+            for path in self.documents_path.glob(pattern):
+                if not path.is_file() or path.resolve() == index_path:
+                    continue
+                stat = path.stat()
+                relative_path = path.relative_to(self.documents_path).as_posix()
+                files[relative_path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _read_passages(self, relative_path: str) -> List[Tuple[str, str, str, str]]:
+        path = self.documents_path / relative_path
+        text = path.read_text(encoding="utf-8", errors="replace")
+        title = get_title(path, text)
+        return [
+            (" ".join(terms(f"{title}\n{passage}")), relative_path, title, passage)
+            for passage in split_passages(text, self.max_passage_chars)
+        ]
+
+    def reindex(self) -> ReindexStats:
+        """Index the documents added or changed since the last reindex, and drop the deleted ones"""
+        start = time.monotonic()
+        with self._write_lock:
+            files = self._scan()
+            known = {
+                path: (mtime_ns, size)
+                for path, mtime_ns, size in self._writer.execute(
+                    "SELECT path, mtime_ns, size FROM documents"
+                )
+            }
+            changed = [path for path, stat in files.items() if known.get(path) != stat]
+            removed = [path for path in known if path not in files]
+            rows = []
+            indexed = []
+            for path in changed:
+                try:
+                    rows.extend(self._read_passages(path))
+                    indexed.append(path)
+                except OSError as e:
+                    # The document is retried on the next reindex
+                    logger.warning(f"Failed to read {path}: {e}")
+            if changed or removed:
+                with self._writer:
+                    # NOTE Deleting by an unindexed column scans the passages, so scan them once.
+                    self._writer.execute(
+                        "CREATE TEMP TABLE IF NOT EXISTS stale (path TEXT PRIMARY KEY)"
+                    )
+                    self._writer.execute("DELETE FROM stale")
+                    self._writer.executemany(
+                        "INSERT INTO stale VALUES (?)",
+                        [(path,) for path in changed + removed],
+                    )
+                    self._writer.execute(
+                        "DELETE FROM passages WHERE path IN (SELECT path FROM stale)"
+                    )
+                    self._writer.execute(
+                        "DELETE FROM documents WHERE path IN (SELECT path FROM stale)"
+                    )
+                    self._writer.executemany(
+                        "INSERT INTO passages VALUES (?, ?, ?, ?)", rows
+                    )
+                    self._writer.executemany(
+                        "INSERT INTO documents VALUES (?, ?, ?)",
+                        [(path, *files[path]) for path in indexed],
+                    )
+        return ReindexStats(
+            added=sum(path not in known for path in changed),
+            updated=sum(path in known for path in changed),
+            removed=len(removed),
+            passages=len(rows),
+            seconds=time.monotonic() - start,
+        )
+
+    def _get_read_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                f"{self.index_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            self._local.connection = connection
+            with self._write_lock:
+                self._read_connections.append(connection)
+        return connection
+
+    def search(self, query: str, limit: int, tool_name: str = "") -> List[Passage]:
+        """Search the passages matching any of the terms of a query, the best first by BM25"""
+        match_query = to_match_query(query)
+        if match_query is None:
+            return []
+        rows = (
+            self._get_read_connection()
+            .execute(
+                """
+                SELECT path, title, text, bm25(passages) AS rank FROM passages
+                WHERE passages MATCH ? ORDER BY rank LIMIT ?
+                """,
+                (match_query, limit),
+            )
+            .fetchall()
+        )
+        return [
+            Passage(
+                tool_name=tool_name,
+                title=title,
+                uri=(self.documents_path / path).resolve().as_uri(),
+                text=text,
+                # NOTE The lower BM25 of FTS5 is the better.
+                score=-rank,
+            )
+            for path, title, text, rank in rows
+        ]
+
+    def close(self) -> None:
+        with self._write_lock:
+            for connection in self._read_connections:
+                connection.close()
+            self._read_connections = []
+            self._writer.close()
+
+
+class LocalSearchBackend:
+    """A search backend over the local full-text index of a directory
+
+    It answers with the best passage without the model, in the same response shape as the model,
+    so that a local corpus can be served in development, in air-gapped environments
+    and for the small collections needing low latency.
+    The index is refreshed periodically in a background thread, off the path of the searches.
+    """
+
+    def __init__(
+        self,
+        index: LocalIndex,
+        tool_name: str,
+        max_results: int = 5,
+        reindex_interval_seconds: Optional[float] = None,
+    ):
+        self.index = index
+        self.tool_name = tool_name
+        self.max_results = max_results
+        self.reindex_interval_seconds = reindex_interval_seconds
+        self.reindex()
+        self._stopped = threading.Event()
+        self._reindexer: Optional[threading.Thread] = None
+        if reindex_interval_seconds is not None:
+            self._reindexer = threading.Thread(
+                target=self._reindex_periodically,
+                name=f"reindex-{tool_name}",
+                daemon=True,
+            )
+            self._reindexer.start()
+
+    @classmethod
+    def from_config(cls, data_store: DataStoreConfig) -> "LocalSearchBackend":
+        return cls(
+            LocalIndex.from_config(data_store),
+            tool_name=data_store.tool_name,
+            max_results=data_store.local.max_results,
+            reindex_interval_seconds=data_store.local.reindex_interval_seconds,
+        )
+
+    def reindex(self) -> ReindexStats:
+        stats = self.index.reindex()
+        if stats.changed:
+            logger.info(
+                f"Reindexed {self.tool_name} in {stats.seconds:.3f} seconds: "
+                f"{stats.added} added, {stats.updated} updated, {stats.removed} removed"
+            )
+        return stats
+
+    def _reindex_periodically(self) -> None:
+        while not self._stopped.wait(self.reindex_interval_seconds):
+            # pylint: disable=broad-exception-caught
+            try:
+                self.reindex()
+            except Exception as e:
+                logger.warning(f"Failed to reindex {self.tool_name}: {e}")
+
+    def search_result(
+        self,
+        query: str,
+        generation_config=None,
+        safety_settings=None,
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult:
+        """Search the index, ignoring the generation settings and the session history"""
+        with phase("upstream"):
+            passages = self.index.search(query, self.max_results, self.tool_name)
+        with phase("response_parse"):
+            return to_search_result(passages)
+
+    async def asearch_result(
+        self,
+        query: str,
+        generation_config=None,
+        safety_settings=None,
+        history: Optional[List[Turn]] = None,
+    ) -> SearchResult:
+        return await anyio.to_thread.run_sync(self.search_result, query)
+
+    async def astream(
+        self, query: str, generation_config=None, safety_settings=None
+    ) -> AsyncIterator[str]:
+        result = await self.asearch_result(query)
+        yield result.text
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._reindexer is not None:
+            self._reindexer.join()
+        self.index.close()
+
+
+def to_search_result(passages: List[Passage]) -> SearchResult:
+    """Answer with the best passage in the JSON format of the system instruction"""
+    payload = {
+        "answer": passages[0].text if passages else "No matching documents were found.",
+        "references": [
+            {"title": passage.title, "raw_text": passage.text} for passage in passages
+        ],
+    }
+    return SearchResult(
+        text=json.dumps(payload, ensure_ascii=False),
+        references=[passage.to_reference() for passage in passages],
+    )
@@ -0,0 +1,136 @@
+import hashlib
+import re
+import unicodedata
+from typing import FrozenSet, Optional
+
+from pydantic import BaseModel, Field
+
+from mcp_vertexai_search.config import QueryNormalizationConfig
+
+# The symbols which change the meaning of a query, such as 15% and C#
+_KEPT_PUNCTUATION = frozenset("%#&@")
+# NOTE The stopwords are conservative, unlike the ones to compare the topics,
+#      so that the questions asking different things never share a canonical query.
+#      The interrogatives, the negations, the tenses, the prepositions and the case particles are kept.
+# The articles of English
+_ENGLISH_STOPWORDS = frozenset(["a", "an", "the"])
+# The genitive and the topic particles of Japanese, which are stopwords only when separated by spaces
+_JAPANESE_STOPWORDS = frozenset(["の", "って", "とは"])
+# The politeness phrases at the start of the queries, after the case and the punctuation folding
+_LEADING_POLITENESS = re.compile(
+    r"^(?:please|could you|can you|would you|i would like to know|i want to know)\s+",
+    re.IGNORECASE,
+)
+# The politeness phrases at the end of the queries
+_TRAILING_POLITENESS = re.compile(
+    r"\s*(?:please|thanks|thank you|"
+    r"を?教えて(?:ください|下さい|くれ|ほしい|欲しい)?|"
+    r"を?お願い(?:します|致します|いたします)?|"
+    r"を?知りたい(?:です)?|"
+    r"ください|下さい|でしょうか)$",
+    re.IGNORECASE,
+)
+
+
+class NormalizedQuery(BaseModel):
+    """A query with its canonical form"""
+
+    text: str = Field(..., description="The query to send to the model")
+    key: str = Field(
+        ..., description="The canonical query to key the reused responses by"
+    )
+    fingerprint: str = Field(..., description="The short hash of the canonical query")
+
+
+def fingerprint(key: str) -> str:
+    """A short and stable hash of a canonical query to log without the query itself"""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def fold_punctuation(text: str) -> str:
+    """Replace the punctuation with spaces, keeping the separators and the signs of the numbers"""
+    chars = []
+    for i, char in enumerate(text):
+        if (
+            unicodedata.category(char).startswith("P")
+            and char not in _KEPT_PUNCTUATION
+            and not (
+                char in ".,"
+                and 0 < i < len(text) - 1
+                and text[i - 1].isdigit()
+                and text[i + 1].isdigit()
+            )
+            # NOTE "+" isn't a punctuation, so only "-" needs keeping, as in -5%.
+            and not (char == "-" and i < len(text) - 1 and text[i + 1].isdigit())
+        ):
+            chars.append(" ")
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def strip_politeness(text: str) -> str:
+    """Strip the politeness phrases at the start and the end, as long as something is left"""
+    while True:
+        stripped = _TRAILING_POLITENESS.sub("", _LEADING_POLITENESS.sub("", text))
+        stripped = stripped.strip()
+        if not stripped or stripped == text:
+            return text
+        text = stripped
+
+
+class QueryNormalizer:
+    """Normalize the queries which only differ in the form into a canonical query
+
+    The canonical query is NFKC normalized, so that the full-width and the half-width characters match,
+    and the case, the punctuation and the whitespace are folded.
+    The politeness phrases and the stopwords are stripped in English and Japanese if configured.
+    The model sees the original query unless `rewrite_query` is set.
+    """
+
+    def __init__(self, config: Optional[QueryNormalizationConfig] = None):
+        self.config = config or QueryNormalizationConfig()
+        self.stopwords: FrozenSet[str] = (
+            _ENGLISH_STOPWORDS
+            | _JAPANESE_STOPWORDS
+            | frozenset(self.config.extra_stopwords)
+        )
+
+    def canonicalize(self, query: str) -> str:
+        """Get the canonical form of a query
+
+        Canonicalizing a canonical query doesn't change it.
+        """
+        text = unicodedata.normalize("NFKC", query)
+        if self.config.fold_case:
+            text = text.casefold()
+        if self.config.fold_punctuation:
+            text = fold_punctuation(text)
+        text = " ".join(text.split())
+        # NOTE Stripping a stopword may expose a politeness phrase at the end, and vice versa.
+        while True:
+            stripped = text
+            if self.config.strip_politeness:
+                stripped = strip_politeness(stripped)
+            if self.config.strip_stopwords:
+                stripped = self.strip_stopwords(stripped)
+            if stripped == text:
+                return text
+            text = stripped
+
+    def strip_stopwords(self, text: str) -> str:
+        """Strip the stopwords separated by spaces, as long as something is left"""
+        words = [word for word in text.split() if word.casefold() not in self.stopwords]
+        return " ".join(words) or text
+
+    def normalize(self, query: str) -> NormalizedQuery:
+        if not self.config.enabled:
+            return NormalizedQuery(
+                text=query, key=query, fingerprint=fingerprint(query)
+            )
+        key = self.canonicalize(query)
+        return NormalizedQuery(
+            text=key if self.config.rewrite_query else query,
+            key=key,
+            fingerprint=fingerprint(key),
+        )
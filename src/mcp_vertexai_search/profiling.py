@@ -0,0 +1,169 @@
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+# NOTE Only one cProfile profile can be active per process since Python 3.12.
+_profile_lock = threading.Lock()
+_current_timer: ContextVar[Optional["PhaseTimer"]] = ContextVar(
+    "current_timer", default=None
+)
+
+
+class PhaseTimer:
+    """Timings of the phases of a request"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.phases: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+    def total(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total(),
+            "phases": self.phases,
+        }
+
+
+@contextlib.contextmanager
+def start_timer() -> Iterator[PhaseTimer]:
+    """Start timing the phases of a request in the current context
+
+    The timer already started in the context is continued, if any.
+    """
+    current = _current_timer.get()
+    if current is not None:
+        yield current
+        return
+    timer = PhaseTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def current_timer() -> Optional[PhaseTimer]:
+    return _current_timer.get()
+
+
+def phase(name: str) -> contextlib.AbstractContextManager:
+    """Time a phase of the current request. It does nothing without a timer"""
+    timer = _current_timer.get()
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.phase(name)
+
+
+class Profiler:
+    """A sampling profiler of the requests switchable at runtime
+
+    A sampled request runs under cProfile, and the stats are accumulated until they are reset.
+    The requests running while another one is profiled aren't sampled.
+    NOTE Since Python 3.12, cProfile hooks sys.monitoring for the whole process,
+         so the stats include the work of the other threads running meanwhile.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.sampled_requests = 0
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def configure(
+        self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None
+    ) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError(f"Invalid sample rate: {sample_rate}")
+            self.sample_rate = sample_rate
+
+    def run(self, func: Callable[[], T]) -> T:
+        """Run a function, profiling it if it is sampled"""
+        # trunk-ignore(bandit/B311)
+        if not self.enabled or random.random() >= self.sample_rate:
+            return func()
+        if not _profile_lock.acquire(blocking=False):
+            return func()
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiling tool than this profiler is active.
+                return func()
+            try:
+                return func()
+            finally:
+                profile.disable()
+                with self._lock:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profile)
+                    else:
+                        self._stats.add(profile)
+                    self.sampled_requests += 1
+        finally:
+            _profile_lock.release()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = None
+            self.sampled_requests = 0
+
+    def report(self, sort_by: str = "cumulative", limit: int = 50) -> str:
+        """Report the accumulated stats in the pstats format"""
+        with self._lock:
+            if self._stats is None:
+                return ""
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort_by).print_stats(limit)
+            return stream.getvalue()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "sampled_requests": self.sampled_requests,
+        }
+
+
+class SlowRequestLog:
+    """Log the requests slower than a threshold with the phase breakdown"""
+
+    def __init__(self, threshold_seconds: Optional[float], log_all: bool = False):
+        self.threshold_seconds = threshold_seconds
+        self.log_all = log_all
+
+    def record(self, timer: PhaseTimer, **fields: Any) -> None:
+        record = {**fields, **timer.to_dict()}
+        if (
+            self.threshold_seconds is not None
+            and record["total"] >= self.threshold_seconds
+        ):
+            logger.warning(f"Slow request: {json.dumps(record, ensure_ascii=False)}")
+        elif self.log_all:
+            logger.info(f"Request timings: {json.dumps(record, ensure_ascii=False)}")
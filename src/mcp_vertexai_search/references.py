@@ -0,0 +1,269 @@
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pydantic_core
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    TypeAdapter,
+    ValidationError,
+    with_config,
+)
+from typing_extensions import TypedDict
+from vertexai import generative_models
+
+from mcp_vertexai_search.config import ReferenceConfig
+
+REFERENCE_URI_SCHEME = "reference"
+
+
+class GroundedReference(BaseModel):
+    """A snippet retrieved by the grounding"""
+
+    title: str = Field(..., description="The title of the reference")
+    uri: str = Field(description="The URI of the referenced document", default="")
+    text: str = Field(description="The retrieved snippet", default="")
+    score: Optional[float] = Field(
+        description="The highest confidence score of the grounding supports",
+        default=None,
+    )
+
+
+class ReferenceHandle(BaseModel):
+    """A compact reference to a snippet served as an MCP resource"""
+
+    title: str = Field(..., description="The title of the reference")
+    uri: str = Field(description="The URI of the referenced document", default="")
+    score: Optional[float] = Field(
+        description="The confidence score of the reference", default=None
+    )
+    resource_uri: str = Field(
+        ..., description="The MCP resource URI to read the snippet"
+    )
+    snippet: Optional[str] = Field(
+        description="The beginning of the snippet", default=None
+    )
+
+
+class SearchResult(BaseModel):
+    """A response of a tool before it is serialized into the tool result"""
+
+    text: str = Field(..., description="The response text of the model")
+    references: List[GroundedReference] = Field(
+        description="The snippets retrieved for the response", default_factory=list
+    )
+
+
+# NOTE The payloads of the hot path are typed dicts rather than models,
+# so that the validated data is dumped without building the model instances.
+@with_config(ConfigDict(extra="allow"))
+class ModelReference(TypedDict, total=False):
+    """A reference the model copied into the response
+
+    The model may add other info like the page number.
+    """
+
+    title: str
+    raw_text: str
+
+
+@with_config(ConfigDict(extra="allow"))
+class ModelAnswer(TypedDict, total=False):
+    """A response of the model in the JSON format of the system instruction"""
+
+    answer: str
+    references: List[ModelReference]
+
+
+class CompactPayload(TypedDict):
+    """A compact tool result with the answer and the reference handles"""
+
+    answer: str
+    references: List[ReferenceHandle]
+
+
+# The validators and the serializer are compiled once.
+_MODEL_ANSWER_ADAPTER = TypeAdapter(ModelAnswer)
+_COMPACT_PAYLOAD_ADAPTER = TypeAdapter(CompactPayload)
+
+
+def parse_model_answer(text: str) -> Optional[ModelAnswer]:
+    """Parse a response text of the model, or return None if it isn't the expected JSON"""
+    # NOTE The C parser of the standard library decodes long snippets faster than pydantic.
+    try:
+        return _MODEL_ANSWER_ADAPTER.validate_python(json.loads(text))
+    except (ValueError, ValidationError):
+        return None
+
+
+def dump_compact_payload(payload: CompactPayload) -> str:
+    return _COMPACT_PAYLOAD_ADAPTER.dump_json(payload, exclude_none=True).decode(
+        "utf-8"
+    )
+
+
+def extract_references(
+    response: generative_models.GenerationResponse,
+) -> List[GroundedReference]:
+    """Extract the retrieved snippets from the grounding metadata of a response"""
+    if not response.candidates:
+        return []
+    metadata = response.candidates[0].grounding_metadata
+    scores: Dict[int, float] = {}
+    for support in metadata.grounding_supports:
+        for index, score in zip(
+            support.grounding_chunk_indices, support.confidence_scores
+        ):
+            scores[index] = max(score, scores.get(index, 0.0))
+
+    references = []
+    for index, chunk in enumerate(metadata.grounding_chunks):
+        context = chunk.retrieved_context
+        references.append(
+            GroundedReference(
+                title=context.title,
+                uri=context.uri,
+                text=context.text,
+                score=scores.get(index),
+            )
+        )
+    # Put the references supporting the answer first
+    references.sort(key=lambda reference: -(reference.score or 0.0))
+    return references
+
+
+def to_reference_uri(response_id: str, index: int) -> str:
+    return f"{REFERENCE_URI_SCHEME}://{response_id}/{index}"
+
+
+def parse_reference_uri(uri: str) -> Tuple[str, int]:
+    """Parse a reference URI into the response ID and the index"""
+    prefix = f"{REFERENCE_URI_SCHEME}://"
+    if not uri.startswith(prefix):
+        raise ValueError(f"Invalid reference URI: {uri}")
+    response_id, _, index = uri[len(prefix) :].partition("/")
+    if not response_id or not index.isdigit():
+        raise ValueError(f"Invalid reference URI: {uri}")
+    return response_id, int(index)
+
+
+class ReferenceStore:
+    """A size-bounded store of the snippets keyed by response
+
+    The oldest responses are evicted when the total size of the snippets exceeds the limit.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[List[GroundedReference], int]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, references: List[GroundedReference]) -> str:
+        """Store the references of a response and return the response ID"""
+        response_id = uuid.uuid4().hex
+        size = sum(len(reference.text.encode("utf-8")) for reference in references)
+        with self._lock:
+            self._entries[response_id] = (references, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return response_id
+
+    def get(self, response_id: str, index: int) -> Optional[GroundedReference]:
+        with self._lock:
+            entry = self._entries.get(response_id)
+        if entry is None or not 0 <= index < len(entry[0]):
+            return None
+        return entry[0][index]
+
+
+def truncate(text: str, max_chars: Optional[int]) -> str:
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    return text[:max_chars]
+
+
+def build_compact_payload(
+    answer_text: str,
+    references: List[GroundedReference],
+    response_id: str,
+    reference_config: ReferenceConfig,
+) -> CompactPayload:
+    """Build a tool result with the answer and the reference handles
+
+    The handles only preview the snippets if `snippet_preview_chars` is set.
+    """
+    model_answer = parse_model_answer(answer_text)
+    preview_chars = reference_config.snippet_preview_chars
+    max_snippet_chars = reference_config.max_snippet_chars
+    handles = [
+        ReferenceHandle(
+            title=reference.title,
+            uri=reference.uri,
+            score=reference.score,
+            resource_uri=to_reference_uri(response_id, index),
+            snippet=(
+                truncate(truncate(reference.text, preview_chars), max_snippet_chars)
+                if preview_chars > 0
+                else None
+            ),
+        )
+        for index, reference in enumerate(references[: reference_config.max_references])
+    ]
+    answer = answer_text
+    if model_answer is not None and "answer" in model_answer:
+        answer = model_answer["answer"]
+    return CompactPayload(answer=answer, references=handles)
+
+
+def limit_references(answer_text: str, reference_config: ReferenceConfig) -> str:
+    """Limit the references the model copied into the response
+
+    The text goes straight through without the limits configured, if it is within the limits,
+    or it isn't the expected JSON.
+    Otherwise, the kept references are validated and serialized again.
+    """
+    if not reference_config.is_limited:
+        return answer_text
+    try:
+        payload = json.loads(answer_text)
+    except ValueError:
+        return answer_text
+    references = payload.get("references") if isinstance(payload, dict) else None
+    if not isinstance(references, list):
+        return answer_text
+    max_references = reference_config.max_references
+    max_snippet_chars = reference_config.max_snippet_chars
+    if (max_references is None or len(references) <= max_references) and (
+        max_snippet_chars is None
+        or not any(
+            isinstance(reference, dict)
+            and isinstance(reference.get("raw_text"), str)
+            and len(reference["raw_text"]) > max_snippet_chars
+            for reference in references
+        )
+    ):
+        return answer_text
+
+    payload["references"] = references[:max_references]
+    try:
+        model_answer = _MODEL_ANSWER_ADAPTER.validate_python(payload)
+    except ValidationError:
+        return answer_text
+    for reference in model_answer["references"]:
+        raw_text = reference.get("raw_text")
+        if raw_text is not None:
+            reference["raw_text"] = truncate(raw_text, max_snippet_chars)
+    # NOTE The serializer of a typed dict drops the extra fields, so the plain one is used.
+    return pydantic_core.to_json(model_answer).decode("utf-8")
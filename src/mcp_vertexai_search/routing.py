@@ -0,0 +1,159 @@
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from google.api_core import exceptions
+from loguru import logger
+from vertexai import generative_models
+
+T = TypeVar("T")
+
+# The errors on which a request fails over to the next location.
+CAPACITY_ERRORS = (
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+    exceptions.DeadlineExceeded,
+)
+
+
+class RegionStats:
+    """The latency and error EWMAs of a location
+
+    The stats are updated from the worker threads of the requests, so they are guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        location: str,
+        weight: float = 1.0,
+        alpha: float = 0.3,
+        error_half_life: float = 30.0,
+    ):
+        self.location = location
+        self.weight = weight
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.last_failure_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_success(self, seconds: float) -> None:
+        with self._lock:
+            if self.latency_ewma is None:
+                self.latency_ewma = seconds
+            else:
+                self.latency_ewma = (
+                    self.alpha * seconds + (1 - self.alpha) * self.latency_ewma
+                )
+            self.error_ewma = (1 - self.alpha) * self.error_ewma
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.error_ewma = self.alpha + (1 - self.alpha) * self.error_ewma
+            self.last_failure_at = time.monotonic()
+
+    def error_rate(self) -> float:
+        """The error EWMA decayed by the time since the last failure
+
+        A failing location gets no traffic to recover its EWMA with,
+        so the error rate decays over time to let the location be retried.
+        """
+        with self._lock:
+            if self.last_failure_at is None:
+                return self.error_ewma
+            elapsed = time.monotonic() - self.last_failure_at
+            return self.error_ewma * 0.5 ** (elapsed / self.error_half_life)
+
+    def score(self, error_penalty: float) -> float:
+        """The expected latency in seconds penalized by errors. The lower the better
+
+        A location without any latency sample is explored first unless it is failing.
+        """
+        with self._lock:
+            latency = self.latency_ewma or 0.0
+        return (latency + error_penalty * self.error_rate()) / self.weight
+
+
+class RegionRouter:
+    """Route requests to the best location of a model, and fail over on capacity errors
+
+    Every failure counts against the error EWMA of the location, but only the capacity errors fail over.
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, generative_models.GenerativeModel],
+        weights: Optional[Dict[str, float]] = None,
+        alpha: float = 0.3,
+        error_penalty: float = 10.0,
+    ):
+        """
+        Args:
+            models: The models keyed by location in the order of priority.
+            weights: The routing weights keyed by location.
+            alpha: The smoothing factor of the EWMAs.
+            error_penalty: The penalty in seconds added to the latency per error rate.
+        """
+        if not models:
+            raise ValueError("At least one location is required")
+        weights = weights or {}
+        # NOTE The insertion order of the models is the configured priority of the locations.
+        self.models = models
+        self.stats = {
+            location: RegionStats(location, weights.get(location, 1.0), alpha)
+            for location in models
+        }
+        self.error_penalty = error_penalty
+
+    def ranked_locations(self) -> List[str]:
+        """Get the locations from the best to the worst"""
+        # sorted() is stable, so the configured order breaks ties.
+        return sorted(
+            self.models,
+            key=lambda location: self.stats[location].score(self.error_penalty),
+        )
+
+    def call(self, func: Callable[[generative_models.GenerativeModel], T]) -> T:
+        """Call a function with the model of the best location"""
+        last_error: Optional[Exception] = None
+        for location in self.ranked_locations():
+            start = time.monotonic()
+            # pylint: disable=broad-exception-caught
+            try:
+                result = func(self.models[location])
+            except CAPACITY_ERRORS as e:
+                self._record_failure(location, e)
+                last_error = e
+                continue
+            except Exception:
+                self.stats[location].record_failure()
+                raise
+            self.stats[location].record_success(time.monotonic() - start)
+            return result
+        raise last_error
+
+    async def acall(
+        self, func: Callable[[generative_models.GenerativeModel], Awaitable[T]]
+    ) -> T:
+        """Asynchronously call a function with the model of the best location"""
+        last_error: Optional[Exception] = None
+        for location in self.ranked_locations():
+            start = time.monotonic()
+            # pylint: disable=broad-exception-caught
+            try:
+                result = await func(self.models[location])
+            except CAPACITY_ERRORS as e:
+                self._record_failure(location, e)
+                last_error = e
+                continue
+            except Exception:
+                self.stats[location].record_failure()
+                raise
+            self.stats[location].record_success(time.monotonic() - start)
+            return result
+        raise last_error
+
+    def _record_failure(self, location: str, error: Exception) -> None:
+        self.stats[location].record_failure()
+        logger.warning(f"Failing over from {location}: {error}")
@@ -1,26 +1,100 @@
+import contextlib
+import functools
+import hmac
+import time
+from typing import Any, Dict, Optional
+
 import anyio
 import mcp.types as types
+from google import auth
 from mcp.server.lowlevel import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
+from mcp.shared.context import RequestContext
 from mcp.shared.exceptions import ErrorData, McpError
 
+from mcp_vertexai_search.admission import (
+    SERVER_BUSY,
+    AdmissionController,
+    ServerBusyError,
+)
 from mcp_vertexai_search.agent import (
     VertexAISearchAgent,
     get_default_safety_settings,
     get_generation_config,
 )
-from mcp_vertexai_search.config import Config
+from mcp_vertexai_search.backends import SearchBackend
+from mcp_vertexai_search.cache import Coalescer, QueryLog, ResponseCache
+from mcp_vertexai_search.config import AdmissionConfig, Config
+from mcp_vertexai_search.engine import SearchEngine
+from mcp_vertexai_search.google_cloud import ensure_valid_credentials
+from mcp_vertexai_search.normalization import NormalizedQuery, QueryNormalizer
+from mcp_vertexai_search.profiling import (
+    Profiler,
+    SlowRequestLog,
+    current_timer,
+    phase,
+    start_timer,
+)
+from mcp_vertexai_search.references import (
+    REFERENCE_URI_SCHEME,
+    ReferenceStore,
+    SearchResult,
+    build_compact_payload,
+    dump_compact_payload,
+    limit_references,
+    parse_reference_uri,
+)
+from mcp_vertexai_search.session import SessionMemory, Turn
 from mcp_vertexai_search.utils import to_mcp_tools_map
+from mcp_vertexai_search.warmup import ReadinessState, Warmer
 
 
 def create_server(
-    agent: VertexAISearchAgent,
+    agent: Optional[VertexAISearchAgent],
     config: Config,
+    readiness: Optional[ReadinessState] = None,
+    credentials: Optional[auth.credentials.Credentials] = None,
+    profiler: Optional[Profiler] = None,
+    cache: Optional[ResponseCache] = None,
+    query_log: Optional[QueryLog] = None,
+    admission: Optional[AdmissionController] = None,
+    backends: Optional[Dict[str, SearchBackend]] = None,
 ) -> Server:
-    """Create the MCP server."""
+    """Create the MCP server.
+
+    The tools of the data stores with a backend in `backends` are served by it, and the rest by the agent.
+    """
     app = Server("document-search")
 
     # Create a map of tools for the MCP server
     tools_map = to_mcp_tools_map(config.data_stores)
+    data_stores_map = {
+        data_store.tool_name: data_store for data_store in config.data_stores
+    }
+    backends = backends or {}
+    # Keep the snippets of the compact tool results to serve them as resources
+    reference_store = ReferenceStore(max_bytes=config.server.references.max_bytes)
+    # Remember the recent turns per session to answer follow-up queries
+    session_memory = None
+    if config.server.session_memory.enabled:
+        session_memory = SessionMemory(
+            max_sessions=config.server.session_memory.max_sessions,
+            max_turns=config.server.session_memory.max_turns,
+            ttl_seconds=config.server.session_memory.ttl_seconds,
+            overlap_threshold=config.server.session_memory.overlap_threshold,
+        )
+
+    # Key the reused responses by the canonical queries, and share the identical calls in flight
+    normalizer = QueryNormalizer(config.server.query_normalization)
+    coalescer = Coalescer()
+
+    # Time the phases of the requests, and profile them if enabled
+    if profiler is None:
+        profiler = Profiler()
+    slow_request_log = SlowRequestLog(
+        threshold_seconds=config.server.profiling.slow_request_threshold_seconds,
+        log_all=config.server.profiling.enabled,
+    )
 
     # TODO Add @app.list_prompts()
 
@@ -36,32 +110,183 @@ def create_server(
             raise McpError(
                 ErrorData(code=types.INVALID_PARAMS, message="query is required")
             )
-        # pylint: disable=broad-exception-caught
-        try:
-            # TODO handle retry logic
+        with start_timer() as timer:
+            query = normalizer.normalize(arguments["query"])
+            # pylint: disable=broad-exception-caught
+            try:
+                return await anyio.to_thread.run_sync(
+                    profiler.run,
+                    functools.partial(search, name, query, app.request_context.session),
+                )
+            # pylint: disable=broad-exception-caught
+            except Exception as e:
+                raise McpError(
+                    ErrorData(code=types.INVALID_PARAMS, message=str(e))
+                ) from e
+            finally:
+                if readiness is not None:
+                    readiness.record_call(timer.total())
+                slow_request_log.record(
+                    timer, tool=name, query_fingerprint=query.fingerprint
+                )
+
+    def search(
+        name: str, query: NormalizedQuery, session: Any
+    ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
+        """Search in a worker thread not to block the event loop"""
+        # TODO handle retry logic
+        timer = current_timer()
+        if timer is not None:
+            # The time waiting for a worker thread
+            timer.phases["queue"] = (
+                time.monotonic() - timer.started_at - timer.phases.get("admission", 0.0)
+            )
+        if credentials is not None:
+            with phase("auth"):
+                ensure_valid_credentials(credentials)
+        with phase("request_build"):
             generation_config = get_generation_config(
                 temperature=config.model.generate_content_config.temperature,
                 top_p=config.model.generate_content_config.top_p,
             )
             safety_settings = get_default_safety_settings()
-            response = agent.search(
-                query=arguments["query"],
+            history = None
+            if session_memory is not None:
+                history = session_memory.find_context(session, name, query.text)
+        if query_log is not None:
+            query_log.record(name, query.text, key=query.key)
+
+        # NOTE The answers to follow-up queries depend on the session, so they aren't reused.
+        reuse = cache is not None and not history
+
+        def search_result() -> SearchResult:
+            result = backends.get(name, agent).search_result(
+                query=query.text,
                 generation_config=generation_config,
                 safety_settings=safety_settings,
+                history=history,
             )
-            return [types.TextContent(type="text", text=response)]
-        # pylint: disable=broad-exception-caught
-        except Exception as e:
-            raise McpError(ErrorData(code=types.INVALID_PARAMS, message=str(e))) from e
+            if reuse:
+                cache.put(name, query.key, result)
+            return result
+
+        if reuse:
+            with phase("cache"):
+                result = cache.get(name, query.key)
+            if result is None:
+                result = coalescer.run(name, query.key, search_result)
+        else:
+            result = search_result()
+        text, references = result.text, result.references
+        if session_memory is not None:
+            # NOTE The follow-up turns don't store the snippets again,
+            #      so that the session re-grounds once the grounded turns are forgotten.
+            session_memory.add_turn(
+                session,
+                name,
+                Turn(
+                    query=query.text,
+                    answer=text,
+                    snippets=[] if history else references,
+                ),
+            )
+        with phase("serialization"):
+            reference_config = data_stores_map[name].references
+            if config.server.references.mode == "compact":
+                response_id = reference_store.put(references)
+                payload = build_compact_payload(
+                    text, references, response_id, reference_config
+                )
+                text = dump_compact_payload(payload)
+            else:
+                text = limit_references(text, reference_config)
+            return [types.TextContent(type="text", text=text)]
+
+    # Queue the tool calls by priority class across the sessions
+    if admission is not None:
+        call_tool_handler = app.request_handlers[types.CallToolRequest]
+
+        async def handle_call_tool(req: types.CallToolRequest) -> types.ServerResult:
+            class_name = get_priority_class(
+                app.request_context, config.server.admission
+            )
+            with start_timer() as timer:
+                try:
+                    async with admission.admit(class_name) as wait_seconds:
+                        timer.phases["admission"] = wait_seconds
+                        return await call_tool_handler(req)
+                except ServerBusyError as e:
+                    raise McpError(
+                        ErrorData(
+                            code=SERVER_BUSY,
+                            message=str(e),
+                            data={
+                                "priority_class": e.class_name,
+                                "retry_after_seconds": e.retry_after_seconds,
+                            },
+                        )
+                    ) from e
+
+        app.request_handlers[types.CallToolRequest] = handle_call_tool
+
+    # The tools never change at runtime, so the result is built once
+    list_tools_result = types.ServerResult(
+        types.ListToolsResult(tools=list(tools_map.values()))
+    )
+
+    async def handle_list_tools(_: types.ListToolsRequest) -> types.ServerResult:
+        return list_tools_result
 
-    @app.list_tools()
-    async def list_tools() -> list[types.Tool]:
-        return [tools_map[tool_name] for tool_name in tools_map]
+    app.request_handlers[types.ListToolsRequest] = handle_list_tools
+
+    @app.list_resource_templates()
+    async def list_resource_templates() -> list[types.ResourceTemplate]:
+        return [
+            types.ResourceTemplate(
+                uriTemplate=f"{REFERENCE_URI_SCHEME}://{{response_id}}/{{index}}",
+                name="reference",
+                description="The full snippet of a reference in a tool result",
+                mimeType="text/plain",
+            )
+        ]
+
+    @app.read_resource()
+    async def read_resource(uri) -> list[ReadResourceContents]:
+        try:
+            response_id, index = parse_reference_uri(str(uri))
+        except ValueError as e:
+            raise McpError(ErrorData(code=types.INVALID_PARAMS, message=str(e))) from e
+        reference = reference_store.get(response_id, index)
+        if reference is None:
+            raise McpError(
+                ErrorData(
+                    code=types.INVALID_PARAMS,
+                    message=f"Reference not found or expired: {uri}",
+                )
+            )
+        return [ReadResourceContents(content=reference.text, mime_type="text/plain")]
 
     return app
 
 
-def run_stdio_server(app: Server) -> None:
+def get_priority_class(
+    context: RequestContext, admission_config: AdmissionConfig
+) -> Optional[str]:
+    """Get the priority class of a request from the HTTP header or the client name"""
+    headers = getattr(context.request, "headers", None)
+    if headers is not None and headers.get(admission_config.header):
+        return headers.get(admission_config.header)
+    client_params = getattr(context.session, "client_params", None)
+    if client_params is not None:
+        return admission_config.client_classes.get(client_params.clientInfo.name)
+    return None
+
+
+def run_stdio_server(
+    app: Server,
+    warmer: Optional[Warmer] = None,
+    engine: Optional[SearchEngine] = None,
+) -> None:
     """Run the server using the stdio transport."""
     try:
         from mcp.server.stdio import stdio_server
@@ -69,18 +294,50 @@ def run_stdio_server(app: Server) -> None:
         raise ImportError("stdio transport is not available") from e
 
     async def arun():
-        async with stdio_server() as streams:
-            await app.run(streams[0], streams[1], app.create_initialization_options())
+        async with serve_engine(engine), warm_up_and_keep_warm(warmer):
+            async with stdio_server() as streams:
+                await app.run(
+                    streams[0], streams[1], app.create_initialization_options()
+                )
 
     anyio.run(arun)
 
 
-def run_sse_server(app: Server, host: str, port: int) -> None:
+LOOPBACK_HOSTS = frozenset(["127.0.0.1", "::1", "localhost"])
+
+
+def is_admin_request(
+    client_host: Optional[str],
+    authorization: Optional[str],
+    admin_token: Optional[str] = None,
+) -> bool:
+    """Whether a request may call the admin routes
+
+    It must carry the bearer token if configured, or come from localhost otherwise.
+    """
+    if admin_token is not None:
+        return authorization is not None and hmac.compare_digest(
+            authorization.encode(), f"Bearer {admin_token}".encode()
+        )
+    return client_host in LOOPBACK_HOSTS
+
+
+def run_sse_server(
+    app: Server,
+    host: str,
+    port: int,
+    warmer: Optional[Warmer] = None,
+    profiler: Optional[Profiler] = None,
+    admission: Optional[AdmissionController] = None,
+    admin_token: Optional[str] = None,
+    engine: Optional[SearchEngine] = None,
+) -> None:
     """Run the server using the SSE transport."""
     try:
         import uvicorn
         from mcp.server.sse import SseServerTransport
         from starlette.applications import Starlette
+        from starlette.responses import JSONResponse
         from starlette.routing import Mount, Route
     except ImportError as e:
         raise ImportError("SSE transport is not available") from e
@@ -94,13 +351,94 @@ def run_sse_server(app: Server, host: str, port: int) -> None:
         ) as streams:
             await app.run(streams[0], streams[1], app.create_initialization_options())
 
+    # Report the readiness after the warm-up, and the queues of the admission control
+    async def handle_healthz(request):
+        status = {"ready": True} if warmer is None else warmer.readiness.to_dict()
+        if admission is not None:
+            status["admission"] = admission.to_dict()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    # Switch the profiler at runtime
+    async def handle_profile(request):
+        if not is_admin_request(
+            request.client.host if request.client is not None else None,
+            request.headers.get("authorization"),
+            admin_token,
+        ):
+            return JSONResponse({"error": "Forbidden"}, status_code=403)
+        if request.method == "POST":
+            params = request.query_params
+            try:
+                profiler.configure(
+                    enabled=(
+                        params["enabled"].lower() == "true"
+                        if "enabled" in params
+                        else None
+                    ),
+                    sample_rate=(
+                        float(params["sample_rate"])
+                        if "sample_rate" in params
+                        else None
+                    ),
+                )
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+        elif request.method == "DELETE":
+            profiler.reset()
+        return JSONResponse({**profiler.to_dict(), "report": profiler.report()})
+
+    # NOTE uvicorn doesn't accept connections until the lifespan startup completes,
+    #      so the warm-up finishes before the server reports ready.
+    @contextlib.asynccontextmanager
+    async def lifespan(_):
+        async with serve_engine(engine), warm_up_and_keep_warm(warmer):
+            yield
+
+    routes = [
+        Route("/sse", endpoint=handle_sse),
+        Route("/healthz", endpoint=handle_healthz),
+        Mount("/messages/", app=sse.handle_post_message),
+    ]
+    if profiler is not None:
+        routes.append(
+            Route(
+                "/admin/profile",
+                endpoint=handle_profile,
+                methods=["GET", "POST", "DELETE"],
+            )
+        )
+
     # Create the Starlette app
     starlette_app = Starlette(
-        debug=True,
-        routes=[
-            Route("/sse", endpoint=handle_sse),
-            Mount("/messages/", app=sse.handle_post_message),
-        ],
+        routes=routes,
+        lifespan=lifespan,
     )
     # Serve the Starlette app
     uvicorn.run(starlette_app, host=host, port=port)
+
+
+@contextlib.asynccontextmanager
+async def serve_engine(engine: Optional[SearchEngine]):
+    """Open the engine while serving, and close its transports on the serving event loop"""
+    if engine is None:
+        yield
+        return
+    async with engine:
+        yield
+
+
+@contextlib.asynccontextmanager
+async def warm_up_and_keep_warm(warmer: Optional[Warmer]):
+    """Run the warm-up, and keep the connections warm in background while serving"""
+    if warmer is None:
+        yield
+        return
+    await warmer.warm_up()
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(warmer.keep_warm)
+        if warmer.cache_warmer is not None:
+            tg.start_soon(warmer.cache_warmer.run)
+        try:
+            yield
+        finally:
+            tg.cancel_scope.cancel()
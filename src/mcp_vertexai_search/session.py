@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+import unicodedata
+import weakref
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from pydantic import BaseModel, Field
+
+from mcp_vertexai_search.references import GroundedReference
+from mcp_vertexai_search.text import tokenize
+
+# The openings of the elliptical follow-up queries, such as "and what about Q3?"
+_FOLLOW_UP_PATTERN = re.compile(
+    r"^(?:and|also|then|so|what about|how about)\b|^(?:では|じゃあ|それでは|それで|あと|また)"
+)
+
+
+class Turn(BaseModel):
+    """A question and answer in a session"""
+
+    query: str = Field(..., description="The query of the user")
+    answer: str = Field(..., description="The answer of the model")
+    snippets: List[GroundedReference] = Field(
+        description="The snippets retrieved for the query", default_factory=list
+    )
+
+
+def topic_overlap(query: str, turns: List[Turn]) -> float:
+    """The fraction of the query tokens found in the previous queries
+
+    The answers and the snippets aren't compared, because they cover most questions in the same domain.
+    """
+    query_tokens = tokenize(query)
+    if not query_tokens:
+        return 0.0
+    context_tokens: Set[str] = set()
+    for turn in turns:
+        context_tokens |= tokenize(turn.query)
+    return len(query_tokens & context_tokens) / len(query_tokens)
+
+
+def is_elliptical(query: str) -> bool:
+    """Whether a query only makes sense with the previous turns
+
+    It opens like a follow-up, such as "and what about Q3?", or it has a single term.
+    """
+    text = unicodedata.normalize("NFKC", query).strip().lower()
+    return bool(_FOLLOW_UP_PATTERN.match(text)) or len(tokenize(query)) <= 1
+
+
+def missing_terms(query: str, snippets: List[GroundedReference]) -> Set[str]:
+    """The query tokens not found in the snippets, which need a new retrieval"""
+    snippet_tokens: Set[str] = set()
+    for snippet in snippets:
+        snippet_tokens |= tokenize(snippet.title)
+        snippet_tokens |= tokenize(snippet.text)
+    return tokenize(query) - snippet_tokens
+
+
+def collect_snippets(turns: List[Turn]) -> List[GroundedReference]:
+    """Collect the distinct snippets of the turns, the latest first"""
+    seen = set()
+    snippets = []
+    for turn in reversed(turns):
+        for snippet in turn.snippets:
+            if snippet.text in seen:
+                continue
+            seen.add(snippet.text)
+            snippets.append(snippet)
+    return snippets
+
+
+class _SessionState:
+    def __init__(self):
+        self.last_access = time.monotonic()
+        self.turns: Dict[str, Deque[Turn]] = {}
+
+
+class SessionMemory:
+    """A bounded memory of the recent turns per MCP session and tool
+
+    The sessions are held weakly, so the memory of a closed session goes away with it.
+    The least recently used sessions are evicted beyond `max_sessions`,
+    and the sessions idle longer than `ttl_seconds` are forgotten.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_turns: int = 5,
+        ttl_seconds: float = 1800.0,
+        overlap_threshold: float = 0.6,
+    ):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.overlap_threshold = overlap_threshold
+        self._sessions: "weakref.WeakKeyDictionary[Any, _SessionState]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # NOTE The searches run in worker threads.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_turns(self, session: Any, tool_name: str) -> List[Turn]:
+        with self._lock:
+            state = self._get_state(session)
+            if state is None:
+                return []
+            return list(state.turns.get(tool_name, ()))
+
+    def find_context(
+        self, session: Any, tool_name: str, query: str
+    ) -> Optional[List[Turn]]:
+        """Find the previous turns to answer a follow-up query with
+
+        Returns None unless the snippets retrieved before contain all the query tokens,
+        and the query is elliptical or overlaps the previous queries.
+        """
+        turns = self.get_turns(session, tool_name)
+        snippets = collect_snippets(turns)
+        if not snippets:
+            return None
+        if missing_terms(query, snippets):
+            return None
+        if (
+            not is_elliptical(query)
+            and topic_overlap(query, turns) < self.overlap_threshold
+        ):
+            return None
+        return turns
+
+    def add_turn(self, session: Any, tool_name: str, turn: Turn) -> None:
+        with self._lock:
+            state = self._get_state(session)
+            if state is None:
+                state = _SessionState()
+                self._sessions[session] = state
+                self._evict()
+            state.turns.setdefault(tool_name, deque(maxlen=self.max_turns)).append(turn)
+
+    def _get_state(self, session: Any) -> Optional[_SessionState]:
+        state = self._sessions.get(session)
+        if state is None:
+            return None
+        now = time.monotonic()
+        if now - state.last_access > self.ttl_seconds:
+            del self._sessions[session]
+            return None
+        state.last_access = now
+        return state
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            oldest = min(self._sessions.items(), key=lambda item: item[1].last_access)[
+                0
+            ]
+            del self._sessions[oldest]
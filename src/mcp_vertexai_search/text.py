@@ -0,0 +1,33 @@
+import re
+import unicodedata
+from typing import List, Set
+
+# Words of the latin scripts and runs of the CJK characters
+_WORD_PATTERN = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+# Function words which don't tell the topic
+STOPWORDS = frozenset(
+    "a about an and are as at be by do does for from how in is it of on or "
+    "that the this to was were what when where which who why with".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    """Split a text into the terms in order, keeping the repeated ones
+
+    Japanese doesn't separate words with spaces, so CJK runs are split into character bigrams.
+    """
+    result: List[str] = []
+    for word in _WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if word.isascii():
+            if word not in STOPWORDS:
+                result.append(word)
+        elif len(word) == 1:
+            result.append(word)
+        else:
+            result.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return result
+
+
+def tokenize(text: str) -> Set[str]:
+    """Tokenize a text to compare the topics"""
+    return set(terms(text))
@@ -0,0 +1,143 @@
+import functools
+import time
+from typing import Any, Dict, List, Optional
+
+import anyio
+from google import auth
+from loguru import logger
+from vertexai import generative_models
+
+from mcp_vertexai_search.agent import (
+    VertexAISearchAgent,
+    get_default_safety_settings,
+    get_generation_config,
+)
+from mcp_vertexai_search.cache_warming import CacheWarmer
+from mcp_vertexai_search.config import Config
+from mcp_vertexai_search.google_cloud import refresh_credentials
+
+
+class ReadinessState:
+    """The readiness of the server and its cold-start latency"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.cold_start_seconds: Optional[float] = None
+        self.first_call_seconds: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+
+    def mark_ready(self) -> None:
+        """Mark the server as ready to serve requests"""
+        self.ready = True
+        self.cold_start_seconds = time.monotonic() - self.started_at
+        logger.info(
+            f"Server is ready: cold start {self.cold_start_seconds:.3f}s, phases {self.phases}"
+        )
+
+    def record_call(self, seconds: float) -> None:
+        """Record the latency of a tool call
+
+        The first tool call after the start is reported separately,
+        because it pays for the lazy initialization which the warm-up didn't cover.
+        """
+        if self.first_call_seconds is not None:
+            return
+        self.first_call_seconds = seconds
+        logger.info(f"First tool call after cold start took {seconds:.3f}s")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "cold_start_seconds": self.cold_start_seconds,
+            "first_call_seconds": self.first_call_seconds,
+            "phases": self.phases,
+        }
+
+
+class Warmer:
+    """Warm up credentials and connections before the server reports ready"""
+
+    def __init__(
+        self,
+        agent: Optional[VertexAISearchAgent],
+        config: Config,
+        credentials: Optional[auth.credentials.Credentials] = None,
+        cache_warmer: Optional[CacheWarmer] = None,
+    ):
+        # NOTE The other backends than Vertex AI are ready once they are created.
+        self.agent = agent
+        self.config = config
+        self.credentials = credentials
+        # The cache warmer runs in background while serving
+        self.cache_warmer = cache_warmer
+        self.readiness = ReadinessState()
+
+    async def warm_up(self) -> None:
+        """Run the warm-up and mark the server as ready"""
+        warmup_config = self.config.server.warmup
+        if not warmup_config.enabled or self.agent is None:
+            self.readiness.mark_ready()
+            return
+
+        # pylint: disable=broad-exception-caught
+        try:
+            if self.credentials is not None:
+                await self._timed("auth", self._refresh_credentials)
+            await self._timed("model_channel", self._open_model_channel)
+            if warmup_config.probe:
+                await self._timed("probe", self._probe_tools)
+        except Exception as e:
+            # NOTE A failed warm-up must not keep the server from serving requests.
+            logger.warning(f"Warm-up failed: {e}")
+        self.readiness.mark_ready()
+
+    async def keep_warm(self) -> None:
+        """Ping the model endpoint periodically to keep the connections warm"""
+        interval = self.config.server.warmup.keep_warm_interval
+        if interval is None or self.agent is None:
+            return
+        while True:
+            await anyio.sleep(interval)
+            # pylint: disable=broad-exception-caught
+            try:
+                await self._open_model_channel()
+            except Exception as e:
+                logger.warning(f"Keep-warm ping failed: {e}")
+
+    async def _timed(self, phase: str, func) -> None:
+        start = time.monotonic()
+        await func()
+        self.readiness.phases[phase] = time.monotonic() - start
+
+    async def _refresh_credentials(self) -> None:
+        await anyio.to_thread.run_sync(refresh_credentials, self.credentials)
+
+    def _get_models(self) -> List[generative_models.GenerativeModel]:
+        return list(self.agent.models) + self.agent.context_models
+
+    async def _open_model_channel(self) -> None:
+        # Counting tokens sets up the gRPC channel and the TLS session to the model endpoint
+        # without paying for a generation.
+        # NOTE The synchronous count_tokens goes through the synchronous prediction client,
+        #      which the tool calls generate the content with in the worker threads.
+        for model in self._get_models():
+            await anyio.to_thread.run_sync(
+                model.count_tokens, self.config.server.warmup.probe_query
+            )
+
+    async def _probe_tools(self) -> None:
+        generation_config = get_generation_config(
+            temperature=self.config.model.generate_content_config.temperature,
+            top_p=self.config.model.generate_content_config.top_p,
+        )
+        # NOTE The tools of the Vertex AI data stores share the agent grounded on all of them,
+        #      so a single generation through the path of the tool calls warms them all.
+        await anyio.to_thread.run_sync(
+            functools.partial(
+                self.agent.search_result,
+                query=self.config.server.warmup.probe_query,
+                generation_config=generation_config,
+                safety_settings=get_default_safety_settings(),
+            )
+        )
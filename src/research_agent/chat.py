@@ -1,13 +1,12 @@
 import argparse
 import asyncio
-import json
 import textwrap
-from typing import List
+from typing import List, Optional
 
 from google import genai
 from google.genai import chats, types
 from loguru import logger
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 
 from research_agent.mcp_client import MCPClient
 from research_agent.utils import to_gemini_tool
@@ -17,7 +16,15 @@ class Reference(BaseModel):
     """A reference to a document."""
 
     title: str = Field(..., description="The title of the document.")
-    raw_text: str = Field(..., description="The raw text of the document.")
+    raw_text: str = Field(
+        # NOTE The compact tool results carry a snippet and a resource URI instead.
+        default="",
+        validation_alias=AliasChoices("raw_text", "snippet"),
+        description="The raw text of the document.",
+    )
+    resource_uri: Optional[str] = Field(
+        default=None, description="The MCP resource URI to read the full text."
+    )
 
 
 class SearchResponse(BaseModel):
@@ -32,7 +39,8 @@ class SearchResponse(BaseModel):
     @classmethod
     def from_json_string(cls, json_string: str) -> "SearchResponse":
         """Deserialize the search response from a JSON string."""
-        return cls(**json.loads(json_string))
+        # Parse and validate the JSON in a single pass.
+        return cls.model_validate_json(json_string)
 
     def __str__(self) -> str:
         return textwrap.dedent(f"""
@@ -0,0 +1,151 @@
+import unittest
+from types import SimpleNamespace
+
+import anyio
+from mcp.shared.context import RequestContext
+
+from mcp_vertexai_search.admission import AdmissionController, ServerBusyError
+from mcp_vertexai_search.config import AdmissionConfig, PriorityClassConfig
+from mcp_vertexai_search.server import get_priority_class
+
+
+def make_controller(
+    max_concurrency=1, batch_max_concurrency=None, max_queue_depth=100
+) -> AdmissionController:
+    return AdmissionController(
+        [
+            PriorityClassConfig(name="interactive", weight=3.0),
+            PriorityClassConfig(
+                name="batch",
+                weight=1.0,
+                max_concurrency=batch_max_concurrency,
+                max_queue_depth=max_queue_depth,
+            ),
+        ],
+        max_concurrency=max_concurrency,
+        default_class="interactive",
+    )
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    async def test_admit_immediately(self):
+        controller = make_controller()
+        async with controller.admit("batch") as wait_seconds:
+            self.assertLess(wait_seconds, 0.1)
+            self.assertEqual(controller.running, 1)
+        self.assertEqual(controller.running, 0)
+        self.assertEqual(controller.to_dict()["classes"]["batch"]["admitted"], 1)
+
+    async def test_unknown_class_uses_default(self):
+        controller = make_controller()
+        self.assertEqual(controller.resolve_class("unknown"), "interactive")
+        self.assertEqual(controller.resolve_class(None), "interactive")
+        with self.assertRaises(ValueError):
+            AdmissionController([], max_concurrency=1, default_class="interactive")
+
+    async def test_reject_when_queue_is_full(self):
+        controller = make_controller(max_queue_depth=0)
+        async with controller.admit("interactive"):
+            with self.assertRaises(ServerBusyError) as context:
+                async with controller.admit("batch"):
+                    pass
+        self.assertEqual(context.exception.class_name, "batch")
+        self.assertGreaterEqual(context.exception.retry_after_seconds, 1)
+        self.assertEqual(controller.to_dict()["classes"]["batch"]["rejected"], 1)
+
+    async def test_rejected_requests_keep_fair_share(self):
+        controller = make_controller(max_queue_depth=0)
+        async with controller.admit("interactive"):
+            last_tag = controller.states["batch"].last_tag
+            for _ in range(100):
+                with self.assertRaises(ServerBusyError):
+                    async with controller.admit("batch"):
+                        pass
+            self.assertEqual(controller.states["batch"].last_tag, last_tag)
+        self.assertEqual(controller.to_dict()["classes"]["batch"]["rejected"], 100)
+
+    async def test_weighted_order_under_contention(self):
+        controller = make_controller()
+        order = []
+
+        async def request(class_name):
+            async with controller.admit(class_name):
+                order.append(class_name)
+                await anyio.sleep(0)
+
+        released = anyio.Event()
+
+        async def hold():
+            async with controller.admit("interactive"):
+                await released.wait()
+
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(hold)
+            await anyio.sleep(0.01)
+            for class_name in ["batch"] * 4 + ["interactive"] * 4:
+                task_group.start_soon(request, class_name)
+            await anyio.sleep(0.01)
+            self.assertEqual(controller.to_dict()["classes"]["batch"]["queued"], 4)
+            released.set()
+        # The interactive requests get 3 slots per slot of the batch ones under contention
+        self.assertEqual(
+            order,
+            ["interactive"] * 3 + ["batch", "interactive"] + ["batch"] * 3,
+        )
+
+    async def test_class_concurrency_cap(self):
+        controller = make_controller(max_concurrency=4, batch_max_concurrency=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with controller.admit("batch"):
+                peak = max(peak, controller.states["batch"].running)
+                await anyio.sleep(0.01)
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(6):
+                task_group.start_soon(request)
+        self.assertEqual(peak, 2)
+
+    async def test_cancel_removes_waiter(self):
+        controller = make_controller()
+        async with controller.admit("interactive"):
+            with anyio.move_on_after(0.01):
+                async with controller.admit("batch"):
+                    pass
+            self.assertEqual(controller.to_dict()["classes"]["batch"]["queued"], 0)
+        self.assertEqual(controller.running, 0)
+
+
+class TestGetPriorityClass(unittest.TestCase):
+    def make_context(self, headers=None, client_name=None):
+        client_params = None
+        if client_name is not None:
+            client_params = SimpleNamespace(
+                clientInfo=SimpleNamespace(name=client_name)
+            )
+        return RequestContext(
+            request_id=1,
+            meta=None,
+            session=SimpleNamespace(client_params=client_params),
+            lifespan_context=None,
+            request=None if headers is None else SimpleNamespace(headers=headers),
+        )
+
+    def test_header_first(self):
+        config = AdmissionConfig(client_classes={"indexer": "batch"})
+        context = self.make_context(
+            headers={"x-priority-class": "interactive"}, client_name="indexer"
+        )
+        self.assertEqual(get_priority_class(context, config), "interactive")
+
+    def test_client_name(self):
+        config = AdmissionConfig(client_classes={"indexer": "batch"})
+        self.assertEqual(
+            get_priority_class(self.make_context(client_name="indexer"), config),
+            "batch",
+        )
+        self.assertIsNone(
+            get_priority_class(self.make_context(client_name="inspector"), config)
+        )
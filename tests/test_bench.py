@@ -0,0 +1,89 @@
+import unittest
+
+import anyio
+
+from mcp_vertexai_search.bench import (
+    LevelReport,
+    StubBackend,
+    find_knee,
+    format_table,
+    percentile,
+    run_bench,
+)
+
+
+def make_level(concurrency: int, throughput: float, p50: float, error_rate=0.0):
+    return LevelReport(
+        concurrency=concurrency,
+        requests=10,
+        errors=int(error_rate * 10),
+        error_rate=error_rate,
+        throughput=throughput,
+        p50_seconds=p50,
+    )
+
+
+class TestPercentile(unittest.TestCase):
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertEqual(percentile([4.0, 1.0, 3.0, 2.0], 50), 2.5)
+        self.assertEqual(percentile([1.0, 2.0, 3.0], 100), 3.0)
+
+
+class TestFindKnee(unittest.TestCase):
+    def test_saturated(self):
+        levels = [
+            make_level(1, 10.0, 0.1),
+            make_level(2, 20.0, 0.1),
+            make_level(4, 20.0, 0.2),
+        ]
+        self.assertEqual(find_knee(levels, max_error_rate=0.05), 2)
+
+    def test_errors(self):
+        levels = [
+            make_level(1, 10.0, 0.1),
+            make_level(2, 20.0, 0.1, error_rate=0.5),
+        ]
+        self.assertEqual(find_knee(levels, max_error_rate=0.05), 1)
+        self.assertIsNone(find_knee([], max_error_rate=0.05))
+
+
+class TestRunBench(unittest.TestCase):
+    def test_local_backend(self):
+        backend = StubBackend(latency_seconds=0.02, capacity=2, output_tokens=10)
+
+        async def arun():
+            return await run_bench(
+                backend,
+                ["tool-a", "tool-b"],
+                ["revenue in 2024", "net income"],
+                concurrency_levels=[4, 1, 2],
+                requests_per_level=8,
+            )
+
+        report = anyio.run(arun)
+        self.assertEqual(
+            [store.tool_name for store in report.stores], ["tool-a", "tool-b"]
+        )
+        store = report.stores[0]
+        self.assertEqual([level.concurrency for level in store.levels], [1, 2, 4])
+        self.assertEqual(store.knee_concurrency, 2)
+        level = store.levels[0]
+        self.assertEqual(level.errors, 0)
+        self.assertEqual(level.prompt_tokens, 4 * 3 + 4 * 2)
+        self.assertEqual(level.output_tokens, 80)
+        self.assertLessEqual(level.p50_seconds, level.p99_seconds)
+        self.assertIn("tool-b", format_table(report))
+
+    def test_errors(self):
+        backend = StubBackend(latency_seconds=0.0, error_rate=1.0, seed=0)
+
+        async def arun():
+            return await run_bench(backend, ["tool"], ["query"], [1], 3)
+
+        store = anyio.run(arun).stores[0]
+        self.assertEqual(store.levels[0].errors, 3)
+        self.assertEqual(store.levels[0].error_types, {"ResourceExhausted": 3})
+        self.assertIsNone(store.levels[0].p50_seconds)
+        self.assertIsNone(store.knee_concurrency)
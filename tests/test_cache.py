@@ -0,0 +1,280 @@
+import datetime
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from mcp_vertexai_search.cache import Coalescer, QueryLog, ResponseCache, connect
+from mcp_vertexai_search.cache_warming import (
+    CacheWarmer,
+    get_off_peak_window_start,
+    is_off_peak,
+)
+from mcp_vertexai_search.config import (
+    CacheWarmingConfig,
+    Config,
+    DataStoreConfig,
+    MCPServerConfig,
+    QueryNormalizationConfig,
+    VertexAIModelConfig,
+)
+from mcp_vertexai_search.references import GroundedReference, SearchResult
+
+
+def make_result(answer: str = "42") -> SearchResult:
+    return SearchResult(
+        text=json.dumps({"answer": answer}),
+        references=[GroundedReference(title="doc", text="snippet")],
+    )
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_put_and_get(self):
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        self.assertIsNone(cache.get("tool", "query"))
+        cache.put("tool", "query", make_result())
+        self.assertEqual(cache.get("tool", "query"), make_result())
+        self.assertIsNone(cache.get("other", "query"))
+
+    def test_expires(self):
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        cache.put("tool", "query", make_result())
+        cache.max_age_seconds = 0.0
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("tool", "query"))
+        self.assertEqual(cache.purge_expired(), 1)
+
+    def test_content_version(self):
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        self.assertTrue(cache.set_content_version("tool", "v1"))
+        cache.put("tool", "query", make_result())
+        self.assertFalse(cache.set_content_version("tool", "v1"))
+        self.assertIsNotNone(cache.get("tool", "query"))
+        self.assertTrue(cache.set_content_version("tool", "v2"))
+        self.assertIsNone(cache.get("tool", "query"))
+
+    def test_shared_database(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/cache.sqlite3"
+            ResponseCache(connect(path), max_age_seconds=60).put(
+                "tool", "query", make_result()
+            )
+            cache = ResponseCache(connect(path), max_age_seconds=60)
+            self.assertEqual(cache.get("tool", "query"), make_result())
+
+
+class TestQueryLog(unittest.TestCase):
+    def test_top(self):
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=100)
+        for query in ["a", "b", "b", "c", "c", "c"]:
+            query_log.record("tool", query)
+        query_log.record("other", "d")
+        self.assertEqual(query_log.top("tool", 2), ["c", "b"])
+        self.assertEqual(query_log.top("other", 2), ["d"])
+
+    def test_prune(self):
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=2)
+        for query in ["a", "a", "a", "b", "b", "c"]:
+            query_log.record("tool", query)
+        self.assertEqual(query_log.top("tool", 10), ["a", "b"])
+
+    def test_record_by_key(self):
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=100)
+        query_log.record("tool", "Revenue?", key="revenue")
+        query_log.record("tool", "revenue", key="revenue")
+        query_log.record("tool", "CEO?", key="ceo")
+        self.assertEqual(query_log.top("tool", 1), ["revenue"])
+
+    def test_migrate_without_text(self):
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        connection.execute(
+            "CREATE TABLE queries (tool TEXT NOT NULL, query TEXT NOT NULL, "
+            "count REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (tool, query))"
+        )
+        connection.execute(
+            "INSERT INTO queries VALUES ('tool', 'a', 5.0, ?)", (time.time(),)
+        )
+        query_log = QueryLog(connection, half_life_seconds=3600, max_entries=100)
+        query_log.record("tool", "B?", key="b")
+        self.assertEqual(query_log.top("tool", 2), ["a", "B?"])
+
+
+class TestCoalescer(unittest.TestCase):
+    def test_share_call_in_flight(self):
+        coalescer = Coalescer()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(coalescer.run("tool", "q", func))
+        )
+        leader.start()
+        started.wait()
+        follower = threading.Thread(
+            target=lambda: results.append(coalescer.run("tool", "q", func))
+        )
+        follower.start()
+        while coalescer.coalesced == 0:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ["result", "result"])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(coalescer), 0)
+        self.assertEqual(coalescer.run("tool", "q", lambda: "again"), "again")
+
+    def test_share_error(self):
+        coalescer = Coalescer()
+
+        def func():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            coalescer.run("tool", "q", func)
+        self.assertEqual(len(coalescer), 0)
+
+
+class TestCacheWarming(unittest.IsolatedAsyncioTestCase):
+    def test_is_off_peak(self):
+        self.assertTrue(is_off_peak(19, 18, 22))
+        self.assertFalse(is_off_peak(22, 18, 22))
+        self.assertTrue(is_off_peak(23, 22, 6))
+        self.assertTrue(is_off_peak(3, 22, 6))
+        self.assertFalse(is_off_peak(12, 22, 6))
+
+    def test_get_off_peak_window_start(self):
+        def at(day: int, hour: int) -> datetime.datetime:
+            return datetime.datetime(2024, 1, day, hour, 30)
+
+        # The window wrapping around midnight is warmed once across the two dates.
+        self.assertEqual(
+            get_off_peak_window_start(at(1, 23), 22, 2), at(1, 22).replace(minute=0)
+        )
+        self.assertEqual(
+            get_off_peak_window_start(at(2, 1), 22, 2), at(1, 22).replace(minute=0)
+        )
+        self.assertEqual(
+            get_off_peak_window_start(at(2, 22), 22, 2), at(2, 22).replace(minute=0)
+        )
+        self.assertIsNone(get_off_peak_window_start(at(2, 12), 22, 2))
+        self.assertEqual(
+            get_off_peak_window_start(at(2, 19), 18, 22), at(2, 18).replace(minute=0)
+        )
+
+    async def test_warm_top(self):
+        class FakeAgent:
+            def __init__(self):
+                self.queries = []
+
+            def search_result(self, query, generation_config, safety_settings):
+                self.queries.append(query)
+                return make_result(query)
+
+        config = Config(
+            server=MCPServerConfig(
+                cache_warming=CacheWarmingConfig(rate_limit_per_second=1000.0, top_n=1)
+            ),
+            model=VertexAIModelConfig(
+                project_id="test-project",
+                model_name="test-model",
+                location="test-location",
+            ),
+        )
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=100)
+        for query in ["a", "b", "b"]:
+            query_log.record("tool", query)
+        agent = FakeAgent()
+        warmer = CacheWarmer(agent, config, cache, query_log)
+        self.assertEqual(await warmer.warm_top(["tool"]), 1)
+        self.assertEqual(agent.queries, ["b"])
+        self.assertEqual(cache.get("tool", "b"), make_result("b"))
+
+    async def test_warm_normalized_queries_once(self):
+        class FakeAgent:
+            def __init__(self):
+                self.queries = []
+
+            def search_result(self, query, generation_config, safety_settings):
+                self.queries.append(query)
+                return make_result(query)
+
+        config = Config(
+            server=MCPServerConfig(
+                cache_warming=CacheWarmingConfig(rate_limit_per_second=1000.0),
+                query_normalization=QueryNormalizationConfig(enabled=True),
+            ),
+            model=VertexAIModelConfig(
+                project_id="test-project",
+                model_name="test-model",
+                location="test-location",
+            ),
+        )
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        agent = FakeAgent()
+        warmer = CacheWarmer(agent, config, cache)
+        self.assertEqual(await warmer.warm("tool", ["Revenue?", "revenue", "CEO"]), 2)
+        self.assertEqual(agent.queries, ["Revenue?", "CEO"])
+        self.assertEqual(cache.get("tool", "revenue"), make_result("Revenue?"))
+
+    async def test_reuse_data_store_client(self):
+        class FakeTransport:
+            def __init__(self):
+                self.closed = False
+
+            async def close(self):
+                self.closed = True
+
+        class FakeDataStoreClient:
+            def __init__(self):
+                self.names = []
+                self.transport = FakeTransport()
+
+            async def get_data_store(self, name):
+                self.names.append(name)
+                return SimpleNamespace(
+                    billing_estimation=SimpleNamespace(
+                        structured_data_update_time=None,
+                        unstructured_data_update_time=None,
+                        website_data_update_time=None,
+                    )
+                )
+
+        config = Config(
+            model=VertexAIModelConfig(
+                project_id="test-project",
+                model_name="test-model",
+                location="test-location",
+            ),
+            data_stores=[
+                DataStoreConfig(
+                    project_id="test-project",
+                    location="global",
+                    datastore_id=f"test-datastore-{i}",
+                    tool_name=f"tool-{i}",
+                )
+                for i in range(2)
+            ],
+        )
+        warmer = CacheWarmer(None, config, ResponseCache(connect(None), 60))
+        client = FakeDataStoreClient()
+        warmer._data_store_clients["global"] = client
+        for _ in range(2):
+            await warmer.refresh_content_versions()
+        # A client per location is reused across the data stores and the checks.
+        self.assertIs(warmer.get_data_store_client("global"), client)
+        self.assertEqual(len(client.names), 4)
+        await warmer.aclose()
+        self.assertTrue(client.transport.closed)
+        self.assertEqual(warmer._data_store_clients, {})
@@ -0,0 +1,117 @@
+import unittest
+
+from google.cloud import discoveryengine_v1
+from google.protobuf import struct_pb2
+
+from mcp_vertexai_search.compression import (
+    MinHasher,
+    Passage,
+    bm25_scores,
+    compress_passages,
+    estimate_tokens,
+    parse_passages,
+)
+from mcp_vertexai_search.config import CompressionConfig, DataStoreConfig
+
+
+def make_data_store(tool_name: str, **compression_kwargs) -> DataStoreConfig:
+    return DataStoreConfig(
+        project_id="test-project",
+        location="global",
+        datastore_id=f"{tool_name}-datastore",
+        tool_name=tool_name,
+        compression=CompressionConfig(enabled=True, **compression_kwargs),
+    )
+
+
+class TestScoring(unittest.TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens("Google Cloud revenue, 2024"), 5)
+        self.assertEqual(estimate_tokens("売上高"), 3)
+
+    def test_bm25_scores(self):
+        scores = bm25_scores(
+            "cloud revenue",
+            [
+                "Google Cloud revenue grew 28% in the quarter",
+                "Headcount increased in the quarter",
+                "Cloud cloud cloud",
+            ],
+        )
+        self.assertGreater(scores[0], scores[2])
+        self.assertGreater(scores[2], scores[1])
+        self.assertEqual(scores[1], 0.0)
+        self.assertEqual(bm25_scores("cloud", []), [])
+
+    def test_min_hasher(self):
+        min_hasher = MinHasher()
+        text = "Google Cloud revenue grew 28% to 11.4 billion dollars in the quarter"
+        signature = min_hasher.signature(text)
+        self.assertEqual(min_hasher.similarity(signature, signature), 1.0)
+        near = min_hasher.signature(text + " ended in September")
+        far = min_hasher.signature("Headcount increased by two percent year over year")
+        self.assertGreater(min_hasher.similarity(signature, near), 0.6)
+        self.assertEqual(min_hasher.similarity(signature, far), 0.0)
+
+
+class TestCompressPassages(unittest.TestCase):
+    def test_budget_and_duplicates(self):
+        data_stores = {
+            "a": make_data_store("a", max_tokens=12),
+            "b": make_data_store("b", max_tokens=100),
+        }
+        passages = [
+            Passage(tool_name="a", text="Headcount increased by two percent"),
+            Passage(tool_name="a", text="Google Cloud revenue grew 28% in the quarter"),
+            Passage(tool_name="b", text="Google Cloud revenue grew 28% in the quarter"),
+            Passage(tool_name="b", text="Cloud operating income was 1.9 billion"),
+        ]
+        result = compress_passages("cloud revenue", passages, data_stores)
+        self.assertEqual(
+            [passage.text for passage in result.passages],
+            [
+                "Google Cloud revenue grew 28% in the quarter",
+                "Cloud operating income was 1.9 billion",
+            ],
+        )
+        self.assertEqual(result.passages[0].tool_name, "a")
+        self.assertEqual(result.tokens_before, 5 + 9 + 9 + 8)
+        self.assertEqual(result.tokens_after, 9 + 8)
+        self.assertEqual(result.tokens_saved, 14)
+
+    def test_empty(self):
+        result = compress_passages("cloud", [], {})
+        self.assertEqual(result.passages, [])
+        self.assertEqual(result.tokens_saved, 0)
+
+
+class TestParsePassages(unittest.TestCase):
+    def make_document(self, data) -> discoveryengine_v1.Document:
+        struct = struct_pb2.Struct()
+        struct.update(data)
+        return discoveryengine_v1.Document(derived_struct_data=struct)
+
+    def test_extractive_segments(self):
+        document = self.make_document(
+            {
+                "title": "2024 Q3",
+                "link": "gs://bucket/2024q3.pdf",
+                "extractive_segments": [
+                    {"content": "Cloud revenue grew", "relevanceScore": 0.9},
+                    {"content": "Headcount increased", "relevanceScore": 0.5},
+                ],
+            }
+        )
+        passages = parse_passages("a", document, max_segments=1)
+        self.assertEqual(len(passages), 1)
+        self.assertEqual(passages[0].title, "2024 Q3")
+        self.assertEqual(passages[0].uri, "gs://bucket/2024q3.pdf")
+        self.assertEqual(passages[0].score, 0.9)
+        self.assertEqual(passages[0].to_reference().text, "Cloud revenue grew")
+
+    def test_snippets(self):
+        document = self.make_document(
+            {"title": "2024 Q3", "snippets": [{"snippet": "<b>Cloud</b> revenue"}]}
+        )
+        passages = parse_passages("a", document, max_segments=3)
+        self.assertEqual([passage.text for passage in passages], ["Cloud revenue"])
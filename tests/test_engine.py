@@ -0,0 +1,193 @@
+import json
+import pathlib
+import tempfile
+import threading
+import unittest
+
+import anyio
+
+from mcp_vertexai_search.config import (
+    Config,
+    DataStoreConfig,
+    LocalIndexConfig,
+    MCPServerConfig,
+    QueryNormalizationConfig,
+    VertexAIModelConfig,
+)
+from mcp_vertexai_search.engine import SearchEngine, close_model_clients
+from mcp_vertexai_search.references import SearchResult
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+
+
+class FakeModel:
+    pass
+
+
+class FakeAgent:
+    def __init__(self, name: str):
+        self.name = name
+        self.model = FakeModel()
+        self.models = [self.model]
+        self.context_models = []
+        self.compressor = None
+        self.queries = []
+
+    async def asearch_result(self, query, generation_config, safety_settings):
+        self.queries.append(query)
+        await anyio.sleep(0.01 if query == "slow" else 0.0)
+        return SearchResult(text=f"{self.name}: {query}")
+
+    async def astream(self, query, generation_config, safety_settings):
+        for text in [self.name, ": ", query]:
+            yield text
+
+
+def make_engine(**server_kwargs) -> SearchEngine:
+    config = Config(
+        server=MCPServerConfig(**server_kwargs),
+        model=VertexAIModelConfig(
+            project_id="test-project",
+            model_name="test-model",
+            location="test-location",
+        ),
+        data_stores=[
+            DataStoreConfig(
+                project_id="test-project",
+                location="global",
+                datastore_id="test-datastore",
+                tool_name="test-tool",
+            )
+        ],
+    )
+    engine = SearchEngine(config, credentials=object())
+    # Skip the initialization of the Vertex AI client
+    engine._agent = FakeAgent("all")
+    engine._tool_agents = {"test-tool": FakeAgent("test-tool")}
+    engine._opened = True
+    return engine
+
+
+class TestSearchEngine(unittest.TestCase):
+    def test_search(self):
+        async def arun():
+            async with make_engine() as engine:
+                self.assertEqual(engine.tool_names, ["test-tool"])
+                result = await engine.search("revenue?")
+                self.assertEqual(result.text, "all: revenue?")
+                result = await engine.search("revenue?", tool_name="test-tool")
+                self.assertEqual(result.text, "test-tool: revenue?")
+                with self.assertRaises(ValueError):
+                    await engine.search("revenue?", tool_name="unknown")
+
+        anyio.run(arun)
+
+    def test_search_many(self):
+        async def arun():
+            async with make_engine() as engine:
+                return await engine.search_many(
+                    ["slow", "fast", "slow"], tool_name="test-tool", max_concurrency=2
+                )
+
+        results = anyio.run(arun)
+        self.assertEqual(
+            [result.text for result in results],
+            ["test-tool: slow", "test-tool: fast", "test-tool: slow"],
+        )
+
+    def test_search_many_normalized_queries_once(self):
+        engine = make_engine(query_normalization=QueryNormalizationConfig(enabled=True))
+
+        async def arun():
+            async with engine:
+                agent = engine.get_agent("test-tool")
+                results = await engine.search_many(
+                    ["Revenue?", "ＲＥＶＥＮＵＥ", "CEO"], tool_name="test-tool"
+                )
+                return agent, results
+
+        agent, results = anyio.run(arun)
+        self.assertEqual(
+            [result.text for result in results],
+            ["test-tool: Revenue?", "test-tool: Revenue?", "test-tool: CEO"],
+        )
+        self.assertEqual(sorted(agent.queries), ["CEO", "Revenue?"])
+
+    def test_stream(self):
+        async def arun():
+            async with make_engine() as engine:
+                return [text async for text in engine.stream("revenue?")]
+
+        self.assertEqual(anyio.run(arun), ["all", ": ", "revenue?"])
+
+    def test_close(self):
+        engine = make_engine()
+        model = engine._agent.model
+        client = FakeClient()
+        model._prediction_async_client = client
+
+        anyio.run(engine.aclose)
+        self.assertTrue(client.transport.closed)
+        self.assertNotIn("_prediction_async_client", model.__dict__)
+        self.assertFalse(engine.is_open)
+
+    def test_opens_in_worker_thread(self):
+        engine = make_engine()
+        engine._opened = False
+        threads = []
+        engine.open = lambda: threads.append(threading.current_thread())
+
+        async def arun():
+            async with engine:
+                pass
+
+        anyio.run(arun)
+        # Loading the credentials doesn't block the event loop.
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertFalse(engine.is_open)
+
+    def test_close_model_clients_without_clients(self):
+        anyio.run(close_model_clients, FakeModel())
+
+    def test_local_backend_without_credentials(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (pathlib.Path(tmpdir) / "cloud.md").write_text(
+                "Google Cloud revenue grew.", encoding="utf-8"
+            )
+            config = Config(
+                model=VertexAIModelConfig(
+                    project_id="test-project",
+                    model_name="test-model",
+                    location="test-location",
+                ),
+                data_stores=[
+                    DataStoreConfig(
+                        backend="local",
+                        tool_name="docs",
+                        local=LocalIndexConfig(path=tmpdir),
+                    )
+                ],
+            )
+
+            async def arun():
+                async with SearchEngine(config) as engine:
+                    self.assertIsNone(engine.agent)
+                    self.assertIsNone(engine.credentials)
+                    return await engine.search("revenue?", tool_name="docs")
+
+            result = anyio.run(arun)
+        self.assertEqual(
+            json.loads(result.text)["answer"], "Google Cloud revenue grew."
+        )
@@ -0,0 +1,177 @@
+import json
+import os
+import pathlib
+import tempfile
+import time
+import unittest
+
+import anyio
+from pydantic import ValidationError
+
+from mcp_vertexai_search import backends
+from mcp_vertexai_search.backends import (
+    create_backends,
+    get_backend_factory,
+    register_backend,
+)
+from mcp_vertexai_search.config import DataStoreConfig, LocalIndexConfig
+from mcp_vertexai_search.local_index import (
+    LocalIndex,
+    LocalSearchBackend,
+    split_passages,
+    to_match_query,
+)
+from mcp_vertexai_search.references import SearchResult
+
+
+class TestLocalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmpdir.name)
+        (self.path / "cloud.md").write_text(
+            "# Google Cloud\n\nGoogle Cloud revenue grew 28% in Q2.\n\nThe ads revenue was flat.",
+            encoding="utf-8",
+        )
+        (self.path / "ja").mkdir()
+        (self.path / "ja" / "kessan.txt").write_text(
+            "売上高は前年比で増加しました。", encoding="utf-8"
+        )
+        (self.path / "image.png").write_bytes(b"\x89PNG")
+        self.index = LocalIndex(str(self.path))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+
+    def test_split_passages(self):
+        self.assertEqual(split_passages("a\n\nb\n\n\nc", 4), ["a\n\nb", "c"])
+        self.assertEqual(split_passages("abcdefg", 3), ["abc", "def", "g"])
+        self.assertEqual(split_passages("  \n\n ", 3), [])
+
+    def test_to_match_query(self):
+        self.assertEqual(
+            to_match_query("What is the revenue of Google?"), '"revenue" OR "google"'
+        )
+        self.assertEqual(to_match_query("売上高"), '"売上" OR "上高"')
+        self.assertIsNone(to_match_query("?"))
+
+    def test_search(self):
+        self.index.reindex()
+        passages = self.index.search("Google Cloud revenue", limit=5, tool_name="docs")
+        self.assertEqual(passages[0].title, "Google Cloud")
+        self.assertEqual(passages[0].tool_name, "docs")
+        self.assertTrue(passages[0].uri.startswith("file://"))
+        self.assertGreater(passages[0].score, 0.0)
+
+        passages = self.index.search("売上高を教えて", limit=5)
+        self.assertEqual([passage.title for passage in passages], ["kessan"])
+        self.assertEqual(self.index.search("unknown", limit=5), [])
+
+    def test_incremental_reindex(self):
+        stats = self.index.reindex()
+        self.assertEqual((stats.added, stats.updated, stats.removed), (2, 0, 0))
+        self.assertFalse(self.index.reindex().changed)
+
+        cloud = self.path / "cloud.md"
+        cloud.write_text("# Google Cloud\n\nThe backlog grew.", encoding="utf-8")
+        os.utime(cloud, ns=(0, 1))
+        (self.path / "ja" / "kessan.txt").unlink()
+        stats = self.index.reindex()
+        self.assertEqual((stats.added, stats.updated, stats.removed), (0, 1, 1))
+        self.assertEqual(stats.passages, 1)
+        self.assertEqual(self.index.search("revenue", limit=5), [])
+        self.assertEqual(len(self.index.search("backlog", limit=5)), 1)
+        self.assertEqual(self.index.search("売上高", limit=5), [])
+
+
+class TestLocalSearchBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmpdir.name)
+        (self.path / "cloud.md").write_text(
+            "# Google Cloud\n\nGoogle Cloud revenue grew 28% in Q2.", encoding="utf-8"
+        )
+        self.data_store = DataStoreConfig(
+            backend="local",
+            tool_name="docs",
+            local=LocalIndexConfig(
+                path=str(self.path),
+                index_path=str(self.path / "index.sqlite3"),
+                reindex_interval_seconds=None,
+            ),
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_search_result(self):
+        backend = LocalSearchBackend.from_config(self.data_store)
+        try:
+            result = backend.search_result("Google Cloud revenue?")
+            payload = json.loads(result.text)
+            self.assertEqual(
+                payload["answer"],
+                "# Google Cloud\n\nGoogle Cloud revenue grew 28% in Q2.",
+            )
+            self.assertEqual(payload["references"][0]["title"], "Google Cloud")
+            self.assertEqual(result.references[0].title, "Google Cloud")
+
+            result = anyio.run(backend.asearch_result, "unknown")
+            self.assertEqual(json.loads(result.text)["references"], [])
+        finally:
+            backend.close()
+
+    def test_reindex_in_background(self):
+        data_store = self.data_store.model_copy(deep=True)
+        data_store.local.reindex_interval_seconds = 0.01
+        backend = LocalSearchBackend.from_config(data_store)
+        try:
+            (self.path / "ads.md").write_text(
+                "# Ads\n\nThe ads revenue was flat.", encoding="utf-8"
+            )
+            deadline = time.monotonic() + 5.0
+            while not backend.index.search("ads", limit=5):
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        finally:
+            backend.close()
+        self.assertFalse(backend._reindexer.is_alive())
+
+    def test_create_backends(self):
+        vertexai_data_store = DataStoreConfig(
+            project_id="test-project",
+            location="global",
+            datastore_id="test-datastore",
+            tool_name="vertexai",
+        )
+        created = create_backends([vertexai_data_store, self.data_store])
+        try:
+            self.assertEqual(list(created), ["docs"])
+            self.assertIsInstance(created["docs"], LocalSearchBackend)
+        finally:
+            created["docs"].close()
+
+    def test_register_backend(self):
+        class EchoBackend:
+            def __init__(self, data_store):
+                self.data_store = data_store
+
+            def search_result(self, query, *args, **kwargs):
+                return SearchResult(text=query)
+
+        register_backend("echo", EchoBackend)
+        self.addCleanup(backends._BACKEND_FACTORIES.pop, "echo")
+        self.assertIs(get_backend_factory("echo"), EchoBackend)
+        data_store = DataStoreConfig(backend="echo", tool_name="echo")
+        backend = create_backends([data_store])["echo"]
+        self.assertEqual(backend.search_result("hello").text, "hello")
+        with self.assertRaises(ValueError):
+            get_backend_factory("unknown")
+        with self.assertRaises(ValueError):
+            register_backend("vertexai", EchoBackend)
+
+    def test_validate_config(self):
+        with self.assertRaises(ValidationError):
+            DataStoreConfig(backend="local", tool_name="docs")
+        with self.assertRaises(ValidationError):
+            DataStoreConfig(tool_name="vertexai", project_id="test-project")
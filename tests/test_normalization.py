@@ -0,0 +1,122 @@
+import unittest
+
+from mcp_vertexai_search.config import QueryNormalizationConfig
+from mcp_vertexai_search.normalization import (
+    QueryNormalizer,
+    fingerprint,
+    fold_punctuation,
+    strip_politeness,
+)
+
+
+class TestQueryNormalizer(unittest.TestCase):
+    def test_fold_form(self):
+        normalizer = QueryNormalizer(QueryNormalizationConfig(enabled=True))
+        self.assertEqual(
+            normalizer.canonicalize("  What was the revenue of  Google Cloud? "),
+            normalizer.canonicalize("what was the revenue of google cloud"),
+        )
+        self.assertEqual(
+            normalizer.canonicalize("ＧｏｏｇｌｅＣｌｏｕｄ　の売上は？"),
+            "googlecloud の売上は",
+        )
+
+    def test_fold_punctuation(self):
+        self.assertEqual(
+            fold_punctuation("revenue, 1,000.5 (2024)!"), "revenue  1,000.5  2024  "
+        )
+        self.assertEqual(fold_punctuation("C# 15%"), "C# 15%")
+        self.assertEqual(fold_punctuation("「売上」。"), " 売上  ")
+        self.assertEqual(fold_punctuation("-5% (+3.5)"), "-5%  +3.5 ")
+        self.assertEqual(fold_punctuation("e-commerce - 5"), "e commerce   5")
+
+    def test_signed_numbers_stay_apart(self):
+        normalizer = QueryNormalizer(
+            QueryNormalizationConfig(enabled=True, strip_stopwords=True)
+        )
+        for queries in [
+            ["Revenue growth -5%?", "Revenue growth 5%?", "Revenue growth +5%?"],
+            ["Temperature -10", "Temperature 10"],
+            ["営業利益 -3億円", "営業利益 3億円"],
+        ]:
+            keys = [normalizer.canonicalize(query) for query in queries]
+            self.assertEqual(len(set(keys)), len(queries), keys)
+
+    def test_strip_politeness(self):
+        self.assertEqual(
+            strip_politeness("please tell me the revenue thanks"), "tell me the revenue"
+        )
+        self.assertEqual(
+            strip_politeness("google cloudの売上を教えてください"), "google cloudの売上"
+        )
+        self.assertEqual(strip_politeness("売上についてお願いします"), "売上について")
+        self.assertEqual(strip_politeness("ください"), "ください")
+
+    def test_strip_stopwords(self):
+        normalizer = QueryNormalizer(
+            QueryNormalizationConfig(
+                enabled=True, strip_stopwords=True, extra_stopwords=["revenue"]
+            )
+        )
+        self.assertEqual(
+            normalizer.canonicalize("What is the revenue of Google Cloud?"),
+            "what is of google cloud",
+        )
+        self.assertEqual(
+            normalizer.canonicalize("Google Cloud の 売上"), "google cloud 売上"
+        )
+        self.assertEqual(normalizer.canonicalize("the"), "the")
+
+    def test_strip_stopwords_keeps_different_questions_apart(self):
+        normalizer = QueryNormalizer(
+            QueryNormalizationConfig(enabled=True, strip_stopwords=True)
+        )
+        for queries in [
+            [
+                "When did Google launch Gemini?",
+                "Why did Google launch Gemini?",
+                "How did Google launch Gemini?",
+                "Did Google launch Gemini?",
+                "Did Google not launch Gemini?",
+            ],
+            ["Who is the CFO?", "What is the CFO?", "Who was the CFO?"],
+            ["Revenue in Japan", "Revenue outside Japan", "Revenue without Japan"],
+            ["東京 で 売上", "東京 に 売上", "東京 を 売上"],
+        ]:
+            keys = [normalizer.canonicalize(query) for query in queries]
+            self.assertEqual(len(set(keys)), len(queries), keys)
+        self.assertEqual(
+            normalizer.canonicalize("Who is the CFO?"),
+            normalizer.canonicalize("who is CFO"),
+        )
+
+    def test_idempotent(self):
+        normalizer = QueryNormalizer(
+            QueryNormalizationConfig(enabled=True, strip_stopwords=True)
+        )
+        for query in [
+            "Please, what was the revenue of Google Cloud in Q2?",
+            "revenue please the",
+            "Ｇｏｏｇｌｅ Ｃｌｏｕｄ の売上を教えて下さい。",
+        ]:
+            key = normalizer.canonicalize(query)
+            self.assertEqual(normalizer.canonicalize(key), key)
+
+    def test_normalize(self):
+        query = "Google Cloud revenue?"
+        normalized = QueryNormalizer().normalize(query)
+        self.assertEqual(normalized.text, query)
+        self.assertEqual(normalized.key, query)
+
+        normalized = QueryNormalizer(QueryNormalizationConfig(enabled=True)).normalize(
+            query
+        )
+        self.assertEqual(normalized.text, query)
+        self.assertEqual(normalized.key, "google cloud revenue")
+        self.assertEqual(normalized.fingerprint, fingerprint("google cloud revenue"))
+        self.assertEqual(len(normalized.fingerprint), 16)
+
+        normalized = QueryNormalizer(
+            QueryNormalizationConfig(enabled=True, rewrite_query=True)
+        ).normalize(query)
+        self.assertEqual(normalized.text, "google cloud revenue")
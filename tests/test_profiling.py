@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+
+from loguru import logger
+
+from mcp_vertexai_search.profiling import (
+    PhaseTimer,
+    Profiler,
+    SlowRequestLog,
+    current_timer,
+    phase,
+    start_timer,
+)
+
+
+class TestPhaseTimer(unittest.TestCase):
+    def test_phases(self):
+        with start_timer() as timer:
+            self.assertIs(current_timer(), timer)
+            with phase("upstream"):
+                pass
+            with phase("upstream"):
+                pass
+        self.assertIsNone(current_timer())
+        self.assertEqual(list(timer.phases), ["upstream"])
+        self.assertGreaterEqual(timer.to_dict()["total"], timer.phases["upstream"])
+
+    def test_phase_without_timer(self):
+        with phase("upstream"):
+            pass
+        self.assertIsNone(current_timer())
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = Profiler()
+        self.assertEqual(profiler.run(lambda: 1), 1)
+        self.assertEqual(profiler.sampled_requests, 0)
+        self.assertEqual(profiler.report(), "")
+
+    def test_enabled(self):
+        profiler = Profiler(enabled=True)
+        self.assertEqual(profiler.run(lambda: sum(range(10))), 45)
+        self.assertEqual(profiler.run(lambda: 1), 1)
+        self.assertEqual(profiler.sampled_requests, 2)
+        self.assertIn("function calls", profiler.report())
+        profiler.reset()
+        self.assertEqual(profiler.report(), "")
+
+    def test_concurrent_requests(self):
+        profiler = Profiler(enabled=True)
+        results = []
+        errors = []
+
+        def request(i):
+            try:
+                results.append(profiler.run(lambda: time.sleep(0.05) or i))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                errors.append(e)
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(results), [0, 1, 2])
+        # The requests running while another one is profiled run without the profiler.
+        self.assertGreaterEqual(profiler.sampled_requests, 1)
+        self.assertLess(profiler.sampled_requests, 3)
+        self.assertIn("function calls", profiler.report())
+
+    def test_configure(self):
+        profiler = Profiler()
+        profiler.configure(enabled=True, sample_rate=0.0)
+        profiler.run(lambda: 1)
+        self.assertEqual(profiler.sampled_requests, 0)
+        with self.assertRaises(ValueError):
+            profiler.configure(sample_rate=2.0)
+
+
+class TestSlowRequestLog(unittest.TestCase):
+    def setUp(self):
+        self.messages = []
+        self.handler_id = logger.add(self.messages.append, format="{message}")
+
+    def tearDown(self):
+        logger.remove(self.handler_id)
+
+    def test_logs_slow_request(self):
+        timer = PhaseTimer()
+        timer.phases["upstream"] = 1.0
+        SlowRequestLog(threshold_seconds=0.0).record(timer, tool="test-tool")
+        self.assertEqual(len(self.messages), 1)
+        self.assertIn("Slow request", self.messages[0])
+        self.assertIn('"upstream": 1.0', self.messages[0])
+
+    def test_ignores_fast_request(self):
+        SlowRequestLog(threshold_seconds=60.0).record(PhaseTimer(), tool="test-tool")
+        self.assertEqual(self.messages, [])
@@ -0,0 +1,164 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from mcp_vertexai_search.config import ReferenceConfig
+from mcp_vertexai_search.references import (
+    GroundedReference,
+    ReferenceStore,
+    build_compact_payload,
+    dump_compact_payload,
+    extract_references,
+    limit_references,
+    parse_reference_uri,
+    to_reference_uri,
+)
+
+
+def make_response():
+    chunks = [
+        SimpleNamespace(
+            retrieved_context=SimpleNamespace(
+                title="doc-a", uri="gs://bucket/a.pdf", text="snippet a"
+            )
+        ),
+        SimpleNamespace(
+            retrieved_context=SimpleNamespace(
+                title="doc-b", uri="gs://bucket/b.pdf", text="snippet b"
+            )
+        ),
+    ]
+    supports = [
+        SimpleNamespace(grounding_chunk_indices=[1], confidence_scores=[0.9]),
+        SimpleNamespace(grounding_chunk_indices=[0, 1], confidence_scores=[0.4, 0.5]),
+    ]
+    metadata = SimpleNamespace(grounding_chunks=chunks, grounding_supports=supports)
+    return SimpleNamespace(candidates=[SimpleNamespace(grounding_metadata=metadata)])
+
+
+class TestReferences(unittest.TestCase):
+    def test_extract_references(self):
+        references = extract_references(make_response())
+        self.assertEqual([r.title for r in references], ["doc-b", "doc-a"])
+        self.assertEqual(references[0].score, 0.9)
+        self.assertEqual(references[1].score, 0.4)
+
+    def test_reference_uri(self):
+        uri = to_reference_uri("abc", 3)
+        self.assertEqual(parse_reference_uri(uri), ("abc", 3))
+        with self.assertRaises(ValueError):
+            parse_reference_uri("https://example.com/abc/3")
+        with self.assertRaises(ValueError):
+            parse_reference_uri("reference://abc/x")
+
+    def test_store_evicts_oldest(self):
+        store = ReferenceStore(max_bytes=10)
+        first = store.put([GroundedReference(title="a", text="123456")])
+        second = store.put([GroundedReference(title="b", text="123456")])
+        self.assertIsNone(store.get(first, 0))
+        self.assertEqual(store.get(second, 0).title, "b")
+        self.assertIsNone(store.get(second, 1))
+        self.assertEqual(store.total_bytes, 6)
+
+    def test_build_compact_payload(self):
+        references = [
+            GroundedReference(title="a", uri="u", text="long snippet", score=0.8),
+            GroundedReference(title="b", text="other"),
+        ]
+        payload = build_compact_payload(
+            json.dumps({"answer": "42"}),
+            references,
+            "abc",
+            ReferenceConfig(max_references=1, snippet_preview_chars=4),
+        )
+        self.assertEqual(payload["answer"], "42")
+        self.assertEqual(
+            json.loads(dump_compact_payload(payload))["references"],
+            [
+                {
+                    "title": "a",
+                    "uri": "u",
+                    "score": 0.8,
+                    "resource_uri": "reference://abc/0",
+                    "snippet": "long",
+                }
+            ],
+        )
+
+    def test_build_compact_payload_without_preview(self):
+        references = [
+            GroundedReference(title="a", text="long snippet"),
+            GroundedReference(title="b", text="other"),
+        ]
+        payload = build_compact_payload(
+            json.dumps({"answer": "42"}), references, "abc", ReferenceConfig()
+        )
+        handles = json.loads(dump_compact_payload(payload))["references"]
+        self.assertEqual([handle["title"] for handle in handles], ["a", "b"])
+        self.assertNotIn("snippet", handles[0])
+        # The preview is also limited by the maximum snippet length
+        payload = build_compact_payload(
+            json.dumps({"answer": "42"}),
+            references,
+            "abc",
+            ReferenceConfig(snippet_preview_chars=8, max_snippet_chars=4),
+        )
+        self.assertEqual(payload["references"][0].snippet, "long")
+
+    def test_limit_references(self):
+        text = json.dumps(
+            {
+                "answer": "42",
+                "references": [
+                    {"title": "a", "raw_text": "long snippet"},
+                    {"title": "b", "raw_text": "other"},
+                ],
+            }
+        )
+        limited = json.loads(
+            limit_references(
+                text, ReferenceConfig(max_references=1, max_snippet_chars=4)
+            )
+        )
+        self.assertEqual(limited["references"], [{"title": "a", "raw_text": "long"}])
+        self.assertEqual(limit_references(text, ReferenceConfig()), text)
+        # The references are kept as is without the limits configured
+        long_text = json.dumps(
+            {
+                "answer": "42",
+                "references": [{"title": "a", "raw_text": "x" * 5000}] * 10,
+            }
+        )
+        self.assertEqual(limit_references(long_text, ReferenceConfig()), long_text)
+        limited = json.loads(
+            limit_references(text, ReferenceConfig(max_snippet_chars=0))
+        )
+        self.assertEqual(
+            [reference["raw_text"] for reference in limited["references"]], ["", ""]
+        )
+        self.assertEqual(limit_references("not json", ReferenceConfig()), "not json")
+
+    def test_limit_references_keeps_extra_fields(self):
+        text = json.dumps(
+            {
+                "answer": "42",
+                "references": [{"title": "a", "raw_text": "long", "page": 3}],
+            }
+        )
+        limited = json.loads(
+            limit_references(
+                text, ReferenceConfig(max_references=1, max_snippet_chars=2)
+            )
+        )
+        self.assertEqual(
+            limited,
+            {
+                "answer": "42",
+                "references": [{"title": "a", "raw_text": "lo", "page": 3}],
+            },
+        )
+
+    def test_build_compact_payload_without_json(self):
+        payload = build_compact_payload("plain answer", [], "abc", ReferenceConfig())
+        self.assertEqual(payload["answer"], "plain answer")
+        self.assertEqual(payload["references"], [])
@@ -0,0 +1,148 @@
+import unittest
+
+from google.api_core import exceptions
+
+from mcp_vertexai_search.agent import VertexAISearchAgent, get_regional_model_name
+from mcp_vertexai_search.config import ModelLocationConfig, VertexAIModelConfig
+from mcp_vertexai_search.routing import RegionRouter, RegionStats
+from mcp_vertexai_search.session import Turn
+
+
+class TestRegionStats(unittest.TestCase):
+    def test_ewma(self):
+        stats = RegionStats("us-central1", alpha=0.5)
+        stats.record_success(1.0)
+        stats.record_success(3.0)
+        self.assertEqual(stats.latency_ewma, 2.0)
+        stats.record_failure()
+        self.assertEqual(stats.error_ewma, 0.5)
+        self.assertAlmostEqual(stats.score(error_penalty=2.0), 3.0, places=3)
+
+    def test_error_rate_decays(self):
+        stats = RegionStats("us-central1", alpha=0.5, error_half_life=10.0)
+        stats.record_failure()
+        stats.last_failure_at -= 10.0
+        self.assertAlmostEqual(stats.error_rate(), 0.25, places=3)
+
+
+class TestRegionRouter(unittest.TestCase):
+    def test_prefers_configured_order_without_samples(self):
+        router = RegionRouter({"us-central1": "a", "asia-northeast1": "b"})
+        self.assertEqual(router.ranked_locations(), ["us-central1", "asia-northeast1"])
+
+    def test_prefers_faster_location(self):
+        router = RegionRouter({"us-central1": "a", "asia-northeast1": "b"})
+        router.stats["us-central1"].record_success(2.0)
+        router.stats["asia-northeast1"].record_success(0.5)
+        self.assertEqual(router.ranked_locations(), ["asia-northeast1", "us-central1"])
+
+    def test_weight(self):
+        router = RegionRouter(
+            {"us-central1": "a", "asia-northeast1": "b"},
+            weights={"us-central1": 4.0},
+        )
+        router.stats["us-central1"].record_success(2.0)
+        router.stats["asia-northeast1"].record_success(1.0)
+        self.assertEqual(router.ranked_locations(), ["us-central1", "asia-northeast1"])
+
+    def test_fails_over_on_capacity_error(self):
+        router = RegionRouter({"us-central1": "a", "asia-northeast1": "b"})
+
+        def func(model):
+            if model == "a":
+                raise exceptions.ResourceExhausted("quota")
+            return model
+
+        self.assertEqual(router.call(func), "b")
+        self.assertGreater(router.stats["us-central1"].error_ewma, 0.0)
+        self.assertEqual(router.ranked_locations()[0], "asia-northeast1")
+
+    def test_raises_when_all_locations_fail(self):
+        router = RegionRouter({"us-central1": "a"})
+
+        def func(model):
+            raise exceptions.ServiceUnavailable("unavailable")
+
+        with self.assertRaises(exceptions.ServiceUnavailable):
+            router.call(func)
+
+    def test_does_not_fail_over_on_other_errors(self):
+        router = RegionRouter({"us-central1": "a", "asia-northeast1": "b"})
+
+        def func(model):
+            raise exceptions.InvalidArgument("invalid")
+
+        with self.assertRaises(exceptions.InvalidArgument):
+            router.call(func)
+
+    def test_records_other_errors(self):
+        router = RegionRouter({"us-central1": "a", "asia-northeast1": "b"})
+
+        def func(model):
+            raise exceptions.InternalServerError("internal")
+
+        with self.assertRaises(exceptions.InternalServerError):
+            router.call(func)
+        # The error doesn't fail over, but counts against the location.
+        self.assertGreater(router.stats["us-central1"].error_ewma, 0.0)
+        self.assertEqual(router.stats["asia-northeast1"].error_ewma, 0.0)
+        self.assertEqual(router.ranked_locations()[0], "asia-northeast1")
+
+
+class FakeModel:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config, safety_settings, stream):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return "response"
+
+
+class TestContextRouter(unittest.TestCase):
+    def test_follow_up_fails_over(self):
+        failing = FakeModel(exceptions.ResourceExhausted("quota"))
+        healthy = FakeModel()
+        agent = VertexAISearchAgent(
+            model=FakeModel(),
+            context_model=failing,
+            context_router=RegionRouter(
+                {"us-central1": failing, "asia-northeast1": healthy}
+            ),
+        )
+        self.assertEqual(agent.context_models, [failing, healthy])
+        response = agent.search_with_context_response(
+            "and in Q3?", [Turn(query="revenue in Q2?", answer="42")], None, None
+        )
+        self.assertEqual(response, "response")
+        self.assertEqual((failing.calls, healthy.calls), (1, 1))
+
+
+class TestRegionalModel(unittest.TestCase):
+    def test_get_regional_model_name(self):
+        self.assertEqual(
+            get_regional_model_name("models/gemini-1.5-flash-002", "p", "us-east1"),
+            "projects/p/locations/us-east1/publishers/google/models/gemini-1.5-flash-002",
+        )
+        self.assertEqual(
+            get_regional_model_name("gemini-2.0-flash", "p", "us-east1"),
+            "projects/p/locations/us-east1/publishers/google/models/gemini-2.0-flash",
+        )
+
+    def test_get_locations(self):
+        model_config = VertexAIModelConfig(
+            project_id="p", model_name="m", location="us-central1"
+        )
+        self.assertEqual(
+            [c.location for c in model_config.get_locations()], ["us-central1"]
+        )
+        model_config.locations = [
+            ModelLocationConfig(location="asia-northeast1", weight=2.0),
+            ModelLocationConfig(location="us-central1"),
+        ]
+        self.assertEqual(
+            [c.location for c in model_config.get_locations()],
+            ["asia-northeast1", "us-central1"],
+        )
@@ -0,0 +1,253 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+import mcp.types as types
+from mcp.server.lowlevel.server import request_ctx
+from mcp.shared.context import RequestContext
+from mcp.shared.exceptions import McpError
+
+from mcp_vertexai_search.admission import SERVER_BUSY, AdmissionController
+from mcp_vertexai_search.agent import VertexAISearchAgent
+from mcp_vertexai_search.cache import QueryLog, ResponseCache, connect
+from mcp_vertexai_search.config import (
+    AdmissionConfig,
+    Config,
+    DataStoreConfig,
+    MCPServerConfig,
+    PriorityClassConfig,
+    QueryNormalizationConfig,
+    ReferenceStoreConfig,
+    SessionMemoryConfig,
+    VertexAIModelConfig,
+)
+from mcp_vertexai_search.references import SearchResult
+from mcp_vertexai_search.server import create_server, is_admin_request
+
+
+def make_response(text: str):
+    chunk = SimpleNamespace(
+        retrieved_context=SimpleNamespace(
+            title="doc", uri="gs://bucket/doc.pdf", text="Google Cloud revenue grew"
+        )
+    )
+    metadata = SimpleNamespace(grounding_chunks=[chunk], grounding_supports=[])
+    return SimpleNamespace(
+        text=text, candidates=[SimpleNamespace(grounding_metadata=metadata)]
+    )
+
+
+class FakeAgent:
+    def __init__(self):
+        self.queries = []
+        self.context_queries = []
+        self.compressor = None
+
+    def search_response(self, query, generation_config, safety_settings):
+        self.queries.append(query)
+        return make_response(json.dumps({"answer": "42", "references": []}))
+
+    def search_with_context_response(
+        self, query, history, generation_config, safety_settings
+    ):
+        self.context_queries.append(query)
+        return make_response(json.dumps({"answer": "43", "references": []}))
+
+    search_result = VertexAISearchAgent.search_result
+
+
+class FakeSession:
+    pass
+
+
+def make_config(**server_kwargs) -> Config:
+    return Config(
+        server=MCPServerConfig(**server_kwargs),
+        model=VertexAIModelConfig(
+            project_id="test-project",
+            model_name="test-model",
+            location="test-location",
+        ),
+        data_stores=[
+            DataStoreConfig(
+                project_id="test-project",
+                location="global",
+                datastore_id="test-datastore",
+                tool_name="test-tool",
+            )
+        ],
+    )
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = FakeSession()
+        self.token = request_ctx.set(
+            RequestContext(
+                request_id=1, meta=None, session=self.session, lifespan_context=None
+            )
+        )
+
+    def tearDown(self):
+        request_ctx.reset(self.token)
+
+    async def call_tool(self, app, name, arguments):
+        handler = app.request_handlers[types.CallToolRequest]
+        result = await handler(
+            types.CallToolRequest(
+                method="tools/call",
+                params=types.CallToolRequestParams(name=name, arguments=arguments),
+            )
+        )
+        return result.root
+
+    async def test_call_tool(self):
+        agent = FakeAgent()
+        app = create_server(agent, make_config())
+        result = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        self.assertFalse(result.isError)
+        self.assertEqual(json.loads(result.content[0].text)["answer"], "42")
+        self.assertEqual(agent.queries, ["revenue?"])
+
+    async def test_list_tools(self):
+        app = create_server(FakeAgent(), make_config())
+        handler = app.request_handlers[types.ListToolsRequest]
+        result = await handler(types.ListToolsRequest(method="tools/list"))
+        self.assertEqual([tool.name for tool in result.root.tools], ["test-tool"])
+        self.assertIs(
+            await handler(types.ListToolsRequest(method="tools/list")), result
+        )
+
+    async def test_unknown_tool(self):
+        app = create_server(FakeAgent(), make_config())
+        result = await self.call_tool(app, "unknown", {"query": "revenue?"})
+        self.assertTrue(result.isError)
+
+    async def test_compact_references_as_resources(self):
+        app = create_server(
+            FakeAgent(), make_config(references=ReferenceStoreConfig(mode="compact"))
+        )
+        result = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        payload = json.loads(result.content[0].text)
+        self.assertEqual(payload["answer"], "42")
+        resource_uri = payload["references"][0]["resource_uri"]
+
+        handler = app.request_handlers[types.ReadResourceRequest]
+        resource = await handler(
+            types.ReadResourceRequest(
+                method="resources/read",
+                params=types.ReadResourceRequestParams(uri=resource_uri),
+            )
+        )
+        self.assertEqual(resource.root.contents[0].text, "Google Cloud revenue grew")
+        with self.assertRaises(McpError):
+            await handler(
+                types.ReadResourceRequest(
+                    method="resources/read",
+                    params=types.ReadResourceRequestParams(uri="reference://x/0"),
+                )
+            )
+
+    async def test_follow_up_uses_session_context(self):
+        agent = FakeAgent()
+        app = create_server(
+            agent, make_config(session_memory=SessionMemoryConfig(enabled=True))
+        )
+        await self.call_tool(app, "test-tool", {"query": "Google Cloud revenue?"})
+        result = await self.call_tool(
+            app, "test-tool", {"query": "Google Cloud revenue grew?"}
+        )
+        self.assertEqual(json.loads(result.content[0].text)["answer"], "43")
+        self.assertEqual(agent.queries, ["Google Cloud revenue?"])
+        self.assertEqual(agent.context_queries, ["Google Cloud revenue grew?"])
+
+        # The snippets don't cover Q3, so it is grounded again.
+        await self.call_tool(app, "test-tool", {"query": "Google Cloud revenue in Q3?"})
+        self.assertEqual(
+            agent.queries, ["Google Cloud revenue?", "Google Cloud revenue in Q3?"]
+        )
+
+    async def test_follow_up_turns_re_ground(self):
+        agent = FakeAgent()
+        app = create_server(
+            agent,
+            make_config(session_memory=SessionMemoryConfig(enabled=True, max_turns=2)),
+        )
+        for _ in range(4):
+            await self.call_tool(app, "test-tool", {"query": "Google Cloud revenue?"})
+        # The follow-up turns don't store the snippets again,
+        # so the session re-grounds once the grounded turn is forgotten.
+        self.assertEqual(agent.queries, ["Google Cloud revenue?"] * 2)
+        self.assertEqual(len(agent.context_queries), 2)
+
+    async def test_cached_response(self):
+        agent = FakeAgent()
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=100)
+        app = create_server(agent, make_config(), cache=cache, query_log=query_log)
+        first = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        second = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        self.assertEqual(first.content[0].text, second.content[0].text)
+        self.assertEqual(agent.queries, ["revenue?"])
+        self.assertEqual(query_log.top("test-tool", 1), ["revenue?"])
+
+    async def test_cached_response_by_normalized_query(self):
+        agent = FakeAgent()
+        cache = ResponseCache(connect(None), max_age_seconds=60)
+        query_log = QueryLog(connect(None), half_life_seconds=3600, max_entries=100)
+        app = create_server(
+            agent,
+            make_config(query_normalization=QueryNormalizationConfig(enabled=True)),
+            cache=cache,
+            query_log=query_log,
+        )
+        await self.call_tool(app, "test-tool", {"query": "Revenue?"})
+        await self.call_tool(app, "test-tool", {"query": "ｒｅｖｅｎｕｅ　"})
+        self.assertEqual(agent.queries, ["Revenue?"])
+        self.assertIsNotNone(cache.get("test-tool", "revenue"))
+        self.assertEqual(query_log.top("test-tool", 1), ["ｒｅｖｅｎｕｅ　"])
+
+    async def test_backend_of_tool(self):
+        class EchoBackend:
+            def search_result(self, query, generation_config, safety_settings, history):
+                return SearchResult(
+                    text=json.dumps({"answer": query, "references": []})
+                )
+
+        agent = FakeAgent()
+        app = create_server(agent, make_config(), backends={"test-tool": EchoBackend()})
+        result = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        self.assertEqual(json.loads(result.content[0].text)["answer"], "revenue?")
+        self.assertEqual(agent.queries, [])
+
+    async def test_busy_server(self):
+        admission_config = AdmissionConfig(
+            enabled=True,
+            max_concurrency=1,
+            classes=[PriorityClassConfig(name="interactive", max_queue_depth=0)],
+        )
+        admission = AdmissionController.from_config(admission_config)
+        app = create_server(
+            FakeAgent(), make_config(admission=admission_config), admission=admission
+        )
+        result = await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        self.assertFalse(result.isError)
+        async with admission.admit("interactive"):
+            with self.assertRaises(McpError) as context:
+                await self.call_tool(app, "test-tool", {"query": "revenue?"})
+        self.assertEqual(context.exception.error.code, SERVER_BUSY)
+        self.assertGreaterEqual(context.exception.error.data["retry_after_seconds"], 1)
+
+
+class TestAdminRequest(unittest.TestCase):
+    def test_localhost_without_token(self):
+        self.assertTrue(is_admin_request("127.0.0.1", None))
+        self.assertTrue(is_admin_request("::1", None))
+        self.assertFalse(is_admin_request("10.0.0.1", None))
+        self.assertFalse(is_admin_request(None, None))
+
+    def test_token(self):
+        self.assertTrue(is_admin_request("10.0.0.1", "Bearer secret", "secret"))
+        self.assertFalse(is_admin_request("10.0.0.1", "Bearer wrong", "secret"))
+        # The token is required from localhost too.
+        self.assertFalse(is_admin_request("127.0.0.1", None, "secret"))
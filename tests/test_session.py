@@ -0,0 +1,171 @@
+import gc
+import unittest
+
+from mcp_vertexai_search.agent import to_context_contents
+from mcp_vertexai_search.references import GroundedReference
+from mcp_vertexai_search.session import (
+    SessionMemory,
+    Turn,
+    collect_snippets,
+    is_elliptical,
+    missing_terms,
+    topic_overlap,
+)
+
+
+class FakeSession:
+    pass
+
+
+def make_turn(query: str = "What was the revenue of Google Cloud in Q2?") -> Turn:
+    return Turn(
+        query=query,
+        answer="The revenue of Google Cloud was $10.3 billion in Q2.",
+        snippets=[
+            GroundedReference(
+                title="2023 Q2", text="Google Cloud revenue was $10.3 billion"
+            )
+        ],
+    )
+
+
+class TestTopic(unittest.TestCase):
+    def test_topic_overlap(self):
+        turns = [make_turn()]
+        self.assertGreater(
+            topic_overlap("and what about the revenue in Q3?", turns), 0.3
+        )
+        self.assertEqual(topic_overlap("Who is the CEO?", turns), 0.0)
+        # The answers and the snippets don't count.
+        self.assertEqual(topic_overlap("billion?", turns), 0.0)
+
+    def test_missing_terms(self):
+        snippets = make_turn().snippets
+        self.assertEqual(missing_terms("Google Cloud revenue in Q2?", snippets), set())
+        self.assertEqual(missing_terms("Google Cloud revenue in Q3?", snippets), {"q3"})
+
+    def test_is_elliptical(self):
+        self.assertTrue(is_elliptical("and what about Q3?"))
+        self.assertTrue(is_elliptical("What about Q3?"))
+        self.assertTrue(is_elliptical("では Q3 は？"))
+        self.assertTrue(is_elliptical("Q3?"))
+        self.assertFalse(is_elliptical("Who is the CEO of Alphabet?"))
+        self.assertFalse(is_elliptical("Android market share?"))
+
+    def test_collect_snippets(self):
+        turns = [make_turn(), make_turn()]
+        self.assertEqual(len(collect_snippets(turns)), 1)
+
+
+class TestSessionMemory(unittest.TestCase):
+    def test_find_context(self):
+        memory = SessionMemory()
+        session = FakeSession()
+        self.assertIsNone(memory.find_context(session, "tool", "Google Cloud?"))
+        memory.add_turn(session, "tool", make_turn())
+        self.assertEqual(
+            len(memory.find_context(session, "tool", "Google Cloud revenue in Q2?")),
+            1,
+        )
+        self.assertIsNone(memory.find_context(session, "tool", "Who is the CEO?"))
+        self.assertIsNone(memory.find_context(session, "other", "Google Cloud?"))
+        # The snippets don't cover Q3, so it needs a new retrieval.
+        self.assertIsNone(
+            memory.find_context(session, "tool", "Google Cloud revenue in Q3?")
+        )
+
+    def test_elliptical_follow_up(self):
+        memory = SessionMemory()
+        session = FakeSession()
+        memory.add_turn(
+            session, "tool", make_turn("What was Google Cloud revenue in Q2?")
+        )
+        # The snippets don't cover Q3.
+        self.assertIsNone(memory.find_context(session, "tool", "and what about Q3?"))
+        memory.add_turn(
+            session,
+            "tool",
+            Turn(
+                query="What was Google Cloud revenue in Q2?",
+                answer="The revenue of Google Cloud was $10.3 billion in Q2.",
+                snippets=[
+                    GroundedReference(
+                        title="2023 earnings",
+                        text="Google Cloud revenue was $10.3 billion in Q2 and $8.4 billion in Q3",
+                    )
+                ],
+            ),
+        )
+        self.assertEqual(
+            len(memory.find_context(session, "tool", "and what about Q3?")), 2
+        )
+
+    def test_unrelated_queries_in_same_domain(self):
+        memory = SessionMemory()
+        session = FakeSession()
+        memory.add_turn(
+            session,
+            "tool",
+            Turn(
+                query="What was the revenue of Alphabet in Q2?",
+                answer="Alphabet revenue was $74.6 billion, and Google Cloud revenue was $10.3 billion.",
+                snippets=[
+                    GroundedReference(
+                        title="Alphabet 2023 Q2 earnings",
+                        text="Alphabet revenue was $74.6 billion. Sundar Pichai, CEO of Alphabet, said "
+                        "Google Cloud revenue was $10.3 billion, competing with Microsoft Azure.",
+                    )
+                ],
+            ),
+        )
+        self.assertIsNone(
+            memory.find_context(session, "tool", "Who is the CEO of Alphabet?")
+        )
+        self.assertIsNone(
+            memory.find_context(session, "tool", "What was Microsoft Azure revenue?")
+        )
+        self.assertIsNotNone(
+            memory.find_context(session, "tool", "Alphabet revenue in Q2?")
+        )
+
+    def test_max_turns(self):
+        memory = SessionMemory(max_turns=2)
+        session = FakeSession()
+        for i in range(3):
+            memory.add_turn(session, "tool", make_turn(f"query {i}"))
+        self.assertEqual(
+            [turn.query for turn in memory.get_turns(session, "tool")],
+            ["query 1", "query 2"],
+        )
+
+    def test_evicts_least_recently_used_session(self):
+        memory = SessionMemory(max_sessions=2)
+        sessions = [FakeSession() for _ in range(3)]
+        for session in sessions:
+            memory.add_turn(session, "tool", make_turn())
+        self.assertEqual(len(memory), 2)
+        self.assertEqual(memory.get_turns(sessions[0], "tool"), [])
+
+    def test_ttl(self):
+        memory = SessionMemory(ttl_seconds=0.0)
+        session = FakeSession()
+        memory.add_turn(session, "tool", make_turn())
+        self.assertEqual(memory.get_turns(session, "tool"), [])
+
+    def test_forgets_closed_session(self):
+        memory = SessionMemory()
+        session = FakeSession()
+        memory.add_turn(session, "tool", make_turn())
+        del session
+        gc.collect()
+        self.assertEqual(len(memory), 0)
+
+
+class TestContextContents(unittest.TestCase):
+    def test_to_context_contents(self):
+        contents = to_context_contents("and in Q3?", [make_turn()])
+        self.assertEqual(
+            [content.role for content in contents], ["user", "model", "user"]
+        )
+        self.assertIn("Google Cloud revenue was $10.3 billion", contents[-1].text)
+        self.assertIn("and in Q3?", contents[-1].text)
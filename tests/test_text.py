@@ -0,0 +1,17 @@
+import unittest
+
+from mcp_vertexai_search.text import terms, tokenize
+
+
+class TestText(unittest.TestCase):
+    def test_terms(self):
+        self.assertEqual(
+            terms("The revenue, and the revenue of Google"),
+            ["revenue", "revenue", "google"],
+        )
+        self.assertEqual(terms("?"), [])
+
+    def test_tokenize_japanese(self):
+        self.assertEqual(tokenize("売上高"), {"売上", "上高"})
+        self.assertEqual(tokenize("What is the revenue?"), {"revenue"})
+        self.assertEqual(tokenize("Ｑ３の売上"), {"q3", "の売", "売上"})
@@ -0,0 +1,89 @@
+import unittest
+
+from mcp_vertexai_search.config import (
+    Config,
+    DataStoreConfig,
+    MCPServerConfig,
+    VertexAIModelConfig,
+    WarmupConfig,
+)
+from mcp_vertexai_search.references import SearchResult
+from mcp_vertexai_search.warmup import ReadinessState, Warmer
+
+
+class FakeModel:
+    def __init__(self):
+        self.count_tokens_calls = 0
+
+    def count_tokens(self, contents):
+        self.count_tokens_calls += 1
+
+
+class FakeAgent:
+    def __init__(self):
+        self.model = FakeModel()
+        self.models = [self.model]
+        self.context_model = FakeModel()
+        self.context_models = [self.context_model]
+        self.queries = []
+
+    def search_result(self, query, generation_config, safety_settings):
+        self.queries.append(query)
+        return SearchResult(text="{}")
+
+
+def make_config(warmup: WarmupConfig) -> Config:
+    return Config(
+        server=MCPServerConfig(warmup=warmup),
+        model=VertexAIModelConfig(
+            project_id="test-project",
+            model_name="test-model",
+            location="test-location",
+        ),
+    )
+
+
+class TestReadinessState(unittest.TestCase):
+    def test_mark_ready(self):
+        readiness = ReadinessState()
+        self.assertFalse(readiness.ready)
+        readiness.mark_ready()
+        self.assertTrue(readiness.ready)
+        self.assertGreaterEqual(readiness.cold_start_seconds, 0.0)
+
+    def test_record_call_keeps_first_call(self):
+        readiness = ReadinessState()
+        readiness.record_call(3.0)
+        readiness.record_call(0.5)
+        self.assertEqual(readiness.first_call_seconds, 3.0)
+        self.assertEqual(readiness.to_dict()["first_call_seconds"], 3.0)
+
+
+class TestWarmer(unittest.IsolatedAsyncioTestCase):
+    async def test_disabled_warmup_is_ready_immediately(self):
+        agent = FakeAgent()
+        warmer = Warmer(agent, make_config(WarmupConfig()))
+        await warmer.warm_up()
+        self.assertTrue(warmer.readiness.ready)
+        self.assertEqual(agent.model.count_tokens_calls, 0)
+
+    async def test_warmup_with_probe(self):
+        agent = FakeAgent()
+        config = make_config(WarmupConfig(enabled=True, probe=True, probe_query="hi"))
+        config.data_stores = [
+            DataStoreConfig(
+                project_id="test-project",
+                location="global",
+                datastore_id=f"test-datastore-{i}",
+                tool_name=f"test-tool-{i}",
+            )
+            for i in range(2)
+        ]
+        warmer = Warmer(agent, config)
+        await warmer.warm_up()
+        self.assertTrue(warmer.readiness.ready)
+        self.assertEqual(agent.model.count_tokens_calls, 1)
+        self.assertEqual(agent.context_model.count_tokens_calls, 1)
+        # The tools share the agent, so it is probed once.
+        self.assertEqual(agent.queries, ["hi"])
+        self.assertIn("probe", warmer.readiness.phases)